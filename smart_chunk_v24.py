@@ -9,6 +9,8 @@ Instructions:
 1. put target files (or directories of files) in a folder called /target_files/ with this program
 2. run this program
 3. Answer attribution text question for each file
+   (or set BATCH_MODE = True and, optionally, an ATTRIBUTION_MANIFEST_PATH
+   to run unattended)
 4. results in /txt_pool/ directory
 
 
@@ -38,6 +40,7 @@ over a few tries to make sure the results fit in your workflow.
 ################
 # size character length of chunk
 MAX_CHUNK_SIZE = 1800
+CHUNK_OVERLAP_SIZE = 550  # characters repeated from the end of the previous chunk
 MINIMUM_BYTES_SIZE = 300
 ATTEMPT_AUTO_SPLIT = True  # buggy, filepaths are hard
 BULK_FILES_FOLDER_MAX_SIZE = 200
@@ -47,30 +50,267 @@ REMOVE_BELOW_SIZE = (
 )
 RESULTS_DIR_NAME = "ingestion_processing_results"
 
+# parallel processing: one whole document per worker process
+# (set MAX_WORKERS = 1 to run everything in this process, e.g. for debugging)
+MAX_WORKERS = None  # None -> os.cpu_count()
+WORKER_STAGING_DIR_NAME = "worker_staging"
+
+# unattended batch mode: never ask for source attribution strings.
+# Attribution comes from ATTRIBUTION_MANIFEST_PATH (if set), then from
+# the document's own metadata (epub OPF, docx/pptx core properties, pdf info),
+# then from the file name.
+BATCH_MODE = False
+ATTRIBUTION_MANIFEST_PATH = None  # e.g. "attributions.csv" or "attributions.json"
+
+# incremental re-ingestion: the manifest records each input's hash, size, mtime,
+# chunking parameters, and outputs. Unchanged inputs are skipped,
+# changed inputs have their old outputs replaced.
+INCREMENTAL_MODE = True
+INGEST_MANIFEST_PATH = "ingest_manifest.jsonl"
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# streaming: txt/docx/pdf text is read, chunked, and written in pieces
+# of about this many characters, so memory use does not grow with document size
+STREAM_WINDOW_CHARS = 1_000_000
+
+# identical input files (same size, then same sha256) are processed once,
+# also a new copy of a document already processed (e.g. arriving in --watch);
+# the other copies are listed as aliases in the run report
+DEDUPLICATE_INPUTS = True
+
+# crash-safe resume: each document is written into a '_partial' results folder
+# (its own: e.g. book_epub_folder_3_partial) with a journal of the sections/pages
+# written so far; an interrupted document is continued from its journal if the
+# file's sha256 is unchanged, and the finished folder is renamed into place
+JOURNAL_MODE = True
+JOURNAL_FILE_NAME = "journal.jsonl"
+PARTIAL_DIR_SUFFIX = "_partial"
+
+# per-stage timing and throughput for each run, as JSON (None -> no file)
+PERFORMANCE_REPORT_PATH = "ingest_report.json"
+
+# every output file (source document, size, sha256, chunk count, chunk ids),
+# one JSON line per file, for loaders and embedders (None -> no file)
+OUTPUT_MANIFEST_PATH = "output_manifest.jsonl"
+
+# epubs: the table of contents (EPUB3 nav, else EPUB2 toc.ncx) as a chapter
+# index in each results folder, with offsets into whole.txt and the chunks
+# of each chapter; each chunk's line in chunks_jsonl_all.jsonl gets its
+# "chapter" path (None -> no index, no chapter paths)
+CHAPTER_INDEX_FILE_NAME = "chapter_index.json"
+
+# epub front/back matter (copyright pages, "also by" lists, ads, indexes):
+# spine files marked linear="no", those with one of BOILERPLATE_LANDMARK_TYPES
+# in the OPF guide or EPUB3 landmarks, and those whose bytes are in
+# BOILERPLATE_REPEAT_BOOKS or more ingested books.
+# "tag" -> written as usual, their chunks get "boilerplate": [reasons]
+# "skip" -> not written or chunked (the run report counts the bytes saved)
+# None -> off
+BOILERPLATE_MODE = "tag"
+BOILERPLATE_LANDMARK_TYPES = [
+    "cover", "titlepage", "title-page", "copyright-page", "toc", "index",
+    "colophon", "imprint", "imprimatur", "loi", "lot", "other-credits",
+]
+BOILERPLATE_REPEAT_BOOKS = 3
+
+# tracing (--trace): spans of every document, stage, and writer batch,
+# in all worker processes, as Chrome trace event JSON (None -> off);
+# spans shorter than TRACE_MIN_MICROSECONDS are left out
+TRACE_PATH = None
+TRACE_MIN_MICROSECONDS = 50
+
+# profiling (--profile GLOB, --profile-slowest N): the chosen documents are
+# processed (even if unchanged) under cProfile and tracemalloc, and
+# profile.prof and allocations.txt are written next to their log.txt
+PROFILE_DOCUMENTS = []  # globs, matched against the path or the file name
+PROFILE_SLOWEST = 0  # the N slowest documents in the last run report
+PROFILE_TOP_ALLOCATIONS = 30
+PROFILE_SNAPSHOT_SECONDS = 0.5
+
+# scheduling: documents are started largest (estimated cost) first;
+# relative cost per MB of input (per MB of html for epub) and per pdf page
+JOB_COST_PER_MB = {"epub": 2.0, "txt": 0.5, "docx": 1.0, "pdf": 0.5, "pptx": 1.0}
+JOB_COST_PER_PDF_PAGE = 0.02
+# at most this many 'heavy' pdfs (HEAVY_PDF_PAGES pages or more) run at once
+HEAVY_PDF_PAGES = 500
+MAX_HEAVY_PDF_JOBS = 2  # None -> no limit
+# documents of HEAVY_FILE_MB or more are heavy too; at most MAX_HEAVY_JOBS
+# heavy documents of a format run at once (pdf: MAX_HEAVY_PDF_JOBS)
+HEAVY_FILE_MB = {"epub": 100, "docx": 100, "pdf": 200, "pptx": 200}
+MAX_HEAVY_JOBS = {"epub": 2, "docx": 2, "pptx": 2}
+
+# memory governor (worker processes, Linux /proc or psutil if installed):
+# a worker using more than WORKER_MEMORY_LIMIT_MB resident memory (with the
+# processes it started) is stopped and replaced, and its document retried once
+# in a degraded mode (a pdf read page by page with DEGRADED_PDF_READER only,
+# smaller text windows)
+WORKER_MEMORY_LIMIT_MB = 4000  # None -> no limit
+WORKER_WATCH_SECONDS = 1.0  # how often workers are checked
+DEGRADED_PDF_READER = "PDF_TRY_PYMU"  # or "PDF_TRY_PYPDF", "PDF_TRY_PDFPLUMBER"
+DEGRADED_STREAM_WINDOW_CHARS = 100_000
+
+# each document runs in a worker process, stopped after DOCUMENT_TIMEOUT_SECONDS;
+# a document that fails or times out is listed in QUARANTINE_PATH (with its
+# traceback) and skipped by later runs until the file changes (or RETRY_QUARANTINED)
+ISOLATE_DOCUMENTS = True  # False -> with one worker, documents run in this process
+DOCUMENT_TIMEOUT_SECONDS = 3600  # None -> no limit
+QUARANTINE_PATH = "quarantine.jsonl"
+RETRY_QUARANTINED = False
+
+# --watch (daemon): how often the watched directories are checked, how long
+# a new file must be unchanged before it is ingested (it may still be copying),
+# and how often every directory is listed again (catches files changed in place)
+WATCH_POLL_SECONDS = 2.0
+WATCH_SETTLE_SECONDS = 5.0
+WATCH_FULL_SCAN_SECONDS = 3600
+
+# distributed mode (--queue): a SQLite work queue file on shared storage;
+# a worker's lease on a document expires unless renewed (heartbeat),
+# and a document is retried this many times before it is marked failed
+QUEUE_LEASE_SECONDS = 300
+QUEUE_POLL_SECONDS = 10
+QUEUE_MAX_ATTEMPTS = 3
+
+# chunk .txt files and log lines are written by background writer thread(s),
+# each fed through a bounded queue of batches of records (0 threads -> inline);
+# at most WRITER_QUEUE_SIZE * WRITER_BATCH_SIZE records wait per thread
+WRITER_THREADS = 1
+WRITER_QUEUE_SIZE = 16
+WRITER_BATCH_SIZE = 64
+
+# --plan (dry run, nothing is written): text per epub spine file / pdf page
+# is estimated from this many sampled ones; runtime from the per-format
+# MB/sec of the last run report, else from these (MB of input/sec, one worker)
+PLAN_SAMPLE_UNITS = 5
+PLAN_DEFAULT_MB_PER_SEC = {"epub": 0.5, "txt": 2.0, "docx": 1.0, "pdf": 0.5, "pptx": 1.0}
+# the share of a chunk's room (MAX_CHUNK_SIZE - CHUNK_OVERLAP_SIZE) filled with
+# new text on average (chunks end at sentences, and repeat the last one)
+PLAN_CHUNK_FILL = 0.8
+
+# epub html -> text: 'fast' (streaming html.parser events, no tree),
+# or 'bs4' (BeautifulSoup get_text(), also the fallback if 'fast' fails);
+# both give the same text (check with --benchmark-html)
+HTML_TEXT_ENGINE = "fast"
+
+# big epubs (EPUB_PARALLEL_MIN_SECTIONS spine files or more) have their html
+# parsed in a pool of EPUB_SECTION_WORKERS processes (None -> the CPUs left
+# over by the MAX_WORKERS document workers, so with the defaults: off;
+# 1 -> off); texts are used in spine order, so the outputs are the same
+EPUB_SECTION_WORKERS = None
+EPUB_PARALLEL_MIN_SECTIONS = 100
+
 # if needed, set PDF-reader below, 'all' is default
 PDF_USE_ALL = False
 PDF_TRY_PYMU = True
 PDF_TRY_PYPDF = False
 PDF_TRY_PDFPLUMBER = False
 
-pool_counter = 1
+# the names above that ingest(paths, config) / --config may override
+CONFIG_NAMES = [
+    "MAX_CHUNK_SIZE",
+    "HTML_TEXT_ENGINE",
+    "EPUB_SECTION_WORKERS",
+    "EPUB_PARALLEL_MIN_SECTIONS",
+    "CHUNK_OVERLAP_SIZE",
+    "MINIMUM_BYTES_SIZE",
+    "ATTEMPT_AUTO_SPLIT",
+    "BULK_FILES_FOLDER_MAX_SIZE",
+    "REMOVE_BELOW_SIZE",
+    "RESULTS_DIR_NAME",
+    "MAX_WORKERS",
+    "BATCH_MODE",
+    "ATTRIBUTION_MANIFEST_PATH",
+    "INCREMENTAL_MODE",
+    "INGEST_MANIFEST_PATH",
+    "HASH_BLOCK_SIZE",
+    "STREAM_WINDOW_CHARS",
+    "DEDUPLICATE_INPUTS",
+    "JOURNAL_MODE",
+    "PERFORMANCE_REPORT_PATH",
+    "OUTPUT_MANIFEST_PATH",
+    "CHAPTER_INDEX_FILE_NAME",
+    "BOILERPLATE_MODE",
+    "BOILERPLATE_LANDMARK_TYPES",
+    "BOILERPLATE_REPEAT_BOOKS",
+    "TRACE_PATH",
+    "TRACE_MIN_MICROSECONDS",
+    "PROFILE_DOCUMENTS",
+    "PROFILE_SLOWEST",
+    "PROFILE_TOP_ALLOCATIONS",
+    "PROFILE_SNAPSHOT_SECONDS",
+    "JOB_COST_PER_MB",
+    "JOB_COST_PER_PDF_PAGE",
+    "HEAVY_PDF_PAGES",
+    "MAX_HEAVY_PDF_JOBS",
+    "HEAVY_FILE_MB",
+    "MAX_HEAVY_JOBS",
+    "WORKER_MEMORY_LIMIT_MB",
+    "WORKER_WATCH_SECONDS",
+    "DEGRADED_PDF_READER",
+    "DEGRADED_STREAM_WINDOW_CHARS",
+    "ISOLATE_DOCUMENTS",
+    "DOCUMENT_TIMEOUT_SECONDS",
+    "QUARANTINE_PATH",
+    "RETRY_QUARANTINED",
+    "WATCH_POLL_SECONDS",
+    "WATCH_SETTLE_SECONDS",
+    "WATCH_FULL_SCAN_SECONDS",
+    "QUEUE_LEASE_SECONDS",
+    "QUEUE_POLL_SECONDS",
+    "QUEUE_MAX_ATTEMPTS",
+    "WRITER_THREADS",
+    "WRITER_QUEUE_SIZE",
+    "WRITER_BATCH_SIZE",
+    "PLAN_SAMPLE_UNITS",
+    "PLAN_DEFAULT_MB_PER_SEC",
+    "PLAN_CHUNK_FILL",
+    "PDF_USE_ALL",
+    "PDF_TRY_PYMU",
+    "PDF_TRY_PYPDF",
+    "PDF_TRY_PDFPLUMBER",
+]
 
 import zipfile
 import xml.etree.ElementTree as ET
-from bs4 import BeautifulSoup
 import json
 import os
 import shutil
 import re
+import sys
 import time
+import argparse
+import importlib
 import traceback
-import docx
-from pypdf import PdfReader
-import pdfplumber
-import fitz
+import concurrent.futures
 import glob
+import csv
+import hashlib
+import fnmatch
+import posixpath
+import urllib.parse
+import collections
+import itertools
+import contextlib
+import functools
+import math
+import sqlite3
+import socket
+import threading
+import queue
+import signal
+import faulthandler
+import filecmp
+import codecs
+import multiprocessing
+import cProfile
+import tracemalloc
 from datetime import datetime
-from pptx import Presentation
+from html.parser import HTMLParser
+import html.entities
+
+# Format backends (bs4, docx, pptx, fitz, pypdf, pdfplumber) are imported
+# by import_backend() the first time a document of that format is seen,
+# so importing this module (e.g. in a new worker process) stays fast.
 
 """
 requirements.txt ->
@@ -97,9 +337,190 @@ https://pypi.org/project/python-pptx/
 """
 
 
-# start debug timer
-start_time_outer = time.monotonic()
-start_time_inner = time.time()
+def import_backend(module_name):
+    """
+    Imports a heavy format backend (e.g. 'fitz', 'docx') on first use.
+    Later calls are a dictionary lookup in sys.modules.
+    """
+    module = sys.modules.get(module_name)
+    if module is None:
+        module = importlib.import_module(module_name)
+    return module
+
+
+def apply_config(config):
+    """
+    Sets configuration values (module-level names in CONFIG_NAMES)
+    for this process. Workers call this with their job's config,
+    so overrides also reach spawned (not forked) worker processes.
+
+    Args:
+        config (dict): e.g. {"MAX_CHUNK_SIZE": 1200, "BATCH_MODE": True}
+    """
+    if not config:
+        return
+
+    for name, value in config.items():
+        if name not in CONFIG_NAMES:
+            raise ValueError(f"Unknown configuration name: {name}")
+        globals()[name] = value
+
+
+#########
+# timing
+#########
+"""
+Each stage of processing a document (read, html_parse, normalize,
+sentence_split, chunk, write, zip, pool, ...) is timed with stage_timer().
+Stages can nest; time is only counted for the innermost running stage,
+so the stage times of a document add up to (at most) its total time.
+
+Text is read, split, chunked, and written by a chain of generators,
+so each step of a generator is timed with timed_iter().
+
+With TRACE_PATH set, every stage (and each document, writer batch,
+and @traced function) is also recorded as a span; the spans of all
+processes are saved together as a Chrome trace (chrome://tracing,
+https://ui.perfetto.dev), which shows stragglers and waits that the
+summed stage times hide.
+"""
+
+# stage -> seconds, for the document being processed in this process
+stage_times = collections.defaultdict(float)
+
+# [stage, time it (last) started running, time it started] for each running stage
+running_stages = []
+
+# spans recorded in this process (see take_trace_events()),
+# and the names of the threads that recorded them
+trace_events = []
+trace_thread_names = {}
+
+# perf_counter() -> seconds since the epoch, for spans from several processes
+trace_clock_offset = time.time() - time.perf_counter()
+
+
+@contextlib.contextmanager
+def stage_timer(stage):
+    """Times a block as one stage (pausing the stage it runs within)."""
+    now = time.perf_counter()
+    if running_stages:
+        parent = running_stages[-1]
+        stage_times[parent[0]] += now - parent[1]
+    running_stages.append([stage, now, now])
+
+    try:
+        yield
+    finally:
+        now = time.perf_counter()
+        stage, resumed, started = running_stages.pop()
+        stage_times[stage] += now - resumed
+        if running_stages:
+            running_stages[-1][1] = now
+        record_span(stage, started, now)
+
+
+def timed_iter(iterable, stage):
+    """Yields from iterable, timing the work done for each item as stage."""
+    iterator = iter(iterable)
+
+    while True:
+        with stage_timer(stage):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def take_stage_times():
+    """Returns (and resets) the stage times collected so far."""
+    times = {stage: round(seconds, 6) for stage, seconds in stage_times.items()}
+    stage_times.clear()
+    return times
+
+
+def record_span(name, started, ended, category="stage", args=None):
+    """
+    Records one span (perf_counter() start and end) as a Chrome trace
+    'complete' event, if tracing and it is at least TRACE_MIN_MICROSECONDS.
+    """
+    if not TRACE_PATH or (ended - started) * 1e6 < TRACE_MIN_MICROSECONDS:
+        return
+
+    thread_id = threading.get_native_id()
+    if thread_id not in trace_thread_names:
+        trace_thread_names[thread_id] = threading.current_thread().name
+
+    event = {
+        "name": name,
+        "cat": category,
+        "ph": "X",
+        "ts": round((started + trace_clock_offset) * 1e6, 1),
+        "dur": round((ended - started) * 1e6, 1),
+        "pid": os.getpid(),
+        "tid": thread_id,
+    }
+    if args:
+        event["args"] = args
+    trace_events.append(event)
+
+
+@contextlib.contextmanager
+def trace_span(name, category="function", **args):
+    """Records a block as one span (unlike stage_timer(), not timed as a stage)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, started, time.perf_counter(), category, args)
+
+
+def traced(function):
+    """Decorator: each call of function is a span, when tracing."""
+
+    @functools.wraps(function)
+    def traced_function(*args, **kwargs):
+        with trace_span(function.__name__):
+            return function(*args, **kwargs)
+
+    return traced_function
+
+
+def take_trace_events():
+    """
+    Returns (and resets) the spans recorded in this process,
+    after metadata events naming the process and its threads.
+    """
+    if not trace_events:
+        return []
+
+    pid = os.getpid()
+    process_name = f"{multiprocessing.current_process().name} ({pid})"
+    events = [
+        {"name": "process_name", "ph": "M", "pid": pid, "args": {"name": process_name}}
+    ]
+    for thread_id, thread_name in trace_thread_names.items():
+        events.append(
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": thread_id,
+                "args": {"name": thread_name},
+            }
+        )
+
+    events.extend(trace_events)
+    trace_events.clear()
+    trace_thread_names.clear()
+    return events
+
+
+def save_trace(events, trace_path):
+    """Saves trace events as Chrome trace event JSON."""
+    with open(trace_path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
 
 
 def remove_small_files(directory, size):
@@ -155,122 +576,184 @@ def count_files(directory):
 
 def create_new_split_bulk_files_folders(
     prefix=BULK_FILE_FOLDER_PREFIX, 
-    max_number=BULK_FILES_FOLDER_MAX_SIZE
+    max_number=BULK_FILES_FOLDER_MAX_SIZE,
+    dir_names=None
 ):
   """
-  Finds directories, creates a new one if needed, and moves files to maintain 
-  the maximum number of files per directory.
+  Moves the files over max_number out of each document's folder
+  (bulk_files_folder_N) into folders of that document's own,
+  bulk_files_folder_N_2, bulk_files_folder_N_3, ... (max_number files each),
+  so they are replaced with the document (see record_split_folders()).
+
+  dir_names: optional, only these folders (e.g. this run's new documents')
+
+  Returns:
+      dict: {old file path: new file path} for every file moved
   """
-  existing_dirs = [d for d in os.listdir('.') if os.path.isdir(d) and d.startswith(prefix)]
-  starting_counter = len(existing_dirs)
-  counter = starting_counter
+  # only the documents' own folders: split folders are never over the limit
+  existing_dirs = [
+      d for d in (os.listdir('.') if dir_names is None else dir_names)
+      if os.path.isdir(d) and d.startswith(prefix) and d[len(prefix):].isdigit()
+  ]
+  moved_files = {}
 
   for dir_name in existing_dirs:
-    files = os.listdir(dir_name)
-    if len(files) > max_number:
-      counter += 1
-      new_dir_name = f"{prefix}{counter}"
+    files = sorted(os.listdir(dir_name))
+    part = 1
+
+    # Move excess files to new directories, max_number at a time
+    for start in range(max_number, len(files), max_number):
+      part += 1
+      while os.path.exists(f"{dir_name}_{part}"):
+        part += 1
+      new_dir_name = f"{dir_name}_{part}"
       os.makedirs(new_dir_name)
       print(f"Created new directory: {new_dir_name}")
 
-      # Move excess files to the new directory (Corrected Loop)
-      files_to_move = files[max_number:] # Get files exceeding the limit
-      for file_name in files_to_move:
+      for file_name in files[start : start + max_number]:
         source_file = os.path.join(dir_name, file_name)
         destination_file = os.path.join(new_dir_name, file_name)
         shutil.move(source_file, destination_file)
+        moved_files[source_file] = destination_file
         print(f"Moved {file_name} to {new_dir_name}")
 
+  return moved_files
 
-# def get_files_from_subdirs(base_dir, file_extension):
-#     """
-#     Get the paths of all files with the specified extension from subdirectories in the base directory.
-
-#     Args:
-#         base_dir (str): The path to the base directory containing the subdirectories.
-#         file_extension (str): The file extension to match (e.g., '.txt', '.py', '.jpg').
-
-#     Returns:
-#         list: A list of file paths matching the specified extension.
-#     """
-#     # Get all the subdirectories in the base directory
-#     subdirs = [d for d in os.listdir(base_dir) if os.path.isdir(os.path.join(base_dir, d))]
-
-#     # Get the paths of all files with the specified extension in the subdirectories
-#     file_paths = []
-#     for subdir in subdirs:
-#         subdir_path = os.path.join(base_dir, subdir)
-#         file_paths.extend(glob.glob(os.path.join(subdir_path, f'*{file_extension}')))
-
-#     return file_paths
-
-# def get_files_from_subdirs(base_dir, file_extension):
-#     """
-#     Get the paths of all files with the specified extension from subdirectories and the base directory.
-
-#     Args:
-#         base_dir (str): The path to the base directory containing the subdirectories.
-#         file_extension (str): The file extension to match (e.g., '.txt', '.py', '.jpg').
-
-#     Returns:
-#         list: A list of file paths matching the specified extension.
-
-#     Requires:
-#         - import os
-#         - import glob
-
-#     """
-#     # Ensure the file extension starts with a dot
-#     if not file_extension.startswith('.'):
-#         file_extension = '.' + file_extension
-
-#     # Get all the subdirectories in the base directory
-#     subdirs = [d for d in os.listdir(base_dir) if os.path.isdir(os.path.join(base_dir, d))]
-
-#     # Get the paths of all files with the specified extension in the subdirectories
-#     file_paths = []
-#     for subdir in subdirs:
-#         subdir_path = os.path.join(base_dir, subdir)
-#         file_paths.extend(glob.glob(os.path.join(subdir_path, f'*{file_extension}')))
 
-#     # Get the paths of all files with the specified extension in the base directory
-#     base_dir_files = glob.glob(os.path.join(base_dir, f'*{file_extension}'))
-#     file_paths.extend(base_dir_files)
+def record_split_folders(ingest_manifest, moved_files):
+    """
+    Lists the folders the auto-split moved a document's chunks into
+    under its outputs ('split_bulk_dirs'), so they are removed with it.
+    """
+    # in the order they were made
+    split_dirs = collections.defaultdict(dict)
+    for source_file, destination_file in moved_files.items():
+        split_dirs[os.path.dirname(source_file)][os.path.dirname(destination_file)] = None
+
+    for record in ingest_manifest.values():
+        bulk_files_dir = record["outputs"].get("bulk_files_dir")
+        if bulk_files_dir in split_dirs:
+            record["outputs"]["split_bulk_dirs"] = list(split_dirs[bulk_files_dir])
+
+
+def list_output_paths(outputs):
+    """Every file or folder in a document's outputs (a manifest record's)."""
+    paths = []
+    for key, value in outputs.items():
+        if key == "split_bulk_dirs":
+            paths.extend(value)
+        else:
+            paths.append(value)
+    return paths
 
-#     return file_paths 
 
+# normalized (lower case) file suffix -> file type, in processing order
+SUPPORTED_FILE_TYPES = {
+    ".epub": "epub",
+    ".txt": "txt",
+    ".docx": "docx",
+    ".pdf": "pdf",
+    ".pptx": "pptx",
+}
 
+# one input document found under target_files
+WorkItem = collections.namedtuple("WorkItem", ["path", "file_type", "size", "mtime_ns"])
 
 
-def get_files_from_subdirs(base_dir, file_extension):
+def scan_target_files(base_dir, file_types=SUPPORTED_FILE_TYPES):
     """
-    Get the paths of all files with the specified extension from subdirectories and the base directory.
+    Walks base_dir (and all sub-sub-directories) once with os.scandir,
+    sorting every file into a bucket by its case-insensitive suffix
+    (so .pdf and .PDF both land in 'pdf').
+
+    Symlinked directories are followed, but each directory is walked
+    only once (by device and inode), so a symlink loop ends and an
+    aliased directory is not listed twice. Files reached twice
+    (e.g. through a symlinked file) are only listed once, by real path.
 
     Args:
-        base_dir (str): The path to the base directory containing the subdirectories.
-        file_extension (str): The file extension to match (e.g., '.txt', '.py', '.jpg').
+        base_dir (str): the directory to search, e.g. 'target_files'
+        file_types (dict): normalized suffix -> file type
 
     Returns:
-        list: A list of file paths matching the specified extension.
+        list: WorkItem(path, file_type, size, mtime_ns) for every supported file,
+              grouped by file type in file_types order,
+              then in (sorted) directory-walk order
 
     Requires:
         - import os
-        - import glob
+        - import collections
     """
-    # Ensure the file extension starts with a dot
-    if not file_extension.startswith("."):
-        file_extension = "." + file_extension
+    buckets = {file_type: [] for file_type in file_types.values()}
+    seen_real_paths = set()
+    # (st_dev, st_ino) of every directory walked
+    seen_dirs = set()
+
+    if not os.path.isdir(base_dir):
+        print(f"No {base_dir} directory found.")
+        return []
+
+    directories = [base_dir]
+    while directories:
+        this_dir = directories.pop()
+
+        # resolve symlinks once per directory, not once per file
+        real_dir = os.path.realpath(this_dir)
+
+        try:
+            dir_stat = os.stat(this_dir)
+            dir_key = (dir_stat.st_dev, dir_stat.st_ino)
+            if dir_key in seen_dirs:
+                continue
+            seen_dirs.add(dir_key)
+
+            with os.scandir(this_dir) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name)
+        except OSError as e:
+            print(f"Skipping unreadable directory {this_dir}: {e}")
+            continue
+
+        sub_dirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    sub_dirs.append(entry.path)
+                    continue
+
+                file_type = file_types.get(os.path.splitext(entry.name)[1].lower())
+                if file_type is None or not entry.is_file():
+                    continue
+
+                if entry.is_symlink():
+                    real_path = os.path.realpath(entry.path)
+                else:
+                    real_path = os.path.join(real_dir, entry.name)
+
+                if real_path in seen_real_paths:
+                    continue
+                seen_real_paths.add(real_path)
+
+                stat_result = entry.stat()
+                buckets[file_type].append(
+                    WorkItem(
+                        entry.path,
+                        file_type,
+                        stat_result.st_size,
+                        stat_result.st_mtime_ns,
+                    )
+                )
+
+            except OSError as e:
+                print(f"Skipping unreadable file {entry.path}: {e}")
 
-    # Get the paths of all files with the specified extension in all subdirectories (sub-sub, etc)
-    file_paths = []
-    for root, dirs, files in os.walk(base_dir):
-        file_paths.extend(glob.glob(os.path.join(root, f"*{file_extension}")))
+        # walk sub-directories in name order
+        directories.extend(reversed(sub_dirs))
 
-    # Get the paths of all files with the specified extension in the base directory
-    base_dir_files = glob.glob(os.path.join(base_dir, f"*{file_extension}"))
-    file_paths.extend(base_dir_files)
+    work_list = []
+    for file_type_items in buckets.values():
+        work_list.extend(file_type_items)
 
-    return file_paths
+    return work_list
 
 
 def remove_control_chars(s):
@@ -282,17 +765,20 @@ def remove_control_chars(s):
     return s.translate(control_chars)
 
 
-def extract_pptx_text_to_file(pptx_file):
+def extract_pptx_text_to_file(pptx_file, pptx_chunks_dir="pptx_chunks"):
     """
     extract text from a .pptx slide deck
     ideally,
     extract the text from each slide,
+
+    Returns:
+        str: the directory the slide .txt files were saved in
     """
     # Get the PowerPoint file name without extension
     file_name = os.path.splitext(os.path.basename(pptx_file))[0]
 
     # Specify the directory path you want to create
-    save_here_directory_path = f"pptx_chunks/{file_name}_chunks"
+    save_here_directory_path = f"{pptx_chunks_dir}/{file_name}_chunks"
 
     # Check if the directory exists
     if not os.path.exists(save_here_directory_path):
@@ -303,6 +789,7 @@ def extract_pptx_text_to_file(pptx_file):
         print(f"Directory '{save_here_directory_path}' already exists.")
 
     # Open the PowerPoint file
+    Presentation = import_backend("pptx").Presentation
     prs = Presentation(pptx_file)
 
     # Get the current timestamp
@@ -342,13 +829,16 @@ def extract_pptx_text_to_file(pptx_file):
 
         slide_number += 1
 
-    print(f"Text extracted and saved to {output_file}")
+    print(f"Text extracted and saved to {save_here_directory_path}")
 
+    return save_here_directory_path
 
-def simple_extracttextfrom_pdf(pdf_path):
+
+def simple_extracttextfrom_pdf(pdf_path, errors=None):
     """
     Try three methods for reading pdf,
     returns longest, in case of partial-fails
+    (errors: optional list, gets each failed reader's exception)
 
     # Example usage
     pdf_path = '2019 PMR Inn Type.pdf'
@@ -362,24 +852,28 @@ def simple_extracttextfrom_pdf(pdf_path):
     text_pymupdf = ""
 
     if PDF_TRY_PYMU or PDF_USE_ALL:
+        fitz = None
         try:
             # PyMuPDF
             print("Trying PyMuPDF...")
+            fitz = import_backend("fitz")
             pdf_file = fitz.open(pdf_path)
             text_pymupdf = ""
             for page_num in range(len(pdf_file)):
                 page = pdf_file[page_num]
                 text_pymupdf += page.get_text()
-        except fitz.FileDataError:
-            text_pymupdf = ""
         except Exception as e:
-            print(f"Error (PyMuPDF): {e}")
+            if fitz is None or not isinstance(e, fitz.FileDataError):
+                print(f"Error (PyMuPDF): {e}")
             text_pymupdf = ""
+            if errors is not None:
+                errors.append(e)
 
     if PDF_TRY_PYPDF or PDF_USE_ALL:
         try:
             # pypdf
             print("Trying pypdf PdfReader...")
+            PdfReader = import_backend("pypdf").PdfReader
             reader = PdfReader(pdf_path)
             text_pypdf = ""
             for page in reader.pages:
@@ -387,11 +881,14 @@ def simple_extracttextfrom_pdf(pdf_path):
         except Exception as e:
             print(f"Error (pypdf): {e}")
             text_pypdf = ""
+            if errors is not None:
+                errors.append(e)
 
     if PDF_TRY_PDFPLUMBER or PDF_USE_ALL:
         try:
             # pdfplumber
             print("Trying pdfplumber...")
+            pdfplumber = import_backend("pdfplumber")
             with pdfplumber.open(pdf_path) as pdf:
                 text_pdfplumber = ""
                 for page in pdf.pages:
@@ -399,6 +896,8 @@ def simple_extracttextfrom_pdf(pdf_path):
         except Exception as e:
             print(f"Error (pdfplumber): {e}")
             text_pdfplumber = ""
+            if errors is not None:
+                errors.append(e)
 
     # Keep the longest extracted text
     print(
@@ -469,7 +968,539 @@ def get_ordered_html_files(opf_content):
     return ordered_html_files
 
 
-def extract_text_from_html(html_content, this_epub_output_dir_path):
+def zip_member_key(info):
+    """
+    A key for a zip member's content, from the zip directory alone
+    (its CRC-32 and size): the same file in two epubs has the same key.
+    """
+    return f"{info.CRC:08x}-{info.file_size}"
+
+
+class EpubArchive:
+    """
+    An open epub, read lazily:
+
+    - the package (OPF) file is found through META-INF/container.xml
+      (else the first .opf member);
+    - the zip's members are indexed once, by name, so resolving an href
+      is a dictionary lookup, not a scan of the name list;
+    - hrefs (relative to the OPF's folder) are normalized: fragments
+      dropped, %-escapes decoded, './' and '../' resolved;
+    - members are only read when asked for, whole (read(), read_text())
+      or streamed in blocks (open_member(), iter_text());
+    - read_toc() gives the table of contents (EPUB3 nav, else EPUB2 NCX),
+      landmark_types() and non_linear_members() what front/back matter it marks.
+
+        with EpubArchive("book.epub") as epub:
+            for href, member in epub.spine_members():
+                html_content = epub.read_text(member)
+    """
+
+    CONTAINER_PATH = "META-INF/container.xml"
+    CONTAINER_NS = {"container": "urn:oasis:names:tc:opendocument:xmlns:container"}
+    OPF_NS = {"opf": "http://www.idpf.org/2007/opf"}
+    NCX_NS = {"ncx": "http://www.daisy.org/z3986/2005/ncx/"}
+    XHTML_NS = "http://www.w3.org/1999/xhtml"
+    EPUB_TYPE = "{http://www.idpf.org/2007/ops}type"
+
+    def __init__(self, epub_file_path):
+        self.path = epub_file_path
+        self.zip_file = zipfile.ZipFile(epub_file_path, "r")
+        self.members = {info.filename: info for info in self.zip_file.infolist()}
+        self.members_by_lower_name = None
+        self.opf_path = self.find_opf_path()
+        self.opf_dir = posixpath.dirname(self.opf_path)
+        self.opf_content = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.zip_file.close()
+
+    def find_opf_path(self):
+        """The OPF member: container.xml's first rootfile, else the first .opf."""
+        if self.CONTAINER_PATH in self.members:
+            container = ET.fromstring(self.zip_file.read(self.CONTAINER_PATH))
+            rootfile = container.find(".//container:rootfile", self.CONTAINER_NS)
+            if rootfile is not None and rootfile.get("full-path"):
+                opf_path = self.find_member(rootfile.get("full-path"))
+                if opf_path is not None:
+                    return opf_path
+
+        for name in self.members:
+            if name.lower().endswith(".opf"):
+                return name
+
+        raise ValueError(f"No OPF package file in {self.path}")
+
+    def find_member(self, name):
+        """The member called name (or, failing that, differing only in case), or None."""
+        if name in self.members:
+            return name
+
+        if self.members_by_lower_name is None:
+            self.members_by_lower_name = {}
+            for member in self.members:
+                self.members_by_lower_name.setdefault(member.lower(), member)
+        return self.members_by_lower_name.get(name.lower())
+
+    def resolve_href(self, href, base_dir=None):
+        """
+        The member an href points to, or None.
+
+        Args:
+            href (str): e.g. 'Text/chapter%201.xhtml#p3' or '../Images/a.jpg'
+            base_dir (str): the folder it is relative to, default the OPF's
+        """
+        if base_dir is None:
+            base_dir = self.opf_dir
+
+        path = href.split("#", 1)[0].strip()
+        if not path:
+            return None
+
+        for candidate in (urllib.parse.unquote(path), path):
+            if candidate.startswith("/"):
+                # relative to the root of the container
+                candidate = candidate.lstrip("/")
+            else:
+                candidate = posixpath.join(base_dir, candidate)
+            member = self.find_member(posixpath.normpath(candidate))
+            if member is not None:
+                return member
+
+        return None
+
+    def read_opf(self):
+        """The OPF package file's text (read once)."""
+        if self.opf_content is None:
+            self.opf_content = self.read_text(self.opf_path)
+        return self.opf_content
+
+    def spine_members(self):
+        """(href, member or None if missing) for each spine html file, in reading order."""
+        return [
+            (href, self.resolve_href(href))
+            for href in get_ordered_html_files(self.read_opf())
+        ]
+
+    def read_toc(self):
+        """
+        The table of contents: the EPUB3 nav document's toc nav
+        (else the EPUB2 NCX's navMap), in reading order.
+
+        Returns:
+            list: {"title", "level" (1 = top), "path" (titles from the top
+                  level down), "href", "member" (None if not in the archive),
+                  "fragment" (the id after '#', or None)}; empty if there is none
+        """
+        package = ET.fromstring(self.read_opf())
+        items = package.findall("opf:manifest/opf:item", self.OPF_NS)
+        spine = package.find("opf:spine", self.OPF_NS)
+        toc_id = spine.get("toc") if spine is not None else None
+
+        nav_hrefs = [
+            (item.get("href"), self.read_nav_entries)
+            for item in items
+            if "nav" in (item.get("properties") or "").split()
+        ]
+        ncx_hrefs = [
+            (item.get("href"), self.read_ncx_entries)
+            for item in items
+            if item.get("id") == toc_id
+            or item.get("media-type") == "application/x-dtbncx+xml"
+        ]
+
+        for href, read_entries in nav_hrefs[:1] + ncx_hrefs[:1]:
+            member = self.resolve_href(href or "")
+            if member is None:
+                continue
+            try:
+                toc_root = ET.fromstring(self.read(member))
+            except ET.ParseError:
+                continue
+
+            entries = []
+            read_entries(toc_root, posixpath.dirname(member), entries)
+            if entries:
+                return entries
+
+        return []
+
+    def non_linear_members(self):
+        """The spine members marked linear="no" (not part of the main reading order)."""
+        package = ET.fromstring(self.read_opf())
+        hrefs = {
+            item.get("id"): item.get("href")
+            for item in package.findall("opf:manifest/opf:item", self.OPF_NS)
+        }
+
+        members = set()
+        for itemref in package.findall("opf:spine/opf:itemref", self.OPF_NS):
+            if (itemref.get("linear") or "").strip().lower() == "no":
+                member = self.resolve_href(hrefs.get(itemref.get("idref")) or "")
+                if member is not None:
+                    members.add(member)
+        return members
+
+    def landmark_types(self):
+        """
+        member -> the types the OPF guide (EPUB2) and the nav document's
+        landmarks (EPUB3) give it, e.g. {"Text/copyright.xhtml": {"copyright-page"}}
+        """
+        package = ET.fromstring(self.read_opf())
+        types = collections.defaultdict(set)
+
+        def add_type(href, base_dir, type_names):
+            member = self.resolve_href(href or "", base_dir)
+            if member is not None:
+                types[member].update(type_names.lower().split())
+
+        for reference in package.findall("opf:guide/opf:reference", self.OPF_NS):
+            add_type(reference.get("href"), self.opf_dir, reference.get("type") or "")
+
+        for item in package.findall("opf:manifest/opf:item", self.OPF_NS):
+            if "nav" not in (item.get("properties") or "").split():
+                continue
+            member = self.resolve_href(item.get("href") or "")
+            if member is None:
+                continue
+            try:
+                nav_root = ET.fromstring(self.read(member))
+            except ET.ParseError:
+                continue
+
+            for nav in nav_root.iter(f"{{{self.XHTML_NS}}}nav"):
+                if "landmarks" not in (nav.get(self.EPUB_TYPE) or "").split():
+                    continue
+                for link in nav.iter(f"{{{self.XHTML_NS}}}a"):
+                    add_type(
+                        link.get("href"),
+                        posixpath.dirname(member),
+                        link.get(self.EPUB_TYPE) or "",
+                    )
+
+        return dict(types)
+
+    def add_toc_entry(self, entries, title, href, parent_path, base_dir):
+        """Appends one table of contents entry, returns its path."""
+        path = parent_path + [" ".join(title.split())]
+        fragment = None
+        if href and "#" in href:
+            fragment = urllib.parse.unquote(href.split("#", 1)[1]) or None
+
+        entries.append(
+            {
+                "title": path[-1],
+                "level": len(path),
+                "path": path,
+                "href": href,
+                "member": self.resolve_href(href, base_dir) if href else None,
+                "fragment": fragment,
+            }
+        )
+        return path
+
+    def read_nav_entries(self, nav_root, base_dir, entries, nav_list=None, parent_path=()):
+        """The entries of a nav document's toc nav (or first nav), nested lists in order."""
+        if nav_list is None:
+            navs = list(nav_root.iter(f"{{{self.XHTML_NS}}}nav"))
+            toc_navs = [
+                nav for nav in navs if "toc" in (nav.get(self.EPUB_TYPE) or "").split()
+            ]
+            if not navs:
+                return
+            nav_list = (toc_navs or navs)[0].find(f".//{{{self.XHTML_NS}}}ol")
+            if nav_list is None:
+                return
+
+        for item in nav_list.findall(f"{{{self.XHTML_NS}}}li"):
+            label = item.find(f"{{{self.XHTML_NS}}}a")
+            if label is None:
+                label = item.find(f"{{{self.XHTML_NS}}}span")
+
+            path = list(parent_path)
+            if label is not None:
+                path = self.add_toc_entry(
+                    entries, "".join(label.itertext()), label.get("href"), path, base_dir
+                )
+
+            sub_list = item.find(f"{{{self.XHTML_NS}}}ol")
+            if sub_list is not None:
+                self.read_nav_entries(nav_root, base_dir, entries, sub_list, path)
+
+    def read_ncx_entries(self, ncx_root, base_dir, entries, nav_point=None, parent_path=()):
+        """The entries of an NCX's navMap, nested navPoints in order."""
+        if nav_point is None:
+            nav_point = ncx_root.find("ncx:navMap", self.NCX_NS)
+            if nav_point is None:
+                return
+
+        for child in nav_point.findall("ncx:navPoint", self.NCX_NS):
+            label = child.find("ncx:navLabel/ncx:text", self.NCX_NS)
+            content = child.find("ncx:content", self.NCX_NS)
+
+            path = self.add_toc_entry(
+                entries,
+                "".join(label.itertext()) if label is not None else "",
+                content.get("src") if content is not None else None,
+                list(parent_path),
+                base_dir,
+            )
+            self.read_ncx_entries(ncx_root, base_dir, entries, child, path)
+
+    def member_size(self, member):
+        """A member's uncompressed size in bytes (nothing is read)."""
+        return self.members[member].file_size
+
+    def member_key(self, member):
+        """A member's content key (see zip_member_key())."""
+        return zip_member_key(self.members[member])
+
+    def read(self, member):
+        """A member's bytes."""
+        return self.zip_file.read(member)
+
+    def read_text(self, member, encoding="utf-8"):
+        """A member's text."""
+        return self.zip_file.read(member).decode(encoding)
+
+    def open_member(self, member):
+        """A member as a binary file object, decompressed as it is read."""
+        return self.zip_file.open(member, "r")
+
+    def iter_text(self, member, encoding="utf-8", block_size=1024 * 1024):
+        """A member's text in pieces, decompressed and decoded block_size bytes at a time."""
+        decoder = codecs.getincrementaldecoder(encoding)()
+        with self.open_member(member) as member_file:
+            for block in iter(functools.partial(member_file.read, block_size), b""):
+                text = decoder.decode(block)
+                if text:
+                    yield text
+        text = decoder.decode(b"", final=True)
+        if text:
+            yield text
+
+
+# BeautifulSoup replaces strings of only these (outside pre/textarea)
+# with one newline (if there is one) or space
+HTML_ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+
+# named character reference (without ';') -> text
+HTML_ENTITY_TEXT = {
+    name[:-1]: text for name, text in html.entities.html5.items() if name.endswith(";")
+}
+
+
+def html_numeric_reference_text(name):
+    """
+    The text for a numeric character reference ('8217', 'x2019'),
+    as BeautifulSoup's html.parser builder resolves it
+    (0, surrogates, and out of range -> U+FFFD; 0x80-0x9f as windows-1252).
+    """
+    base, digits = 10, "0123456789"
+    if name[:1] in ("x", "X"):
+        name = name[1:]
+        base, digits = 16, "0123456789abcdef"
+
+    try:
+        number = int(name, base)
+        extra = ""
+    except ValueError:
+        length = 0
+        while length < len(name) and name[length] in digits:
+            length += 1
+        if not length:
+            return name
+        number, extra = int(name[:length], base), name[length:]
+
+    if number == 0 or number > 0x10FFFF or 0xD800 <= number <= 0xDFFF:
+        return "\ufffd" + extra
+    if 0x80 <= number <= 0x9F:
+        try:
+            return bytes([number]).decode("cp1252") + extra
+        except UnicodeDecodeError:
+            pass
+    return chr(number) + extra
+
+
+class HtmlTextParser(HTMLParser):
+    """
+    html.parser events -> the text BeautifulSoup(html, "html.parser").get_text()
+    returns, without building a tree.
+
+    Mirrors how BeautifulSoup turns the same events into strings: a string
+    ends at every tag, comment, or declaration; whitespace-only strings
+    are collapsed; comments, doctypes, and processing instructions are
+    left out, as are strings inside script, style, template, rt, and rp
+    (but not CDATA sections). Tags are opened and closed on a stack of
+    names as BeautifulSoup does (an end tag closes the most recent open
+    tag of its name, void tags close at once).
+    """
+
+    VOID_TAGS = frozenset(
+        [
+            "area", "base", "basefont", "bgsound", "br", "col", "command",
+            "embed", "frame", "hr", "image", "img", "input", "isindex",
+            "keygen", "link", "menuitem", "meta", "nextid", "param",
+            "source", "spacer", "track", "wbr",
+        ]
+    )
+    PRESERVE_WHITESPACE_TAGS = frozenset(["pre", "textarea"])
+    NO_TEXT_TAGS = frozenset(["rt", "rp", "style", "script", "template"])
+
+    def __init__(self, anchors=None):
+        super().__init__(convert_charrefs=False)
+        self.text = []
+        self.text_length = 0
+        # ids to find -> offset in the text where their element starts
+        self.anchors = anchors if anchors is not None else {}
+        self.current_data = []
+        self.open_tags = []
+        # positions in open_tags of open pre/textarea, and script/style/...
+        self.preserve_positions = []
+        self.no_text_positions = []
+        # void tags closed at their start tag, whose end tag is ignored once
+        self.already_closed = []
+
+    def end_string(self, always_text=False):
+        """Ends the current string (BeautifulSoup's endData())."""
+        if not self.current_data:
+            return
+
+        data = "".join(self.current_data)
+        self.current_data = []
+
+        if not self.preserve_positions and not data.strip(HTML_ASCII_SPACES):
+            data = "\n" if "\n" in data else " "
+
+        if always_text or not self.no_text_positions:
+            self.text.append(data)
+            self.text_length += len(data)
+
+    def close_tags(self, position):
+        """Closes the open tags from position on."""
+        del self.open_tags[position:]
+        while self.preserve_positions and self.preserve_positions[-1] >= position:
+            self.preserve_positions.pop()
+        while self.no_text_positions and self.no_text_positions[-1] >= position:
+            self.no_text_positions.pop()
+
+    def handle_starttag(self, tag, attrs, is_start_end=False):
+        self.end_string()
+
+        if self.anchors:
+            for name, value in attrs:
+                if name in ("id", "name") and self.anchors.get(value, 0) is None:
+                    self.anchors[value] = self.text_length
+
+        position = len(self.open_tags)
+        self.open_tags.append(tag)
+        if tag in self.PRESERVE_WHITESPACE_TAGS:
+            self.preserve_positions.append(position)
+        if tag in self.NO_TEXT_TAGS:
+            self.no_text_positions.append(position)
+
+        if tag in self.VOID_TAGS and not is_start_end:
+            self.handle_endtag(tag, check_already_closed=False)
+            self.already_closed.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, is_start_end=True)
+        self.handle_endtag(tag, check_already_closed=False)
+
+    def handle_endtag(self, tag, check_already_closed=True):
+        if check_already_closed and tag in self.already_closed:
+            self.already_closed.remove(tag)
+            return
+
+        self.end_string()
+        for position in range(len(self.open_tags) - 1, -1, -1):
+            if self.open_tags[position] == tag:
+                self.close_tags(position)
+                break
+
+    def handle_data(self, data):
+        self.current_data.append(data)
+
+    def handle_entityref(self, name):
+        text = HTML_ENTITY_TEXT.get(name)
+        self.current_data.append(text if text is not None else "&" + name)
+
+    def handle_charref(self, name):
+        self.current_data.append(html_numeric_reference_text(name))
+
+    def handle_comment(self, data):
+        self.end_string()
+
+    def handle_decl(self, decl):
+        self.end_string()
+
+    def handle_pi(self, data):
+        self.end_string()
+
+    def unknown_decl(self, data):
+        self.end_string()
+        if data.upper().startswith("CDATA["):
+            self.current_data.append(data[len("CDATA[") :])
+            self.end_string(always_text=True)
+
+
+def html_to_text_fast(html_content, anchors=None):
+    """
+    An html document's text, streamed through HtmlTextParser (no tree).
+    html_content: a str, or an iterable of str pieces (e.g. EpubArchive.iter_text())
+    """
+    parser = HtmlTextParser(anchors)
+    if isinstance(html_content, str):
+        html_content = [html_content]
+    for piece in html_content:
+        parser.feed(piece)
+    parser.close()
+    parser.end_string()
+    return "".join(parser.text)
+
+
+def html_to_text_bs4(html_content, anchors=None):
+    """An html document's text, from a BeautifulSoup tree (anchors are not found)."""
+    BeautifulSoup = import_backend("bs4").BeautifulSoup
+    soup = BeautifulSoup(html_content, "html.parser")
+    return soup.get_text()
+
+
+# HTML_TEXT_ENGINE -> html to text function
+HTML_TEXT_ENGINES = {
+    "fast": html_to_text_fast,
+    "bs4": html_to_text_bs4,
+}
+
+
+def html_to_text(html_content, engine=None, anchors=None):
+    """
+    An html document's text with HTML_TEXT_ENGINE,
+    falling back to BeautifulSoup if the engine fails.
+
+    anchors (optional dict): {element id: None}; the engine fills in the
+    offset in the text where each element starts (ids not found stay None)
+    """
+    engine = engine or HTML_TEXT_ENGINE
+    if engine == "bs4":
+        return html_to_text_bs4(html_content, anchors)
+
+    try:
+        return HTML_TEXT_ENGINES[engine](html_content, anchors)
+    except Exception as e:
+        print(f"html text engine {engine} failed ({e!r}), using bs4")
+        if anchors:
+            anchors.update(dict.fromkeys(anchors))
+        return html_to_text_bs4(html_content, anchors)
+
+
+def extract_text_from_html(html_content, this_epub_output_dir_path, anchors=None):
     """
     Extracts and returns text from an HTML content.
     """
@@ -479,8 +1510,7 @@ def extract_text_from_html(html_content, this_epub_output_dir_path):
         this_epub_output_dir_path,
     )  # Print first 500 characters of HTML
 
-    soup = BeautifulSoup(html_content, "html.parser")
-    parsed_text = soup.get_text()
+    parsed_text = html_to_text(html_content, anchors=anchors)
     # print("Extracted Text:\n", parsed_text[:500])  # Print first 500 characters of extracted text
     print_and_log(
         f"len(Extracted Text) -> {len(parsed_text)}", this_epub_output_dir_path
@@ -489,34 +1519,73 @@ def extract_text_from_html(html_content, this_epub_output_dir_path):
     return parsed_text
 
 
+def stream_text_from_epub_html(epub, member, this_epub_output_dir_path, anchors=None):
+    """
+    Extracts and returns the text of an epub's html file with the 'fast'
+    engine, streamed from the zip into the parser (the whole html is never
+    held in memory), logged as extract_text_from_html() does.
+
+    Returns:
+        str: the text, or None if the engine failed (anchors are reset)
+    """
+    html_length = 0
+
+    def counted_pieces():
+        nonlocal html_length
+        for piece in epub.iter_text(member):
+            html_length += len(piece)
+            yield piece
+
+    try:
+        parsed_text = html_to_text_fast(counted_pieces(), anchors)
+    except Exception as e:
+        print(f"html text engine fast failed ({e!r}), reading {member} whole")
+        if anchors:
+            anchors.update(dict.fromkeys(anchors))
+        return None
+
+    print_and_log(
+        f"\nlen(HTML Content before BeautifulSoup Parsing) -> {html_length}",
+        this_epub_output_dir_path,
+    )
+    print_and_log(f"len(Extracted Text) -> {len(parsed_text)}", this_epub_output_dir_path)
+
+    return parsed_text
+
+
 def fix_text_formatting(text):
     """Replaces the Unicode right single quotation mark with a standard apostrophe."""
     return text.replace("\u2019", "'")
 
 
-def check_len_chunks_in_list(chunks_list, max_chunk_size, this_epub_output_dir_path):
-
-    size_flag_ok = True
-
-    for index, this_chunk in enumerate(chunks_list):
+def check_len_chunk(this_chunk, max_chunk_size, this_epub_output_dir_path):
+    """
+    Checks (and logs) one chunk's size against the max size.
 
-        # get size of chunk
-        this_length = len(this_chunk)
+    Returns:
+        bool: True if the chunk is not over max size
+    """
+    # get size of chunk
+    this_length = len(this_chunk)
 
-        # check size against user-input max size
-        if this_length > max_chunk_size:
-            print_and_log(this_length, this_epub_output_dir_path)
-            print_and_log(
-                f"""
+    # check size against user-input max size
+    if this_length > max_chunk_size:
+        print_and_log(this_length, this_epub_output_dir_path)
+        print_and_log(
+            f"""
             Warning: chunk over max size.
             This chunk size: {len(this_chunk)}.
             Max size: {max_chunk_size}
             """,
-                this_epub_output_dir_path,
-            )
-            print_and_log(f"This chunk: {len(this_chunk)}", this_epub_output_dir_path)
-            size_flag_ok = False
+            this_epub_output_dir_path,
+        )
+        print_and_log(f"This chunk: {len(this_chunk)}", this_epub_output_dir_path)
+        return False
 
+    return True
+
+
+def report_size_check(size_flag_ok, this_epub_output_dir_path):
     # report and log
     if size_flag_ok:
         print_and_log("Size Check, OK \\o/", this_epub_output_dir_path)
@@ -524,7 +1593,22 @@ def check_len_chunks_in_list(chunks_list, max_chunk_size, this_epub_output_dir_p
         print_and_log("WARNING: Size Check Failed!", this_epub_output_dir_path)
 
 
-def save_individual_chunks(chunks_list, output_chunks_dir, chunk_source_name):
+def check_len_chunks_in_list(chunks_list, max_chunk_size, this_epub_output_dir_path):
+
+    size_flag_ok = True
+
+    for index, this_chunk in enumerate(chunks_list):
+        if not check_len_chunk(this_chunk, max_chunk_size, this_epub_output_dir_path):
+            size_flag_ok = False
+
+    report_size_check(size_flag_ok, this_epub_output_dir_path)
+
+
+def make_chunk_output_dir(output_chunks_dir):
+    """
+    Creates the chunk_text_files directory (spaces replaced by '_'),
+    and returns its absolute path.
+    """
     # Strip non-alphanumeric characters from the directory name
     # Remove spaces from the output_chunks_dir path
     new_output_chunks_dir = re.sub(r"\s+", "_", output_chunks_dir)
@@ -541,76 +1625,74 @@ def save_individual_chunks(chunks_list, output_chunks_dir, chunk_source_name):
             print_and_log(traceback.format_exc())  # This will print the stack trace
             raise e
 
-    for index, this_chunk in enumerate(chunks_list):
-        chunk_name = f"{chunk_source_name}_{index}.txt"
-
-        # remove spaces
-        chunk_name = re.sub(r"\s+", "_", chunk_name)
-
-        # # Save individual txt files
-        # print('new_output_chunks_dir -> ', new_output_chunks_dir)
-        # print('chunk_name -> ', chunk_name)
+    return new_output_chunks_dir
 
-        # Get just the file name
-        chunk_name = os.path.basename(chunk_name)
 
-        # print('chunk_name -> ', chunk_name)
-        # print(f"os.path.exists(new_output_chunks_dir) -> {os.path.exists(new_output_chunks_dir)}")
+def make_chunk_file_name(chunk_source_name, index):
+    """The .txt file name of one chunk, e.g. 'chap1_0.txt'."""
+    chunk_name = f"{chunk_source_name}_{index}.txt"
 
-        individual_chunk_path = os.path.join(new_output_chunks_dir, chunk_name)
-        # print('individual_chunk_path -> ', individual_chunk_path)
+    # remove spaces
+    chunk_name = re.sub(r"\s+", "_", chunk_name)
 
-        with open(individual_chunk_path, "w") as f:
-            f.write(this_chunk)
-            # print('chunk written', individual_chunk_path)
+    # Get just the file name
+    return os.path.basename(chunk_name)
 
-        ###################
-        # save to txt.pool
-        ###################
 
-        pool_output_chunks_dir = "txt_pool"
+def save_individual_chunk(
+    this_chunk,
+    index,
+    new_output_chunks_dir,
+    chunk_source_name,
+    pool_output_chunks_dir="txt_pool",
+):
+    """
+    Saves one chunk as a .txt file in the document's chunk directory
+    and in the pool directory.
+    """
+    chunk_name = make_chunk_file_name(chunk_source_name, index)
 
-        if not os.path.exists(pool_output_chunks_dir):
-            try:
-                os.makedirs(pool_output_chunks_dir)
-            except Exception as e:
-                print_and_log(traceback.format_exc())  # This will print the stack trace
-                raise e
+    individual_chunk_path = os.path.join(new_output_chunks_dir, chunk_name)
 
-        individual_chunk_path = os.path.join(pool_output_chunks_dir, chunk_name)
-        print("pool_output_chunks_dir -> ", pool_output_chunks_dir)
-        print("individual_chunk_path -> ", individual_chunk_path)
+    write_output(individual_chunk_path, this_chunk)
 
-        with open(individual_chunk_path, "w") as f:
-            f.write(this_chunk)
+    ###################
+    # save to txt.pool
+    ###################
 
-    return len(chunks_list)
+    if not os.path.exists(pool_output_chunks_dir):
+        try:
+            os.makedirs(pool_output_chunks_dir)
+        except Exception as e:
+            print_and_log(traceback.format_exc())  # This will print the stack trace
+            raise e
 
+    individual_chunk_path = os.path.join(pool_output_chunks_dir, chunk_name)
+    print("pool_output_chunks_dir -> ", pool_output_chunks_dir)
+    print("individual_chunk_path -> ", individual_chunk_path)
 
-def append_chunks_to_jsonl(chunks_list, output_chunks_jsonl_path, chunk_source_name):
-    """Appends chunks of text to a .jsonl file, each chunk as a JSON object.
+    write_output(individual_chunk_path, this_chunk)
 
-    Args:
-        chunks_list (list): List of text chunks to be appended.
-        output_jsonl_path (str): The output file path for the .jsonl file.
-        chunk_source_name (str): Base name for each chunk, used in the 'source_name' field.
 
-    Returns:
-        int: The number of chunks appended.
+def make_chunk_jsonl_line(
+    this_chunk, index, chunk_source_name, chapter=None, boilerplate=None
+):
     """
+    One line of chunks_jsonl_all.jsonl
+    (with the chunk's chapter path and boilerplate reasons, if given).
+    """
+    # Construct a JSON object for the chunk
+    chunk_data = {
+        "source_name": f"{chunk_source_name}_{index}",
+        "text": this_chunk,
+    }
+    if chapter is not None:
+        chunk_data["chapter"] = chapter
+    if boilerplate:
+        chunk_data["boilerplate"] = boilerplate
 
-    with open(output_chunks_jsonl_path, "a") as f:  # Open file in append mode
-        for index, this_chunk in enumerate(chunks_list):
-            # Construct a JSON object for the chunk
-            chunk_data = {
-                "source_name": f"{chunk_source_name}_{index}",
-                "text": this_chunk,
-            }
-
-            # Convert the chunk data to a JSON string and append it to the file with a newline
-            f.write(json.dumps(chunk_data) + "\n")
-
-    return len(chunks_list)
+    # Convert the chunk data to a JSON string, with a newline
+    return json.dumps(chunk_data) + "\n"
 
 
 def print_and_log(input_text, this_epub_output_dir_path):
@@ -625,390 +1707,603 @@ def print_and_log(input_text, this_epub_output_dir_path):
     log_file_path = os.path.join(this_epub_output_dir_path, "log.txt")
 
     # log: Write/Append to a log.txt file
-    with open(log_file_path, "a") as f:
-        f.write(input_text + "\n\n")
+    write_output(log_file_path, input_text + "\n\n", "a")
 
 
-def extract_text_from_epub(
-    epub_file_path,
-    this_txt_output_dir_path,
-    output_jsonl_path,
-    output_json_dir,
-    output_whole_txt_path,
-    output_txt_dir,
-    output_chunks_jsonl_path,
-    output_chunks_dir,
-    max_chunk_size=MAX_CHUNK_SIZE,
-):
+####################
+# background writer
+####################
+"""
+While a document is being processed (see background_writer()),
+chunk .txt files and log lines are written by writer thread(s),
+so parsing and chunking go on while earlier output goes to disk.
+
+Output records are collected into batches (WRITER_BATCH_SIZE records),
+which go into a bounded queue per writer thread: when the writers fall
+behind, the producer waits, so memory stays bounded. Writers keep files
+that are appended to (log.txt) open between records. A file always goes
+to the same writer, so writes to it stay in order.
+
+flush_output_writer() is a barrier: it returns once everything queued
+before it is written (journal checkpoints and zipping wait on it).
+Without a running writer, write_output() writes inline.
+"""
 
-    with zipfile.ZipFile(epub_file_path, "r") as epub:
-        print_and_log(f"EPUB Contents: -> {epub.namelist()}", this_epub_output_dir_path)
+# the running writer, None -> write inline
+output_writer = None
 
-        ###################
-        # Make Directories
-        ###################
 
-        # Create a directory for individual JSON files
-        if not os.path.exists(output_json_dir):
-            os.makedirs(output_json_dir)
+def write_output_record(record, append_files):
+    """Writes one (path, text, mode, encoding) record."""
+    path, text, mode, encoding = record
 
-        # Create a directory for individual txt files
-        if not os.path.exists(output_txt_dir):
-            os.makedirs(output_txt_dir)
+    if mode == "a":
+        if path not in append_files:
+            append_files[path] = open(path, "a", encoding=encoding)
+        append_files[path].write(text)
 
-        # Create a directory for chunks output_chunks_dir
-        if not os.path.exists(output_chunks_dir):
-            os.makedirs(output_chunks_dir)
+    else:
+        with open(path, mode, encoding=encoding) as f:
+            f.write(text)
 
-        ##################################
-        # Get & Read html files from epub
-        ##################################
-        # find opf file
-        opf_file = [f for f in epub.namelist() if "content.opf" in f][0]
 
-        # read opf file
-        opf_content = epub.read(opf_file).decode("utf-8")
+def run_output_writer(batch_queue, errors):
+    """
+    A writer thread: writes batches of records from batch_queue until it gets None.
+    A (threading.Event,) record is a flush: open files are closed, then
+    the event is set. After an error, records are dropped (the error is
+    raised in the producer), but flushes are still answered.
+    """
+    append_files = {}
 
-        # get ordered HTML files
-        ordered_html_files_list = get_ordered_html_files(opf_content)
+    def close_append_files():
+        for f in append_files.values():
+            f.close()
+        append_files.clear()
 
-        ############################################
-        # Read and extract text from each HTML file
-        ############################################
+    while True:
+        batch = batch_queue.get()
+        if batch is None:
+            close_append_files()
+            return
 
-        # iterate through html files
-        for html_file in ordered_html_files_list:
-            full_path = os.path.join(os.path.dirname(opf_file), html_file)
-            if full_path in epub.namelist():
-                html_content = epub.read(full_path).decode("utf-8")
-
-                #########################
-                # extract text from epub
-                #########################
-                raw_text = extract_text_from_html(
-                    html_content, this_epub_output_dir_path
-                )
-                print_and_log(
-                    f"len(text for json)-> {len(raw_text)}", this_epub_output_dir_path
-                )
+        started = time.perf_counter()
+        for record in batch:
+            try:
+                if len(record) == 1:
+                    close_append_files()
+                    record[0].set()
+                elif not errors:
+                    write_output_record(record, append_files)
+            except Exception as e:
+                errors.append(e)
+                if len(record) == 1:
+                    record[0].set()
+        record_span(
+            "write_batch", started, time.perf_counter(), "writer", {"records": len(batch)}
+        )
 
-                # fix text formatting
-                text = fix_text_formatting(raw_text)
 
-                #################
-                # .json & .jsonl
-                #################
+def raise_writer_error(writer):
+    """Raises the first error of a writer thread in the producer."""
+    if writer["errors"]:
+        raise writer["errors"][0]
 
-                # Write/Append to a single JSONL file
-                with open(output_jsonl_path, "a") as f:
-                    json_record = json.dumps({"text": text.strip()})
-                    f.write(json_record + "\n")
 
-                # Save individual JSON file
-                individual_json_path = os.path.join(
-                    output_json_dir, f"{os.path.splitext(html_file)[0]}.json"
-                )
-                with open(individual_json_path, "w") as f:
-                    json.dump({"text": text.strip()}, f, indent=4)
+def start_output_writer(threads=WRITER_THREADS, queue_size=WRITER_QUEUE_SIZE):
+    """Starts the writer threads (see the 'background writer' notes)."""
+    writer = {"queues": [], "batches": [], "threads": [], "errors": []}
 
-                #######
-                # .txt
-                #######
+    for index in range(threads):
+        batch_queue = queue.Queue(maxsize=queue_size)
+        thread = threading.Thread(
+            target=run_output_writer,
+            args=(batch_queue, writer["errors"]),
+            name=f"output_writer_{index}",
+            daemon=True,
+        )
+        thread.start()
+        writer["queues"].append(batch_queue)
+        writer["batches"].append([])
+        writer["threads"].append(thread)
 
-                # Write/Append to a single text .txt file
-                with open(output_whole_txt_path, "a") as f:
-                    f.write(text + "\n\n")
+    return writer
 
-                # Save individual txt files
-                individual_txt_path = os.path.join(
-                    output_txt_dir, f"{os.path.splitext(html_file)[0]}.txt"
-                )
-                with open(individual_txt_path, "w") as f:
-                    f.write(text)
 
-                #########
-                # chunks
-                #########
+def send_output_batch(writer, index):
+    """Queues writer index's batch (waiting while its queue is full)."""
+    if writer["batches"][index]:
+        # a span only if the queue was full (the writer fell behind)
+        with trace_span("writer_queue_full", "wait"):
+            writer["queues"][index].put(writer["batches"][index])
+        writer["batches"][index] = []
 
-                chunks_list = make_chunk_list(
-                    text, max_chunk_size, this_epub_output_dir_path
-                )
 
-                chunk_source_name = os.path.splitext(html_file)[0]
+def flush_output_writer(writer=None):
+    """Waits until everything queued so far is written (no-op without a writer)."""
+    writer = writer or output_writer
+    if writer is None:
+        return
 
-                # check sizes
-                check_len_chunks_in_list(
-                    chunks_list, max_chunk_size, this_epub_output_dir_path
-                )
+    flushed = []
+    for index, batch in enumerate(writer["batches"]):
+        event = threading.Event()
+        batch.append((event,))
+        send_output_batch(writer, index)
+        flushed.append(event)
 
-                number_of_chunks = save_individual_chunks(
-                    chunks_list, output_chunks_dir, chunk_source_name
-                )
-                print_and_log(
-                    f"Chunked: split into this many chunks-> {number_of_chunks}",
-                    this_epub_output_dir_path,
-                )
+    with trace_span("writer_flush", "wait"):
+        for event in flushed:
+            event.wait()
 
-                append_chunks_to_jsonl(
-                    chunks_list, output_chunks_jsonl_path, chunk_source_name
-                )
+    raise_writer_error(writer)
 
-                print_and_log(f"{html_file} -> ok!", this_epub_output_dir_path)
 
-            else:  # File Not Found
-                print_and_log(
-                    f"Warning: File {full_path} not found in the archive.",
-                    this_epub_output_dir_path,
-                )
+def stop_output_writer(writer):
+    """Writes everything still queued, then stops the writer threads."""
+    for index, batch_queue in enumerate(writer["queues"]):
+        send_output_batch(writer, index)
+        batch_queue.put(None)
 
+    for thread in writer["threads"]:
+        thread.join()
 
-def extract_text_from_txt(
-    text_file_path,
-    this_txt_output_dir_path,
-    output_jsonl_path,
-    output_json_dir,
-    output_whole_txt_path,
-    output_txt_dir,
-    output_chunks_jsonl_path,
-    output_chunks_dir,
-    max_chunk_size=MAX_CHUNK_SIZE,
-):
+    raise_writer_error(writer)
 
-    # Open the file in read mode
-    with open(text_file_path, "r") as file:
 
-        ###################
-        # Make Directories
-        ###################
+@contextlib.contextmanager
+def background_writer(threads=None):
+    """
+    Runs write_output() on writer threads inside the with-block;
+    everything is written by the end of it.
+    """
+    global output_writer
 
-        # Create a directory for individual JSON files
-        if not os.path.exists(output_json_dir):
-            os.makedirs(output_json_dir)
+    if threads is None:
+        threads = WRITER_THREADS
 
-        # Create a directory for individual txt files
-        if not os.path.exists(output_txt_dir):
-            os.makedirs(output_txt_dir)
+    if threads < 1 or output_writer is not None:
+        # inline, or already running
+        yield
+        return
 
-        # Create a directory for chunks output_chunks_dir
-        if not os.path.exists(output_chunks_dir):
-            os.makedirs(output_chunks_dir)
+    output_writer = start_output_writer(threads, WRITER_QUEUE_SIZE)
+    try:
+        yield
+    finally:
+        writer, output_writer = output_writer, None
+        with stage_timer("write"):
+            stop_output_writer(writer)
 
-        #########################
-        # extract text from txt
-        #########################
-        # Read the entire contents of the file
-        text = file.read()
 
-        if text:
-            # Save individual txt files
-            text_file_path = os.path.basename(text_file_path)
+def write_output(path, text, mode="w", encoding=None):
+    """
+    Writes (mode 'w') or appends (mode 'a') text to a file:
+    queued for a writer thread if one is running, otherwise right away.
+    """
+    if output_writer is None:
+        with open(path, mode, encoding=encoding) as f:
+            f.write(text)
+        return
 
-            #################
-            # .json & .jsonl
-            #################
+    raise_writer_error(output_writer)
 
-            # Write/Append to a single JSONL file
-            with open(output_jsonl_path, "a") as f:
-                json_record = json.dumps({"text": text.strip()})
-                f.write(json_record + "\n")
+    # the same file, the same writer
+    index = 0
+    if len(output_writer["batches"]) > 1:
+        index = hash(os.path.abspath(path)) % len(output_writer["batches"])
 
-            # Save individual JSON file
-            individual_json_path = os.path.join(
-                output_json_dir, f"{os.path.splitext(text_file_path)[0]}.json"
-            )
-            with open(individual_json_path, "w") as f:
-                json.dump({"text": text.strip()}, f, indent=4)
+    batch = output_writer["batches"][index]
+    batch.append((path, text, mode, encoding))
+    if len(batch) >= WRITER_BATCH_SIZE:
+        send_output_batch(output_writer, index)
 
-            #######
-            # .txt
-            #######
 
-            # Write/Append to a single text .txt file
-            with open(output_whole_txt_path, "a") as f:
-                f.write(text + "\n\n")
+############
+# streaming
+############
 
-            # Save individual txt files
-            individual_txt_path = os.path.join(
-                output_txt_dir, f"{os.path.splitext(text_file_path)[0]}.txt"
-            )
-            with open(individual_txt_path, "w") as f:
-                f.write(text)
 
-            #########
-            # chunks
-            #########
+def batch_text_pieces(text_pieces, window_chars=None):
+    """
+    Joins small pieces of text (e.g. docx paragraphs)
+    into pieces of about window_chars characters.
+    """
+    if window_chars is None:
+        window_chars = STREAM_WINDOW_CHARS
 
-            chunks_list = make_chunk_list(
-                text, max_chunk_size, this_txt_output_dir_path
-            )
+    batch = []
+    batch_length = 0
 
-            chunk_source_name = os.path.splitext(text_file_path)[0]
+    for piece in text_pieces:
+        batch.append(piece)
+        batch_length += len(piece)
 
-            # check sizes
-            check_len_chunks_in_list(
-                chunks_list, max_chunk_size, this_txt_output_dir_path
-            )
+        if batch_length >= window_chars:
+            yield "".join(batch)
+            batch = []
+            batch_length = 0
 
-            number_of_chunks = save_individual_chunks(
-                chunks_list, output_chunks_dir, chunk_source_name
-            )
-            print_and_log(
-                f"Chunked: split into this many chunks-> {number_of_chunks}",
-                this_txt_output_dir_path,
-            )
+    if batch:
+        yield "".join(batch)
 
-            append_chunks_to_jsonl(
-                chunks_list, output_chunks_jsonl_path, chunk_source_name
-            )
 
-            print_and_log(f"{text_file_path} -> ok!", this_txt_output_dir_path)
+def split_text_into_windows(text, window_chars=None):
+    """Yields text in pieces of window_chars characters."""
+    if window_chars is None:
+        window_chars = STREAM_WINDOW_CHARS
 
-            print("OK!")
+    for start in range(0, len(text), window_chars):
+        yield text[start : start + window_chars]
 
-        else:
-            print_and_log(
-                f"{text_file_path} -> Faile, no text extracted",
-                this_txt_output_dir_path,
+
+def strip_stream_piece(piece, strip_state):
+    """
+    One piece of text.strip(), for text arriving in pieces:
+    leading whitespace is dropped, trailing whitespace is held back
+    until more (non-whitespace) text follows it.
+
+    Args:
+        piece (str): the next piece of text
+        strip_state (dict): {} to start, then passed back in for each piece
+
+    Returns:
+        str: the part of the stripped text that is now known
+    """
+    if not strip_state.get("started"):
+        piece = piece.lstrip()
+        if not piece:
+            return ""
+        strip_state["started"] = True
+
+    piece = strip_state.get("pending_whitespace", "") + piece
+    body = piece.rstrip()
+    strip_state["pending_whitespace"] = piece[len(body) :]
+
+    return body
+
+
+def chapter_of_chunk(state, marks, carried_path):
+    """
+    The chapter path of the chunk whose text starts at state["chunk_start"]:
+    that of the section's last chapter mark at or before it,
+    else the chapter carried over from the sections before.
+    """
+    while (
+        state["mark"] + 1 < len(marks)
+        and marks[state["mark"] + 1]["offset"] <= state["chunk_start"]
+    ):
+        state["mark"] += 1
+
+    state["chunk_marks"].append(state["mark"])
+
+    if state["mark"] < 0:
+        return carried_path
+    return marks[state["mark"]]["path"]
+
+
+def add_section_chapters(chapters, section):
+    """
+    Adds one written section's chapter marks and chunks to a document's
+    chapter index.
+
+    Args:
+        chapters (dict): {"path": the chapter in effect so far,
+                          "text_offset": where the next section starts in whole.txt,
+                          "entries": the index entries so far}
+        section (dict): {"section_id", "chars" (its text's length),
+                         "marks", "chunk_marks" (each chunk's mark, -1 = carried over)}
+    """
+    entries = chapters["entries"]
+    first_new = len(entries)
+
+    for mark in section["marks"]:
+        entries.append(
+            dict(
+                mark,
+                section_id=section["section_id"],
+                section_offset=mark["offset"],
+                offset=chapters["text_offset"] + mark["offset"],
+                chunks=[],
             )
+        )
 
+    for index, mark_index in enumerate(section["chunk_marks"]):
+        chunk_name = f"{section['section_id']}_{index}"
+        if mark_index >= 0:
+            entries[first_new + mark_index]["chunks"].append(chunk_name)
+        elif first_new:
+            # the chapter carried over from an earlier section
+            entries[first_new - 1]["chunks"].append(chunk_name)
 
-def extract_text_from_docx(
-    text_file_path,
-    this_txt_output_dir_path,
-    output_jsonl_path,
+    if section["marks"]:
+        chapters["path"] = section["marks"][-1]["path"]
+
+    # whole.txt has a blank line after each section
+    chapters["text_offset"] += section["chars"] + 2
+
+
+def save_chapter_index(chapters, chapter_index_path):
+    """
+    Writes a document's chapter index: its table of contents entries in
+    text order, each with where it starts and ends in whole.txt ('offset',
+    'end': the next entry at the same or a higher level), where it starts in
+    its section's .txt ('section_id', 'section_offset'), and the chunks
+    whose text starts in it.
+    """
+    entries = sorted(chapters["entries"], key=lambda entry: entry["offset"])
+    text_end = max(chapters["text_offset"] - 2, 0)
+
+    for position, entry in enumerate(entries):
+        entry["end"] = text_end
+        for later in entries[position + 1 :]:
+            if later["level"] <= entry["level"]:
+                entry["end"] = later["offset"]
+                break
+
+    fields = [
+        "title", "level", "path", "href",
+        "section_id", "section_offset", "offset", "end", "chunks",
+    ]
+    with open(chapter_index_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "text_file": "whole.txt",
+                "entries": [{field: entry[field] for field in fields} for entry in entries],
+            },
+            f,
+            indent=2,
+        )
+
+
+def write_section(
+    text_pieces,
+    section_id,
+    metadata,
+    get_output_files,
+    this_output_dir_path,
     output_json_dir,
-    output_whole_txt_path,
     output_txt_dir,
-    output_chunks_jsonl_path,
-    output_chunks_dir,
+    new_output_chunks_dir,
     max_chunk_size=MAX_CHUNK_SIZE,
+    pool_output_chunks_dir="txt_pool",
+    resume=None,
+    checkpoint=None,
+    chapters=None,
 ):
     """
-    Extracts the text from a Microsoft Word (DOCX) file.
+    Writes one section's outputs while its text is still arriving:
+    each piece is written, split into sentences and chunked, then dropped.
+    Only the current piece, the unfinished sentence, and the current chunk
+    are held in memory. The files written are the same as writing
+    the whole text at once.
 
     Args:
-        file_path (str): The path to the DOCX file.
+        text_pieces (iterable): str pieces of the section's text, in order
+        section_id (str): names the section's .json/.txt files and chunks
+        metadata (dict): see write_document_sections()
+        get_output_files (function): returns the open 'jsonl', 'whole_txt',
+                                     'chunks_jsonl' files (opening them
+                                     the first time there is text)
+        resume (dict): a journal checkpoint of this section to continue from
+                       (its files already cut back to the checkpoint,
+                       text_pieces starting after the pieces it counted)
+        checkpoint (function): called with a checkpoint dict and the section's
+                               open files, each time a piece is completely written
+        chapters (dict): the document's chapter index so far (see
+                         add_section_chapters()); with metadata 'chapter_marks',
+                         each chunk gets a chapter path, and this section's
+                         part of the index is left in chapters["section"]
 
     Returns:
-        str: The extracted text from the DOCX file.
+        int or None: number of chunks, or None if there was no text
+                     (and metadata does not ask for empty sections)
     """
+    text_pieces = iter(text_pieces)
+    marks = metadata.get("chapter_marks") if chapters is not None else None
 
-    ###################
-    # Make Directories
-    ###################
+    if resume:
+        pieces_read = resume["pieces"]
+        state = resume["state"]
+        first_pieces = []
 
-    # Create a directory for individual JSON files
-    if not os.path.exists(output_json_dir):
-        os.makedirs(output_json_dir)
+    else:
+        pieces_read = 0
+        state = {
+            "strip": {},
+            "sentences": {},
+            "chunks": {},
+            "size_flag_ok": True,
+            "number_of_chunks": 0,
+        }
+        if marks is not None:
+            state.update({"chars": 0, "chunk_start": 0, "mark": -1, "chunk_marks": []})
+
+        # nothing is written for a section with no text
+        first_pieces = []
+        for piece in text_pieces:
+            first_pieces.append(piece)
+            if piece:
+                break
+        else:
+            if not metadata.get("write_empty"):
+                return None
 
-    # Create a directory for individual txt files
-    if not os.path.exists(output_txt_dir):
-        os.makedirs(output_txt_dir)
+    text_pieces = itertools.chain(first_pieces, text_pieces)
 
-    # Create a directory for chunks output_chunks_dir
-    if not os.path.exists(output_chunks_dir):
-        os.makedirs(output_chunks_dir)
+    chunk_source_name = section_id
+    individual_json_path = os.path.join(output_json_dir, f"{section_id}.json")
+    individual_txt_path = os.path.join(
+        output_txt_dir, metadata.get("individual_txt_name", f"{section_id}.txt")
+    )
 
-    #########################
-    # extract text from docx
-    #########################
-    doc = docx.Document(text_file_path)
-    text = ""
-    for paragraph in doc.paragraphs:
-        text += paragraph.text + "\n"
-
-    if text:
-        # Save individual txt files
-        text_file_path = os.path.basename(text_file_path)
-
-        #################
-        # .json & .jsonl
-        #################
-
-        # Write/Append to a single JSONL file
-        with open(output_jsonl_path, "a") as f:
-            json_record = json.dumps({"text": text.strip()})
-            f.write(json_record + "\n")
-
-        # Save individual JSON file
-        individual_json_path = os.path.join(
-            output_json_dir, f"{os.path.splitext(text_file_path)[0]}.json"
-        )
-        with open(individual_json_path, "w") as f:
-            json.dump({"text": text.strip()}, f, indent=4)
-
-        #######
-        # .txt
-        #######
-
-        # Write/Append to a single text .txt file
-        with open(output_whole_txt_path, "a") as f:
-            f.write(text + "\n\n")
-
-        # # Save individual txt files
-        # individual_txt_path = os.path.join(output_txt_dir, f"{os.path.splitext(text_file_path)[0]}.txt")
-        # print(f"individual_txt_path -> {individual_txt_path}")
-        # with open(individual_txt_path, 'w') as f:
-        #     f.write(text)
-
-        individual_txt_path = os.path.join(output_txt_dir, text_file_path)
-        print(f"individual_txt_path -> {individual_txt_path}")
-        with open(individual_txt_path, "w", encoding="utf-8") as f:
-            f.write(text)
+    section_file_mode = "a" if resume else "w"
+
+    output_files = get_output_files()
+    jsonl_file = output_files["jsonl"]
+    whole_txt_file = output_files["whole_txt"]
+    chunks_jsonl_file = output_files["chunks_jsonl"]
+
+    with open(individual_json_path, section_file_mode) as json_file, open(
+        individual_txt_path,
+        section_file_mode,
+        encoding=metadata.get("individual_txt_encoding"),
+    ) as individual_txt_file:
+
+        # the same bytes as json.dumps({"text": text.strip()})
+        # and json.dump({"text": text.strip()}, f, indent=4)
+        if not resume:
+            jsonl_file.write('{"text": "')
+            json_file.write('{\n    "text": "')
+
+        def write_pieces():
+            """.json & .jsonl & .txt, one piece at a time, on the way to the chunker"""
+            nonlocal pieces_read
+
+            for piece in text_pieces:
+                pieces_read += 1
+
+                if piece:
+                    whole_txt_file.write(piece)
+                    individual_txt_file.write(piece)
+                    if marks is not None:
+                        state["chars"] += len(piece)
+
+                    stripped = strip_stream_piece(piece, state["strip"])
+                    if stripped:
+                        escaped = json.dumps(stripped)[1:-1]
+                        jsonl_file.write(escaped)
+                        json_file.write(escaped)
+
+                    yield piece
+
+                # back here, everything from this piece has been written
+                if checkpoint:
+                    checkpoint(
+                        {"section_id": section_id, "pieces": pieces_read, "state": state},
+                        [json_file, individual_txt_file],
+                    )
 
         #########
         # chunks
         #########
+        sentences = timed_iter(
+            iter_sentences(timed_iter(write_pieces(), "write"), state=state["sentences"]),
+            "sentence_split",
+        )
+        chunks = timed_iter(
+            iter_chunk_text(sentences, max_chunk_size, state=state["chunks"]),
+            "chunk",
+        )
+        for this_chunk in chunks:
+            index = state["number_of_chunks"]
 
-        chunks_list = make_chunk_list(text, max_chunk_size, this_txt_output_dir_path)
+            if not this_chunk:
+                print_and_log(
+                    "error None in chunk_list: write_section()", this_output_dir_path
+                )
 
-        chunk_source_name = os.path.splitext(text_file_path)[0]
+            # check sizes
+            if not check_len_chunk(this_chunk, max_chunk_size, this_output_dir_path):
+                state["size_flag_ok"] = False
+
+            chapter = None
+            if marks is not None:
+                chapter = chapter_of_chunk(state, marks, chapters["path"])
+
+            with stage_timer("write"):
+                save_individual_chunk(
+                    this_chunk,
+                    index,
+                    new_output_chunks_dir,
+                    chunk_source_name,
+                    pool_output_chunks_dir,
+                )
+                chunks_jsonl_file.write(
+                    make_chunk_jsonl_line(
+                        this_chunk,
+                        index,
+                        chunk_source_name,
+                        chapter,
+                        metadata.get("boilerplate"),
+                    )
+                )
+            state["number_of_chunks"] += 1
 
-        # check sizes
-        check_len_chunks_in_list(chunks_list, max_chunk_size, this_txt_output_dir_path)
+            if marks is not None:
+                # the sentence that ended this chunk starts the next one
+                state["chunk_start"] = state["sentences"].get("sentence_start", 0)
 
-        number_of_chunks = save_individual_chunks(
-            chunks_list, output_chunks_dir, chunk_source_name
-        )
-        print_and_log(
-            f"Chunked: split into this many chunks-> {number_of_chunks}",
-            this_txt_output_dir_path,
-        )
+        jsonl_file.write('"}\n')
+        json_file.write('"\n}')
+        whole_txt_file.write("\n\n")
 
-        append_chunks_to_jsonl(chunks_list, output_chunks_jsonl_path, chunk_source_name)
+    number_of_chunks = state["number_of_chunks"]
 
-        print_and_log(f"{text_file_path} -> ok!", this_txt_output_dir_path)
+    if marks is not None:
+        chapters["section"] = {
+            "section_id": section_id,
+            "chars": state["chars"],
+            "marks": marks,
+            "chunk_marks": state["chunk_marks"],
+        }
 
-        print("OK!")
+    print_and_log(f"len chunk list -> {number_of_chunks}", this_output_dir_path)
+    report_size_check(state["size_flag_ok"], this_output_dir_path)
+    print_and_log(
+        f"Chunked: split into this many chunks-> {number_of_chunks}",
+        this_output_dir_path,
+    )
 
-    else:
-        print_and_log(
-            f"{text_file_path} -> Faile, no text extracted", this_txt_output_dir_path
-        )
+    return number_of_chunks
 
 
-def extract_text_from_pdf(
-    text_file_path,
-    this_txt_output_dir_path,
+def write_document_sections(
+    sections,
+    this_output_dir_path,
     output_jsonl_path,
     output_json_dir,
     output_whole_txt_path,
     output_txt_dir,
     output_chunks_jsonl_path,
     output_chunks_dir,
-    overlap_size=150,
     max_chunk_size=MAX_CHUNK_SIZE,
+    pool_output_chunks_dir="txt_pool",
+    journal=None,
 ):
     """
-    Extracts the text from a Microsoft Word (DOCX) file.
-
-    Args:
-        file_path (str): The path to the DOCX file.
+    The one output path for every extractor:
+    writes the full set of outputs for a document
+    (.jsonl, .json, whole .txt, individual .txt, chunk .jsonl, chunk .txt files)
+    from the (section_id, text, metadata) stream of an extractor.
+
+    A section's text is a str, or an iterable of str pieces
+    (for text that should not be held in memory all at once).
+    metadata may set:
+        'individual_txt_name'     -> default f"{section_id}.txt"
+        'individual_txt_encoding' -> default None (the locale's)
+        'display_name'            -> for the log, default section_id
+        'write_empty'             -> write outputs even for an empty section
+        'resume_pieces'           -> function(n): the text pieces after
+                                     the first n (e.g. pdf pages), so resuming
+                                     does not read the first n again
+        'chapter_marks'           -> a list of {"title", "level", "path",
+                                     "href", "offset" (in the section's text)},
+                                     in text order; may be filled in by the
+                                     text iterator before its first piece.
+                                     Chunks then carry their chapter path,
+                                     and a chapter index is written
+                                     (CHAPTER_INDEX_FILE_NAME)
+        'boilerplate'             -> reasons the section is front/back matter,
+                                     given to each of its chunks
+
+    With a journal (see load_document_journal()), each written piece and
+    section is recorded, and a document that was interrupted
+    is continued from its last recorded piece.
 
     Returns:
-        str: The extracted text from the DOCX file.
+        int or None: total number of chunks, None if nothing was written
     """
-
     ###################
     # Make Directories
     ###################
@@ -1025,1176 +2320,5453 @@ def extract_text_from_pdf(
     if not os.path.exists(output_chunks_dir):
         os.makedirs(output_chunks_dir)
 
-    #########################
-    # extract text from docx
-    #########################
-    text = simple_extracttextfrom_pdf(text_file_path)
-
-    if text:
-        # Save individual txt files
-        text_file_path = os.path.basename(text_file_path)
+    new_output_chunks_dir = make_chunk_output_dir(output_chunks_dir)
 
-        #################
-        # .json & .jsonl
-        #################
-
-        # Write/Append to a single JSONL file
-        with open(output_jsonl_path, "a") as f:
-            json_record = json.dumps({"text": text.strip()})
-            f.write(json_record + "\n")
+    document_paths = {
+        "jsonl": output_jsonl_path,
+        "whole_txt": output_whole_txt_path,
+        "chunks_jsonl": output_chunks_jsonl_path,
+    }
 
-        # Save individual JSON file
-        individual_json_path = os.path.join(
-            output_json_dir, f"{os.path.splitext(text_file_path)[0]}.json"
+    last_record = journal["records"][-1] if journal and journal["records"] else None
+    total_chunks = last_record["total_chunks"] if last_record else None
+
+    chapters = None
+    if CHAPTER_INDEX_FILE_NAME:
+        chapters = {"path": [], "text_offset": 0, "entries": []}
+    has_chapters = False
+
+    if chapters is not None and journal:
+        for record in journal["records"]:
+            if record.get("done") and record.get("chapters"):
+                add_section_chapters(chapters, record["chapters"])
+                has_chapters = True
+
+    if last_record:
+        restore_journaled_outputs(
+            journal["records"],
+            this_output_dir_path,
+            list(document_paths.values()),
+            new_output_chunks_dir,
+            pool_output_chunks_dir,
         )
-        with open(individual_json_path, "w") as f:
-            json.dump({"text": text.strip()}, f, indent=4)
-
-        #######
-        # .txt
-        #######
-
-        # Write/Append to a single text .txt file
-        with open(output_whole_txt_path, "a") as f:
-            f.write(text + "\n\n")
-
-        # # Save individual txt files
-        # individual_txt_path = os.path.join(output_txt_dir, f"{os.path.splitext(text_file_path)[0]}.txt")
-        # print(f"individual_txt_path -> {individual_txt_path}")
-        # with open(individual_txt_path, 'w') as f:
-        #     f.write(text)
-
-        # Save individual txt files
-        base_name = os.path.basename(text_file_path)
-        individual_txt_path = os.path.join(output_txt_dir, base_name)
-        print(f"individual_txt_path -> {individual_txt_path}")
-        with open(individual_txt_path, "w", encoding="utf-8") as f:
-            f.write(text)
+        if last_record["done"]:
+            resume_point = f"after section {last_record['section']}"
+        else:
+            resume_point = (
+                f"section {last_record['section']}, after piece {last_record['pieces']}"
+            )
+        print_and_log(f"Resuming from the journal: {resume_point}", this_output_dir_path)
 
-        #########
-        # chunks
-        #########
+    with contextlib.ExitStack() as stack:
+        output_files = {}
 
-        chunks_list = make_chunk_list(
-            text, max_chunk_size, this_txt_output_dir_path, overlap_size
-        )
+        def get_output_files():
+            """the document-wide files are only created once there is text"""
+            if not output_files:
+                for name, path in document_paths.items():
+                    output_files[name] = stack.enter_context(open(path, "a"))
+            return output_files
 
-        chunk_source_name = os.path.splitext(text_file_path)[0]
+        if last_record and os.path.exists(output_jsonl_path):
+            get_output_files()
 
-        # check sizes
-        check_len_chunks_in_list(chunks_list, max_chunk_size, this_txt_output_dir_path)
+        if journal:
+            journal_file = stack.enter_context(
+                open(journal["path"], "a", encoding="utf-8")
+            )
 
-        number_of_chunks = save_individual_chunks(
-            chunks_list, output_chunks_dir, chunk_source_name
-        )
-        print_and_log(
-            f"Chunked: split into this many chunks-> {number_of_chunks}",
-            this_txt_output_dir_path,
-        )
+            def write_checkpoint(record, section_files=()):
+                # the journal only lists chunk files already written
+                flush_output_writer()
+                write_journal_record(
+                    journal_file,
+                    list(output_files.values()) + list(section_files),
+                    record,
+                    this_output_dir_path,
+                )
 
-        append_chunks_to_jsonl(chunks_list, output_chunks_jsonl_path, chunk_source_name)
+        for section_index, (section_id, text, metadata) in enumerate(sections):
+            resume = None
+            if last_record and section_index <= last_record["section"]:
+                if section_index < last_record["section"] or last_record["done"]:
+                    # already written
+                    continue
+                resume = last_record
+
+            # a section's text may arrive whole or as pieces
+            text_pieces = [text] if isinstance(text, str) else text
+
+            if resume:
+                if "resume_pieces" in metadata:
+                    text_pieces = metadata["resume_pieces"](resume["pieces"])
+                else:
+                    text_pieces = itertools.islice(text_pieces, resume["pieces"], None)
+
+            text_pieces = timed_iter(text_pieces, "read")
+
+            checkpoint = None
+            if journal:
+
+                def checkpoint(section_record, section_files, section_index=section_index):
+                    write_checkpoint(
+                        dict(
+                            section_record,
+                            section=section_index,
+                            done=False,
+                            total_chunks=total_chunks,
+                        ),
+                        section_files,
+                    )
+
+            number_of_chunks = write_section(
+                text_pieces,
+                section_id,
+                metadata,
+                get_output_files,
+                this_output_dir_path,
+                output_json_dir,
+                output_txt_dir,
+                new_output_chunks_dir,
+                max_chunk_size=max_chunk_size,
+                pool_output_chunks_dir=pool_output_chunks_dir,
+                resume=resume,
+                checkpoint=checkpoint,
+                chapters=chapters,
+            )
 
-        print_and_log(f"{text_file_path} -> ok!", this_txt_output_dir_path)
+            section_chapters = chapters.pop("section", None) if chapters else None
+            if section_chapters:
+                add_section_chapters(chapters, section_chapters)
+                has_chapters = True
 
-        print("OK!")
+            if number_of_chunks is not None:
+                total_chunks = (total_chunks or 0) + number_of_chunks
+                print_and_log(
+                    f"{metadata.get('display_name', section_id)} -> ok!",
+                    this_output_dir_path,
+                )
 
-    else:
-        print_and_log(
-            f"{text_file_path} -> Faile, no text extracted", this_txt_output_dir_path
-        )
+            if journal:
+                write_checkpoint(
+                    {
+                        "section": section_index,
+                        "section_id": section_id,
+                        "done": True,
+                        "number_of_chunks": number_of_chunks,
+                        "total_chunks": total_chunks,
+                        "chapters": section_chapters,
+                    }
+                )
 
+    if has_chapters:
+        save_chapter_index(
+            chapters, os.path.join(this_output_dir_path, CHAPTER_INDEX_FILE_NAME)
+        )
 
-def zip_folder(path_to_directory_to_zip, output_destination_zip_file_path):
-    """Creates a zip archive of a specified folder.
+    return total_chunks
 
-    Args:
-        path_to_directory_to_zip (str): The path to the folder to be zipped.
-        output_destination_zip_file_path (str): The desired name and path of the output zip file.
-    """
-    # # Specify the folder you want to zip
-    # path_to_directory_to_zip = "individual_jsons"
 
-    # # Specify the desired output zip file name (e.g., 'jsons_archive.zip')
-    # output_destination_zip_file_path = "jsons_archive_zip"
+def iter_txt_pieces(text_file_path, window_chars=None):
+    """Reads a text file in pieces of window_chars characters."""
+    if window_chars is None:
+        window_chars = STREAM_WINDOW_CHARS
 
-    shutil.make_archive(
-        output_destination_zip_file_path, "zip", path_to_directory_to_zip
-    )
+    # Open the file in read mode
+    with open(text_file_path, "r") as file:
+        for piece in iter(lambda: file.read(window_chars), ""):
+            yield piece
 
 
-###########
-# Chunking
-############
+def iter_docx_pieces(docx_file_path):
+    """The text of a .docx file, one line per paragraph, in windows."""
+    docx = import_backend("docx")
+    doc = docx.Document(docx_file_path)
 
+    return batch_text_pieces(paragraph.text + "\n" for paragraph in doc.paragraphs)
 
-def split_sentences_and_punctuation(text):
-    """Splits text into sentences, attempting to preserve punctuation and all text content.
-    Args:
-        text (str): The input text.
-    Returns:
-        list: A list of sentences with preserved punctuation.
-    """
-    ABBREVIATIONS = [
-        "Dr.",
-        "Mr.",
-        "Mrs.",
-        "Ms.",
-        "Lt.",
-        "St.",
-        "Capt.",
-        "Col.",
-        "Gen.",
-        "Rev.",
-        "Hon.",
-    ]
 
-    # Construct a pattern to match abbreviations
-    abbreviations_pattern = r"|".join(
-        r"\b{}\b".format(re.escape(abbr)) for abbr in ABBREVIATIONS
-    )
+def iter_pdf_pages(pdf_path, reader_name, start_page=0):
+    """One pdf reader's ('PDF_TRY_PYMU' etc.) text of each page, from start_page on."""
+    if reader_name == "PDF_TRY_PYMU":
+        # PyMuPDF
+        print("Trying PyMuPDF...")
+        fitz = import_backend("fitz")
+        with fitz.open(pdf_path) as pdf_file:
+            for page_number in range(start_page, pdf_file.page_count):
+                yield pdf_file[page_number].get_text()
 
-    # This pattern attempts to split at sentence endings (.?!), including the punctuation with the preceding sentence
-    # It uses a lookahead to keep the punctuation with the sentence
-    # The negative lookahead (?!({abbreviations_pattern})\s) excludes known abbreviations from being split
-    sentence_end_regex = (
-        r"(?<=[.!?])\s+(?=[A-Z])(?!({abbreviations_pattern})\s)".format(
-            abbreviations_pattern=abbreviations_pattern
-        )
-    )
+    elif reader_name == "PDF_TRY_PYPDF":
+        # pypdf
+        print("Trying pypdf PdfReader...")
+        reader = import_backend("pypdf").PdfReader(pdf_path)
+        for page in reader.pages[start_page:]:
+            yield page.extract_text()
 
-    split_sentences_and_punctuation_list = re.split(sentence_end_regex, text)
+    elif reader_name == "PDF_TRY_PDFPLUMBER":
+        # pdfplumber
+        print("Trying pdfplumber...")
+        with import_backend("pdfplumber").open(pdf_path) as pdf:
+            for page in pdf.pages[start_page:]:
+                yield page.extract_text() or ""
 
-    # Optionally, remove empty strings if they are not desired
-    split_sentences_and_punctuation_list = [
-        s for s in split_sentences_and_punctuation_list if s
-    ]
 
-    return split_sentences_and_punctuation_list
+def iter_pdf_pieces(pdf_path, start_piece=0):
+    """
+    The text of a pdf, one page at a time, when one pdf reader is selected.
+    When several readers are selected (PDF_USE_ALL etc.), each reads
+    the whole pdf and the longest text is kept, so that text is in memory
+    (see simple_extracttextfrom_pdf()).
 
+    start_piece skips the first pages (or windows), e.g. when resuming.
 
-# def split_sentences_and_punctuation(text):
-#     """Splits text into sentences, attempting to preserve punctuation and all text content.
+    If the selected reader fails part way, the other readers (those
+    installed) carry on from the page it failed on; if they all fail,
+    or no reader could read the pdf at all, the error is raised
+    (the document fails, it is not taken as empty).
+    """
+    if PDF_USE_ALL or [PDF_TRY_PYMU, PDF_TRY_PYPDF, PDF_TRY_PDFPLUMBER].count(True) != 1:
+        errors = []
+        text = simple_extracttextfrom_pdf(pdf_path, errors)
+        if text:
+            yield from itertools.islice(
+                split_text_into_windows(text), start_piece, None
+            )
+            return
+
+        readers_tried = 3 if PDF_USE_ALL else [
+            PDF_TRY_PYMU, PDF_TRY_PYPDF, PDF_TRY_PDFPLUMBER
+        ].count(True)
+        if errors and len(errors) == readers_tried:
+            # every reader failed: not a pdf with no text
+            raise errors[0]
+        return
+
+    reader_names = ["PDF_TRY_PYMU", "PDF_TRY_PYPDF", "PDF_TRY_PDFPLUMBER"]
+    selected = {
+        "PDF_TRY_PYMU": PDF_TRY_PYMU,
+        "PDF_TRY_PYPDF": PDF_TRY_PYPDF,
+        "PDF_TRY_PDFPLUMBER": PDF_TRY_PDFPLUMBER,
+    }
+    # the selected reader first, then the others as fallbacks
+    reader_names.sort(key=lambda reader_name: not selected[reader_name])
 
-#     Args:
-#         text (str): The input text.
+    page_number = start_piece
+    first_error = None
+    for reader_name in reader_names:
+        try:
+            for text in iter_pdf_pages(pdf_path, reader_name, page_number):
+                yield text
+                page_number += 1
+            return
 
-#     Returns:
-#         list: A list of sentences with preserved punctuation.
-#     """
+        except ImportError as e:
+            # a fallback reader that is not installed
+            if first_error is None:
+                first_error = e
 
-#     # This pattern attempts to split at sentence endings (.?!), including the punctuation with the preceding sentence
-#     # It uses a lookahead to keep the punctuation with the sentence
-#     sentence_end_regex = r'(?<=[.!?])\s+(?=[A-Z])'
+        except Exception as e:
+            # keeps the pages read so far
+            print(f"Error (pdf, {reader_name}, page {page_number}): {e}")
+            if first_error is None or isinstance(first_error, ImportError):
+                first_error = e
 
-#     split_sentences_and_punctuation_list = re.split(sentence_end_regex, text)
+    raise first_error
 
-#     # Optionally, remove empty strings if they are not desired
-#     split_sentences_and_punctuation_list = [s for s in split_sentences_and_punctuation_list if s]
 
-#     # print("split_sentences_and_punctuation_list")
-#     # print(split_sentences_and_punctuation_list)
+#############
+# extractors
+#############
+"""
+An extractor reads one document and yields (section_id, text, metadata):
+    section_id -> names the section's output files and chunks
+    text       -> the section's text: a str, or an iterable of str pieces
+    metadata   -> see write_document_sections()
 
-#     return split_sentences_and_punctuation_list
+Extractors only extract: every format is written by write_document_sections().
+Add a format with register_extractor().
+"""
 
 
-def recombine_punctuation(sentences):
+def parse_epub_section(html_bytes, engine, anchor_ids=()):
     """
-    A helper function a that
-    Recombines floating punctuation and
-    creates a new list of sentences."""
-    recombined_sentences = []
-    i = 0
+    Section worker: one spine html file's
+    (html length, extracted text length, normalized text,
+    {anchor id: offset in the text, or None if not found}).
+    """
+    html_content = html_bytes.decode("utf-8")
+    anchors = dict.fromkeys(anchor_ids)
+    raw_text = html_to_text(html_content, engine, anchors)
+    return len(html_content), len(raw_text), fix_text_formatting(raw_text), anchors
 
-    while i < len(sentences) - 1:
-        # print(i)
-        # print(sentences[i-1])
-        # print(sentences[i])
-        # print(sentences[i+1])
 
-        sentence = sentences[i].strip()
-        next_item = sentences[i + 1].strip()
+def make_chapter_marks(toc_entries, anchors):
+    """
+    A spine file's chapter marks (see write_document_sections()): its table
+    of contents entries, each at the offset in the file's text of the element
+    its fragment names (the start, for no fragment or one not found), and
+    never before the entry listed before it.
+    """
+    marks = []
+    offset = 0
+
+    for entry in toc_entries:
+        if entry["fragment"] and anchors.get(entry["fragment"]) is not None:
+            offset = max(offset, anchors[entry["fragment"]])
+
+        marks.append(
+            {
+                "title": entry["title"],
+                "level": entry["level"],
+                "path": entry["path"],
+                "href": entry["href"],
+                "offset": offset,
+            }
+        )
 
-        # if next_item in ".?!":
-        if re.match(r"[.?!]+", next_item):
-            recombined_sentences.append(sentence + next_item)
-            i += 1  # Skip the punctuation since it's been combined
-        else:
-            recombined_sentences.append(sentence)
-        i += 1
+    return marks
 
-    # Add the last sentence (if it exists)
-    if sentences[-1]:
-        recombined_sentences.append(sentences[-1].strip())
 
-    return recombined_sentences
+def start_epub_section_pool(members, anchor_ids=None):
+    """
+    For a big epub, a process pool parsing its spine files ahead of the
+    writer; None (parse each file when the writer gets to it) otherwise.
 
+    Args:
+        members (list): the spine members, in reading order
+        anchor_ids (dict): member -> ids whose text offsets are wanted
 
-# # original, works with no overlap
-# def chunk_text(sentences, chunk_size, overlap_size=0):
-#     """
-#     todo: add overlap
-#     maybe by reserving the last sentence
-#     """
-#     chunked_text = []
-#     current_chunk = ""
-#     overlap_text = ""
+    Returns:
+        dict: {"pool", "members", "anchor_ids", "futures": {index: future},
+               "next": first index not submitted, "lookahead", "broken"},
+              or None
+    """
+    workers = EPUB_SECTION_WORKERS
+    if workers is None:
+        # each document worker gets its share of the CPUs
+        cpu_count = os.cpu_count() or 1
+        workers = cpu_count // (MAX_WORKERS or cpu_count)
+    if (
+        workers < 2
+        or len(members) < EPUB_PARALLEL_MIN_SECTIONS
+        # daemonic processes can't start their own
+        or multiprocessing.current_process().daemon
+    ):
+        return None
 
-#     for sentence in sentences:
-#         # Case 1: Chunk + sentence easily fit
-#         if len(current_chunk) + len(sentence) + 1 <= chunk_size:
-#             current_chunk += sentence + " "
+    # spawn: forking while the writer thread runs could copy a held lock
+    pool = concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    )
+    return {
+        "pool": pool,
+        "members": members,
+        "anchor_ids": anchor_ids or {},
+        "futures": {},
+        "next": 0,
+        "lookahead": 4 * workers,
+        "broken": False,
+    }
 
-#         # Case 2: Sentence itself is too big
-#         elif len(sentence) > chunk_size:
-#             # Split long sentence (implement 'split_long_sentence' below)
-#             for sub_sentence in split_long_sentence(sentence, chunk_size):
-#                 chunked_text.append(sub_sentence.strip())
 
-#         # Case 3:  Chunk + sentence exceed limit, time to split
-#         else:
-#             chunked_text.append(current_chunk.strip())
-#             current_chunk = sentence + " "
+def submit_epub_sections(section_pool, epub, index):
+    """Submits the spine files from index to index + lookahead not yet submitted."""
+    end = min(len(section_pool["members"]), index + section_pool["lookahead"])
 
-#     # Handle final chunk
-#     if current_chunk:
-#         chunked_text.append(current_chunk.strip())
+    for next_index in range(max(index, section_pool["next"]), end):
+        member = section_pool["members"][next_index]
+        section_pool["futures"][next_index] = section_pool["pool"].submit(
+            parse_epub_section,
+            epub.read(member),
+            HTML_TEXT_ENGINE,
+            section_pool["anchor_ids"].get(member, ()),
+        )
 
-#     return chunked_text
+    section_pool["next"] = max(section_pool["next"], end)
 
 
-def chunk_text(sentences, chunk_size, overlap_size=1000):
+def iter_epub_section_text(
+    epub,
+    full_path,
+    this_epub_output_dir_path,
+    section_pool=None,
+    index=None,
+    toc_entries=(),
+    chapter_marks=None,
+):
     """
-    with overlap
+    One html file's text, read when the writer gets to it
+    (so sections skipped when resuming are never parsed).
+
+    With a section_pool, the text of spine file `index` comes from the pool
+    (which then starts parsing the files after it).
+    A chapter_marks list is filled in from the file's toc_entries
+    before the text is yielded.
     """
-    overlap_size = 550
+    anchor_ids = [entry["fragment"] for entry in toc_entries if entry["fragment"]]
 
-    chunk_size = chunk_size - overlap_size
-    chunked_text = []
-    current_chunk = ""
-    last_sentence = ""
+    if section_pool is not None and not section_pool["broken"]:
+        try:
+            with stage_timer("read"):
+                submit_epub_sections(section_pool, epub, index)
 
-    for this_sentence in sentences:
+            with stage_timer("html_parse"):
+                html_length, text_length, text, anchors = (
+                    section_pool["futures"].pop(index).result()
+                )
 
-        # Case 1: Chunk + sentence easily fit
-        if len(current_chunk) + len(this_sentence) + 1 <= chunk_size:
-            current_chunk += this_sentence + " "
+        except concurrent.futures.process.BrokenProcessPool:
+            # a section worker died: parse this and the later files here
+            section_pool["broken"] = True
 
-        # Case 2: this_sentence itself is too big
+        else:
+            # logged as extract_text_from_html() does
+            print_and_log(
+                f"\nlen(HTML Content before BeautifulSoup Parsing) -> {html_length}",
+                this_epub_output_dir_path,
+            )
+            print_and_log(f"len(Extracted Text) -> {text_length}", this_epub_output_dir_path)
+            print_and_log(f"len(text for json)-> {text_length}", this_epub_output_dir_path)
+
+            if chapter_marks is not None:
+                chapter_marks[:] = make_chapter_marks(toc_entries, anchors)
+
+            yield text
+            return
+
+    #########################
+    # extract text from epub
+    #########################
+    anchors = dict.fromkeys(anchor_ids)
+    raw_text = None
+    if HTML_TEXT_ENGINE == "fast":
+        # read and parsed together, block by block
+        with stage_timer("html_parse"):
+            raw_text = stream_text_from_epub_html(
+                epub, full_path, this_epub_output_dir_path, anchors
+            )
+
+    if raw_text is None:
+        with stage_timer("read"):
+            html_content = epub.read_text(full_path)
+
+        with stage_timer("html_parse"):
+            raw_text = extract_text_from_html(
+                html_content, this_epub_output_dir_path, anchors
+            )
+    print_and_log(f"len(text for json)-> {len(raw_text)}", this_epub_output_dir_path)
+
+    # fix text formatting
+    with stage_timer("normalize"):
+        text = fix_text_formatting(raw_text)
+
+    if chapter_marks is not None:
+        chapter_marks[:] = make_chapter_marks(toc_entries, anchors)
+
+    yield text
+
+
+def make_epub_section_id(member, used_section_ids):
+    """
+    A section id (file name) for a spine member: its file name without
+    the suffix, or, if another spine file already has that name, its
+    whole path in the epub with '/' -> '_'.
+    """
+    section_id = posixpath.splitext(posixpath.basename(member))[0]
+    if section_id in used_section_ids:
+        section_id = posixpath.splitext(member)[0].replace("/", "_")
+    used_section_ids.add(section_id)
+    return section_id
+
+
+# the document being processed: the content keys of its spine files found in
+# BOILERPLATE_REPEAT_BOOKS or more books (set by process_document()),
+# and the boilerplate sections found so far (see take_boilerplate_sections())
+boilerplate_state = {"repeated_keys": set(), "sections": []}
+
+
+def take_boilerplate_sections():
+    """Returns (and resets) the boilerplate sections found so far."""
+    sections = boilerplate_state["sections"]
+    boilerplate_state["sections"] = []
+    return sections
+
+
+def classify_epub_sections(epub, members, this_epub_output_dir_path):
+    """
+    Which spine members are front/back matter (see BOILERPLATE_MODE), and why.
+
+    Returns:
+        dict: member -> reasons, e.g. ["non_linear", "landmark:copyright-page",
+              "repeated"], in spine order; members with no reason are left out
+    """
+    try:
+        non_linear = epub.non_linear_members()
+        landmarks = epub.landmark_types()
+    except Exception as e:
+        print_and_log(f"No boilerplate hints read: {e!r}", this_epub_output_dir_path)
+        non_linear, landmarks = set(), {}
+
+    boilerplate_types = set(BOILERPLATE_LANDMARK_TYPES)
+
+    reasons = {}
+    for member in members:
+        member_reasons = []
+        if member in non_linear:
+            member_reasons.append("non_linear")
+        member_reasons.extend(
+            f"landmark:{type_name}"
+            for type_name in sorted(landmarks.get(member, set()) & boilerplate_types)
+        )
+        if epub.member_key(member) in boilerplate_state["repeated_keys"]:
+            member_reasons.append("repeated")
+
+        if member_reasons:
+            reasons[member] = member_reasons
+
+    return reasons
+
+
+def count_boilerplate_text(text_pieces, record):
+    """Yields a tagged section's text, adding up its utf-8 bytes in record["bytes"]."""
+    for piece in text_pieces:
+        record["bytes"] += len(piece.encode("utf-8"))
+        yield piece
+
+
+def read_epub_toc_by_member(epub, this_epub_output_dir_path):
+    """
+    The epub's table of contents entries grouped by the spine file
+    they point into (in order), {} if it has none.
+    """
+    try:
+        toc = epub.read_toc()
+    except Exception as e:
+        print_and_log(f"No table of contents read: {e!r}", this_epub_output_dir_path)
+        return {}
+
+    print_and_log(f"Table of contents: {len(toc)} entries", this_epub_output_dir_path)
+
+    toc_by_member = {}
+    for entry in toc:
+        if entry["member"] is not None:
+            toc_by_member.setdefault(entry["member"], []).append(entry)
+    return toc_by_member
+
+
+def extract_epub_sections(epub_file_path, this_epub_output_dir_path):
+    """
+    One section per html file, in the epub's spine (reading) order
+    (with chapter marks from its table of contents, see CHAPTER_INDEX_FILE_NAME;
+    front/back matter tagged or skipped, see BOILERPLATE_MODE).
+    """
+    with EpubArchive(epub_file_path) as epub:
+        print_and_log(
+            f"EPUB Contents: -> {epub.zip_file.namelist()}", this_epub_output_dir_path
+        )
+
+        ##################################
+        # Get & Read html files from epub
+        ##################################
+        with stage_timer("read"):
+            # the opf file, and the html files in reading order
+            spine_members = epub.spine_members()
+
+            toc_by_member = None
+            if CHAPTER_INDEX_FILE_NAME:
+                toc_by_member = read_epub_toc_by_member(epub, this_epub_output_dir_path)
+
+            boilerplate = {}
+            if BOILERPLATE_MODE:
+                boilerplate = classify_epub_sections(
+                    epub,
+                    [member for _, member in spine_members if member is not None],
+                    this_epub_output_dir_path,
+                )
+
+        ##########################################################
+        # front/back matter: skipped unread (html size from the zip)
+        ##########################################################
+        skipped_members = set()
+        if BOILERPLATE_MODE == "skip":
+            for member, reasons in boilerplate.items():
+                html_bytes = epub.member_size(member)
+                boilerplate_state["sections"].append(
+                    {
+                        "section": member,
+                        "reasons": reasons,
+                        "html_bytes": html_bytes,
+                        "bytes": 0,
+                        "skipped": True,
+                    }
+                )
+                print_and_log(
+                    f"Skipped boilerplate {member} ({', '.join(reasons)}): {html_bytes} html bytes",
+                    this_epub_output_dir_path,
+                )
+            skipped_members = set(boilerplate)
+
+        ############################################
+        # Read and extract text from each HTML file
+        ############################################
+        used_section_ids = set()
+        members = [
+            member
+            for _, member in spine_members
+            if member is not None and member not in skipped_members
+        ]
+        anchor_ids = {
+            member: [entry["fragment"] for entry in entries if entry["fragment"]]
+            for member, entries in (toc_by_member or {}).items()
+        }
+        section_pool = start_epub_section_pool(members, anchor_ids)
+
+        try:
+            # iterate through html files
+            index = 0
+            for html_file, full_path in spine_members:
+                if full_path in skipped_members:
+                    continue
+
+                if full_path is not None:
+                    section_id = make_epub_section_id(full_path, used_section_ids)
+                    metadata = {
+                        "individual_txt_name": f"{section_id}.txt",
+                        "display_name": html_file,
+                        "write_empty": True,
+                    }
+                    toc_entries = ()
+                    if toc_by_member:
+                        toc_entries = toc_by_member.get(full_path, [])
+                        metadata["chapter_marks"] = []
+
+                    text = iter_epub_section_text(
+                        epub,
+                        full_path,
+                        this_epub_output_dir_path,
+                        section_pool,
+                        index,
+                        toc_entries,
+                        metadata.get("chapter_marks"),
+                    )
+                    index += 1
+
+                    if full_path in boilerplate:
+                        metadata["boilerplate"] = boilerplate[full_path]
+                        record = {
+                            "section": full_path,
+                            "reasons": boilerplate[full_path],
+                            "html_bytes": epub.member_size(full_path),
+                            "bytes": 0,
+                            "skipped": False,
+                        }
+                        boilerplate_state["sections"].append(record)
+                        text = count_boilerplate_text(text, record)
+
+                    yield section_id, text, metadata
+
+                else:  # File Not Found
+                    print_and_log(
+                        f"Warning: File {posixpath.join(epub.opf_dir, html_file)} "
+                        "not found in the archive.",
+                        this_epub_output_dir_path,
+                    )
+
+        finally:
+            if section_pool is not None:
+                section_pool["pool"].shutdown(wait=True, cancel_futures=True)
+
+
+def extract_txt_sections(text_file_path, this_txt_output_dir_path):
+    """The whole text file as one section, in pieces."""
+    file_name = os.path.basename(text_file_path)
+    section_id = os.path.splitext(file_name)[0]
+    metadata = {"individual_txt_name": f"{section_id}.txt", "display_name": file_name}
+
+    yield section_id, iter_txt_pieces(text_file_path), metadata
+
+
+def extract_docx_sections(docx_file_path, this_txt_output_dir_path):
+    """The whole .docx as one section, in pieces."""
+    file_name = os.path.basename(docx_file_path)
+    metadata = {
+        "individual_txt_name": file_name,
+        "individual_txt_encoding": "utf-8",
+        "display_name": file_name,
+    }
+
+    yield os.path.splitext(file_name)[0], iter_docx_pieces(docx_file_path), metadata
+
+
+def extract_pdf_sections(pdf_path, this_txt_output_dir_path):
+    """The whole pdf as one section, page by page."""
+    file_name = os.path.basename(pdf_path)
+    metadata = {
+        "individual_txt_name": file_name,
+        "individual_txt_encoding": "utf-8",
+        "display_name": file_name,
+        "resume_pieces": lambda start_piece: iter_pdf_pieces(pdf_path, start_piece),
+    }
+
+    yield os.path.splitext(file_name)[0], iter_pdf_pieces(pdf_path), metadata
+
+
+# file type -> extractor
+EXTRACTORS = {
+    "epub": extract_epub_sections,
+    "txt": extract_txt_sections,
+    "docx": extract_docx_sections,
+    "pdf": extract_pdf_sections,
+}
+
+
+def register_extractor(file_type, extractor, suffixes=(), output_folder_suffix=None):
+    """
+    Adds (or replaces) the extractor for a file type.
+
+    Args:
+        file_type (str): e.g. 'html'
+        extractor (function): (file_path, log_dir) -> yields (section_id, text, metadata)
+        suffixes (iterable): file suffixes to find under target_files, e.g. ['.html', '.htm']
+        output_folder_suffix (str): results folder suffix, default f"_{file_type}_folder"
+    """
+    EXTRACTORS[file_type] = extractor
+
+    for suffix in suffixes:
+        SUPPORTED_FILE_TYPES[suffix.lower()] = file_type
+
+    OUTPUT_FOLDER_SUFFIXES[file_type] = output_folder_suffix or f"_{file_type}_folder"
+
+    # note: with the spawn/forkserver start methods, worker processes
+    # only see extractors registered when their module is imported
+
+
+def extract_document(
+    file_type,
+    file_path,
+    this_output_dir_path,
+    output_jsonl_path,
+    output_json_dir,
+    output_whole_txt_path,
+    output_txt_dir,
+    output_chunks_jsonl_path,
+    output_chunks_dir,
+    max_chunk_size=MAX_CHUNK_SIZE,
+    pool_output_chunks_dir="txt_pool",
+    journal=None,
+):
+    """
+    Extracts a document with its file type's extractor
+    and writes all of its outputs (journaled, if a journal is given).
+
+    Returns:
+        int or None: number of chunks, None if no text was extracted
+    """
+    sections = EXTRACTORS[file_type](file_path, this_output_dir_path)
+
+    number_of_chunks = write_document_sections(
+        sections,
+        this_output_dir_path,
+        output_jsonl_path,
+        output_json_dir,
+        output_whole_txt_path,
+        output_txt_dir,
+        output_chunks_jsonl_path,
+        output_chunks_dir,
+        max_chunk_size=max_chunk_size,
+        pool_output_chunks_dir=pool_output_chunks_dir,
+        journal=journal,
+    )
+
+    if number_of_chunks is None:
+        print_and_log(
+            f"{file_path} -> Faile, no text extracted", this_output_dir_path
+        )
+    elif file_type != "epub":
+        print("OK!")
+
+    return number_of_chunks
+
+
+def extract_text_from_epub(*args, max_chunk_size=MAX_CHUNK_SIZE, pool_output_chunks_dir="txt_pool"):
+    """extract_document() for an epub (same arguments as before)."""
+    return extract_document(
+        "epub",
+        *args,
+        max_chunk_size=max_chunk_size,
+        pool_output_chunks_dir=pool_output_chunks_dir,
+    )
+
+
+def extract_text_from_txt(*args, max_chunk_size=MAX_CHUNK_SIZE, pool_output_chunks_dir="txt_pool"):
+    """extract_document() for a .txt file (same arguments as before)."""
+    return extract_document(
+        "txt",
+        *args,
+        max_chunk_size=max_chunk_size,
+        pool_output_chunks_dir=pool_output_chunks_dir,
+    )
+
+
+def extract_text_from_docx(*args, max_chunk_size=MAX_CHUNK_SIZE, pool_output_chunks_dir="txt_pool"):
+    """extract_document() for a .docx file (same arguments as before)."""
+    return extract_document(
+        "docx",
+        *args,
+        max_chunk_size=max_chunk_size,
+        pool_output_chunks_dir=pool_output_chunks_dir,
+    )
+
+
+def extract_text_from_pdf(
+    *args,
+    overlap_size=150,
+    max_chunk_size=MAX_CHUNK_SIZE,
+    pool_output_chunks_dir="txt_pool",
+):
+    """
+    extract_document() for a pdf (same arguments as before;
+    the chunk overlap is CHUNK_OVERLAP_SIZE, overlap_size is not used).
+    """
+    return extract_document(
+        "pdf",
+        *args[:8],
+        max_chunk_size=max_chunk_size,
+        pool_output_chunks_dir=pool_output_chunks_dir,
+    )
+
+
+@traced
+def zip_folder(path_to_directory_to_zip, output_destination_zip_file_path):
+    """Creates a zip archive of a specified folder.
+
+    Args:
+        path_to_directory_to_zip (str): The path to the folder to be zipped.
+        output_destination_zip_file_path (str): The desired name and path of the output zip file.
+    """
+    # # Specify the folder you want to zip
+    # path_to_directory_to_zip = "individual_jsons"
+
+    # # Specify the desired output zip file name (e.g., 'jsons_archive.zip')
+    # output_destination_zip_file_path = "jsons_archive_zip"
+
+    shutil.make_archive(
+        output_destination_zip_file_path, "zip", path_to_directory_to_zip
+    )
+
+
+###########
+# Chunking
+############
+
+
+ABBREVIATIONS = [
+    "Dr.",
+    "Mr.",
+    "Mrs.",
+    "Ms.",
+    "Lt.",
+    "St.",
+    "Capt.",
+    "Col.",
+    "Gen.",
+    "Rev.",
+    "Hon.",
+]
+
+# Construct a pattern to match abbreviations
+abbreviations_pattern = r"|".join(
+    r"\b{}\b".format(re.escape(abbr)) for abbr in ABBREVIATIONS
+)
+
+# This pattern attempts to split at sentence endings (.?!), including the punctuation with the preceding sentence
+# It uses a lookahead to keep the punctuation with the sentence
+# The negative lookahead (?!({abbreviations_pattern})\s) excludes known abbreviations from being split
+# (compiled once, not once per section)
+SENTENCE_END_REGEX = re.compile(
+    r"(?<=[.!?])\s+(?=[A-Z])(?!({abbreviations_pattern})\s)".format(
+        abbreviations_pattern=abbreviations_pattern
+    )
+)
+
+# how much text after a sentence break the regex may look at
+# (longest abbreviation plus a space, with room to spare)
+SENTENCE_LOOKAHEAD_CHARS = 16
+
+
+@traced
+def split_sentences_and_punctuation(text):
+    """Splits text into sentences, attempting to preserve punctuation and all text content.
+    Args:
+        text (str): The input text.
+    Returns:
+        list: A list of sentences with preserved punctuation.
+    """
+    split_sentences_and_punctuation_list = SENTENCE_END_REGEX.split(text)
+
+    # Optionally, remove empty strings if they are not desired
+    split_sentences_and_punctuation_list = [
+        s for s in split_sentences_and_punctuation_list if s
+    ]
+
+    return split_sentences_and_punctuation_list
+
+
+# def split_sentences_and_punctuation(text):
+#     """Splits text into sentences, attempting to preserve punctuation and all text content.
+
+#     Args:
+#         text (str): The input text.
+
+#     Returns:
+#         list: A list of sentences with preserved punctuation.
+#     """
+
+#     # This pattern attempts to split at sentence endings (.?!), including the punctuation with the preceding sentence
+#     # It uses a lookahead to keep the punctuation with the sentence
+#     sentence_end_regex = r'(?<=[.!?])\s+(?=[A-Z])'
+
+#     split_sentences_and_punctuation_list = re.split(sentence_end_regex, text)
+
+#     # Optionally, remove empty strings if they are not desired
+#     split_sentences_and_punctuation_list = [s for s in split_sentences_and_punctuation_list if s]
+
+#     # print("split_sentences_and_punctuation_list")
+#     # print(split_sentences_and_punctuation_list)
+
+#     return split_sentences_and_punctuation_list
+
+
+def iter_sentences(text_pieces, max_sentence_chars=None, state=None):
+    """
+    Streaming split_sentences_and_punctuation():
+    splits text that arrives in pieces (e.g. pages or windows of a file)
+    into the same sentences, yielding each one as soon as it is complete.
+
+    Only the unfinished last sentence is held between pieces.
+    A 'sentence' longer than max_sentence_chars (default STREAM_WINDOW_CHARS)
+    is passed on as it is, so memory stays bounded for text with
+    no sentence endings at all.
+
+    Args:
+        text_pieces (iterable): str pieces of one text, in order
+        state (dict): optional; holds the unfinished sentence ('carry')
+                      between pieces, so splitting can be resumed later,
+                      and the offset in the text of the sentence
+                      last yielded ('sentence_start')
+
+    Yields:
+        str: sentences with preserved punctuation
+    """
+    if max_sentence_chars is None:
+        max_sentence_chars = STREAM_WINDOW_CHARS
+
+    if state is None:
+        state = {}
+
+    carry = state.get("carry", "")
+    # offset in the text of carry's first character
+    carry_start = state.get("carry_start", 0)
+
+    for piece in text_pieces:
+        buffer = carry + piece
+        start = 0
+
+        for match in SENTENCE_END_REGEX.finditer(buffer):
+            # only trust a break if the look-ahead after it
+            # is not cut short by the end of this piece
+            if match.end() + SENTENCE_LOOKAHEAD_CHARS > len(buffer):
+                break
+
+            if match.start() > start:
+                state["sentence_start"] = carry_start + start
+                yield buffer[start : match.start()]
+            start = match.end()
+
+        carry = buffer[start:]
+        carry_start += start
+
+        if len(carry) > max_sentence_chars:
+            state["sentence_start"] = carry_start
+            yield carry
+            carry_start += len(carry)
+            carry = ""
+
+        state["carry"] = carry
+        state["carry_start"] = carry_start
+
+    # the end of the text: no more look-ahead to wait for
+    position = 0
+    for sentence in split_sentences_and_punctuation(carry):
+        position = carry.index(sentence, position)
+        state["sentence_start"] = carry_start + position
+        yield sentence
+        position += len(sentence)
+
+
+def recombine_punctuation(sentences):
+    """
+    A helper function a that
+    Recombines floating punctuation and
+    creates a new list of sentences."""
+    recombined_sentences = []
+    i = 0
+
+    while i < len(sentences) - 1:
+        # print(i)
+        # print(sentences[i-1])
+        # print(sentences[i])
+        # print(sentences[i+1])
+
+        sentence = sentences[i].strip()
+        next_item = sentences[i + 1].strip()
+
+        # if next_item in ".?!":
+        if re.match(r"[.?!]+", next_item):
+            recombined_sentences.append(sentence + next_item)
+            i += 1  # Skip the punctuation since it's been combined
+        else:
+            recombined_sentences.append(sentence)
+        i += 1
+
+    # Add the last sentence (if it exists)
+    if sentences[-1]:
+        recombined_sentences.append(sentences[-1].strip())
+
+    return recombined_sentences
+
+
+# # original, works with no overlap
+# def chunk_text(sentences, chunk_size, overlap_size=0):
+#     """
+#     todo: add overlap
+#     maybe by reserving the last sentence
+#     """
+#     chunked_text = []
+#     current_chunk = ""
+#     overlap_text = ""
+
+#     for sentence in sentences:
+#         # Case 1: Chunk + sentence easily fit
+#         if len(current_chunk) + len(sentence) + 1 <= chunk_size:
+#             current_chunk += sentence + " "
+
+#         # Case 2: Sentence itself is too big
+#         elif len(sentence) > chunk_size:
+#             # Split long sentence (implement 'split_long_sentence' below)
+#             for sub_sentence in split_long_sentence(sentence, chunk_size):
+#                 chunked_text.append(sub_sentence.strip())
+
+#         # Case 3:  Chunk + sentence exceed limit, time to split
+#         else:
+#             chunked_text.append(current_chunk.strip())
+#             current_chunk = sentence + " "
+
+#     # Handle final chunk
+#     if current_chunk:
+#         chunked_text.append(current_chunk.strip())
+
+#     return chunked_text
+
+
+def chunk_text(sentences, chunk_size, overlap_size=1000):
+    """
+    with overlap
+    """
+    return list(iter_chunk_text(sentences, chunk_size, overlap_size))
+
+
+def iter_chunk_text(sentences, chunk_size, overlap_size=1000, state=None):
+    """
+    chunk_text(), yielding each chunk as soon as it is complete
+    (sentences may be any iterable, e.g. iter_sentences()).
+    state (optional dict) holds the chunk in progress between sentences,
+    so chunking can be resumed later.
+    """
+    overlap_size = CHUNK_OVERLAP_SIZE
+
+    if state is None:
+        state = {}
+
+    chunk_size = chunk_size - overlap_size
+    current_chunk = state.get("current_chunk", "")
+    last_sentence = state.get("last_sentence", "")
+
+    for this_sentence in sentences:
+
+        # Case 1: Chunk + sentence easily fit
+        if len(current_chunk) + len(this_sentence) + 1 <= chunk_size:
+            current_chunk += this_sentence + " "
+
+        # Case 2: this_sentence itself is too big
         elif len(this_sentence) > chunk_size:
             # Split long sentence (implement 'split_long_sentence' below)
             for sub_sentence in split_long_sentence(this_sentence, chunk_size):
-                chunked_text.append(sub_sentence.strip())
+                yield sub_sentence.strip()
             current_chunk = ""
 
-        # Case 3:  Chunk + this_sentence exceed limit, time to split
-        else:
-            chunked_text.append(current_chunk.strip())
+        # Case 3:  Chunk + this_sentence exceed limit, time to split
+        else:
+            yield current_chunk.strip()
+
+            # start the next chunk (with the last_sentence)
+            current_chunk = last_sentence + " " + this_sentence + " "
+
+        last_sentence = this_sentence
+        if len(this_sentence) > overlap_size:
+            # just the last part
+            last_sentence = this_sentence[-overlap_size:]
+
+        state["current_chunk"] = current_chunk
+        state["last_sentence"] = last_sentence
+
+    # Handle final chunk
+    if current_chunk:
+        yield current_chunk.strip()
+
+
+def split_long_sentence(sentence, chunk_size):
+    """Splits a long sentence into chunks, aiming near the  chunk_size."""
+    words = sentence.split()
+    chunks = []
+    current_chunk = ""
+
+    for word in words:
+        if len(current_chunk) + len(word) + 1 <= chunk_size:
+            current_chunk += word + " "
+        else:
+            chunks.append(current_chunk.strip())
+            current_chunk = word + " "
+
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+
+    return chunks
+
+
+def check_for_not(chunk, window_size=25):
+    """Checks if 'not' is isolated near a potential cut.
+
+    Args:
+        chunk (list): A list of sentences forming the chunk.
+        window_size (int): The number of characters to consider on either side.
+
+    Returns:
+        bool: True if 'not' is isolated, False otherwise.
+    """
+
+    joined_chunk = " ".join(chunk)
+    not_indices = [m.start() for m in re.finditer(r"\bnot\b", joined_chunk)]
+
+    for index in not_indices:
+        start = max(0, index - window_size)
+        end = min(len(joined_chunk), index + window_size)
+        if not re.search(r"\w", joined_chunk[start:end]):  # Check for surrounding words
+            return True
+
+    return False
+
+
+#######
+# pool
+#######
+
+
+# def pool_txt_files(src_dir, dest_dir):
+#     """
+#     Recursively copies all .txt files from the source directory to the destination directory.
+#     """
+#     counter = 0
+
+#     if not os.path.exists(dest_dir):
+#         try:
+#             os.makedirs(dest_dir)
+#         except OSError as e:
+#             if e.errno != errno.EEXIST:
+#                 raise
+
+#     for root, dirs, files in os.walk(src_dir):
+#         for file in files:
+#             if file.endswith('.txt'):
+#                 src_file = os.path.join(root, file)
+#                 dest_file = os.path.join(dest_dir, os.path.relpath(src_file, src_dir))
+#                 os.makedirs(os.path.dirname(dest_file), exist_ok=True)
+#                 shutil.copy2(src_file, dest_file)
+#                 # print(f"Copied {src_file} to {dest_file}")
+
+#                 counter += 1
+
+
+#     print(f"\nOK! I just copied {counter} files, to {dest_dir}.")
+
+
+def add_source_attribution(source_attribution_string, directory="txt_pool"):
+    """
+    This function adds a source attribution string to the end of each file in a directory.
+    The attribution string is extracted from the filename.
+
+    Parameters:
+    directory (str): The path to the directory containing the files.
+    """
+
+    # Loop through each file in the directory
+    for filename in os.listdir(directory):
+
+        # Check if the item is a file (not a directory)
+        if os.path.isfile(os.path.join(directory, filename)):
+
+            # Extract the number from the filename
+            match = re.search(r"_(\d+)\.txt$", filename)
+            if match:
+                number = match.group(1)
+
+                # Create the attribution string to add to the file
+                file_source_attribution_string = (
+                    f"\n(Source: {source_attribution_string} Excerpt number {number})\n"
+                )
+
+                # Open the file for reading and writing
+                with open(os.path.join(directory, filename), "a") as file:
+
+                    # print(file_source_attribution_string)
+
+                    # Add the attribution string to the end of the file
+                    file.write(file_source_attribution_string)
+
+
+@traced
+def back_append_stub_files(directory):
+    """
+    This function processes all the .txt files in a given directory.
+    If a file is smaller than 300 bytes, its content is appended to the previous file,
+    and the current file is deleted. The process is then restarted from the beginning of the list.
+
+    :param directory: The directory containing the .txt files
+    """
+    try:
+        print(f"starting back_append_stub_files(directory)... directory -> {directory}")
+
+        counter = 0
+
+        # Get a list of all the .txt files in the directory and sort them
+        files = sorted([f for f in os.listdir(directory) if f.endswith(".txt")])
+
+        i = 1
+        while i < len(files):
+            # Get the full path of the current file
+            current_file = os.path.join(directory, files[i])
+
+            # Get the size of the current file
+            size = os.path.getsize(current_file)
+
+            # If the size of the current file is smaller than 300 bytes
+            if size < MINIMUM_BYTES_SIZE:
+                # Read the content of the current file
+                with open(current_file, "r") as f:
+                    content = f.read()
+
+                # Get the full path of the previous file
+                previous_file = os.path.join(directory, files[i - 1])
+
+                # Append the content of the current file to the previous file
+                with open(previous_file, "a") as f:
+                    f.write("\n" + content)
+
+                # Delete the current file
+                os.remove(current_file)
+
+                # Remove the current file from the list
+                files.pop(i)
+
+                counter += 1
+            else:
+                # Move on to the next file
+                i += 1
+
+        print(f"Back appended {counter} files.")
+
+    except Exception as e:
+        raise e
+
+
+def pool_txt_files(src_dir, dest_dir):
+    """
+    Recursively copies all .txt files
+    from the source directory to the destination directory.
+    original files are not deleted.
+    """
+    counter = 0
+
+    # Create the destination directory if it doesn't exist
+    if not os.path.exists(dest_dir):
+        os.makedirs(dest_dir)
+
+    # Traverse the source directory recursively
+    for root, _, files in os.walk(src_dir):
+        for file in files:
+            if file.endswith(".txt"):
+                src_file = os.path.join(root, file)
+                dest_file = os.path.join(dest_dir, file)
+                shutil.copy2(src_file, dest_file)
+                counter += 1
+
+    print(f"\nOK! I just copied {counter} files to {dest_dir}.")
+
+
+def rename_directory(current_name, new_name):
+    """
+    # Usage
+    rename_directory('old_name', 'new_name')
+    """
+    try:
+        os.rename(current_name, new_name)
+        print(f"Directory renamed from {current_name} to {new_name}")
+    except FileNotFoundError:
+        print(f"Directory {current_name} not found")
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+
+def make_merged_directories_pool():
+    # Create the 'txt_pool' directory if it doesn't exist
+    if not os.path.exists("txt_pool"):
+        os.makedirs("txt_pool")
+
+    # Iterate over all directories that start with 'bulk_files_folder_'
+    for dir_name in os.listdir("."):
+        if dir_name.startswith("bulk_files_folder_"):
+            print(f"Now merging dir_name {dir_name}...")
+            # Iterate over all files in the directory
+            for file_name in os.listdir(dir_name):
+                # print(f"Now merging {file_name}...")
+                # Move the file to the 'txt_pool' directory
+                shutil.copy(os.path.join(dir_name, file_name), "txt_pool")
+
+
+
+
+##############
+# attribution
+##############
+
+
+def load_attribution_manifest(manifest_path):
+    """
+    Loads source attribution strings keyed by file path or glob pattern.
+
+    .json -> {"path or glob": "attribution", ...}
+             or [{"path": ..., "attribution": ...}, ...]
+    .csv  -> a header row with 'path' and 'attribution' columns
+
+    Returns:
+        list: (path_or_glob, attribution) pairs, in file order
+    """
+    entries = []
+
+    if manifest_path.lower().endswith(".json"):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        if isinstance(data, dict):
+            entries = list(data.items())
+        else:
+            entries = [(row["path"], row["attribution"]) for row in data]
+
+    else:
+        with open(manifest_path, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                entries.append((row["path"], row["attribution"]))
+
+    print(f"Loaded {len(entries)} attribution entries from {manifest_path}")
+
+    return [(os.path.normpath(key), value.strip()) for key, value in entries]
+
+
+def lookup_attribution(file_path, attribution_entries):
+    """
+    Finds the manifest attribution for a file:
+    an exact (relative or absolute) path match wins,
+    otherwise the first matching glob pattern.
+
+    Returns:
+        str or None
+    """
+    relative_path = os.path.normpath(file_path)
+    absolute_path = os.path.abspath(file_path)
+
+    for key, attribution in attribution_entries:
+        if key in (relative_path, absolute_path):
+            return attribution
+
+    for key, attribution in attribution_entries:
+        if fnmatch.fnmatch(relative_path, key) or fnmatch.fnmatch(absolute_path, key):
+            return attribution
+
+    return None
+
+
+def format_attribution(title, creators):
+    """'Title, Creator One, Creator Two', or None if there is no title."""
+    title = (title or "").strip()
+    if not title:
+        return None
+
+    creators = [creator.strip() for creator in creators if creator and creator.strip()]
+    return ", ".join([title] + creators)
+
+
+def read_epub_metadata_attribution(epub_file_path):
+    """
+    dc:title and dc:creator(s) from the epub's OPF package file.
+    """
+    ns = {
+        "opf": "http://www.idpf.org/2007/opf",
+        "dc": "http://purl.org/dc/elements/1.1/",
+    }
+
+    with EpubArchive(epub_file_path) as epub:
+        root = ET.fromstring(epub.read(epub.opf_path))
+
+    metadata = root.find("opf:metadata", ns)
+    if metadata is None:
+        return None
+
+    title = metadata.findtext("dc:title", default="", namespaces=ns)
+    creators = [creator.text for creator in metadata.findall("dc:creator", ns)]
+
+    return format_attribution(title, creators)
+
+
+def read_office_metadata_attribution(office_file_path):
+    """
+    Title and author from a .docx/.pptx file's core properties
+    (docProps/core.xml), without loading the whole document.
+    """
+    ns = {"dc": "http://purl.org/dc/elements/1.1/"}
+
+    with zipfile.ZipFile(office_file_path, "r") as office_file:
+        if "docProps/core.xml" not in office_file.namelist():
+            return None
+        root = ET.fromstring(office_file.read("docProps/core.xml"))
+
+    title = root.findtext("dc:title", default="", namespaces=ns)
+    creators = [root.findtext("dc:creator", default="", namespaces=ns)]
+
+    return format_attribution(title, creators)
+
+
+def read_pdf_metadata_attribution(pdf_path):
+    """
+    Title and author from the pdf's document info.
+    """
+    with import_backend("fitz").open(pdf_path) as pdf_file:
+        metadata = pdf_file.metadata or {}
+
+    return format_attribution(metadata.get("title"), [metadata.get("author")])
+
+
+METADATA_ATTRIBUTION_READERS = {
+    "epub": read_epub_metadata_attribution,
+    "docx": read_office_metadata_attribution,
+    "pptx": read_office_metadata_attribution,
+    "pdf": read_pdf_metadata_attribution,
+}
+
+
+def read_metadata_attribution(file_path, file_type):
+    """
+    Attribution string from the document's own metadata,
+    or None if there is none (or it can't be read).
+    """
+    reader = METADATA_ATTRIBUTION_READERS.get(file_type)
+    if reader is None:
+        return None
+
+    try:
+        return reader(file_path)
+    except Exception as e:
+        print(f"Could not read metadata from {file_path}: {e}")
+        return None
+
+
+def resolve_source_attribution_string(job):
+    """
+    The job's attribution string if it has one,
+    else the document's metadata, else the file name.
+    """
+    if job["source_attribution_string"]:
+        return job["source_attribution_string"]
+
+    source_attribution_string = read_metadata_attribution(
+        job["file_path"], job["file_type"]
+    )
+    if source_attribution_string:
+        return source_attribution_string
+
+    return os.path.basename(job["file_path"])
+
+
+##########################
+# incremental ingestion
+##########################
+
+
+def hash_file(file_path, block_size=HASH_BLOCK_SIZE):
+    """
+    sha256 hex digest of a file, read in blocks
+    (never the whole file in memory).
+    """
+    sha256 = hashlib.sha256()
+
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            sha256.update(block)
+
+    return sha256.hexdigest()
+
+
+def make_chunking_params():
+    """
+    The configuration that changes what gets written for a document
+    (or where). A document is re-processed if any of these change.
+    """
+    return {
+        "MAX_CHUNK_SIZE": MAX_CHUNK_SIZE,
+        "CHUNK_OVERLAP_SIZE": CHUNK_OVERLAP_SIZE,
+        "MINIMUM_BYTES_SIZE": MINIMUM_BYTES_SIZE,
+        "REMOVE_BELOW_SIZE": REMOVE_BELOW_SIZE,
+        # very long 'sentences' are split at this length
+        "STREAM_WINDOW_CHARS": STREAM_WINDOW_CHARS,
+        "RESULTS_DIR_NAME": RESULTS_DIR_NAME,
+        "BULK_FILE_FOLDER_PREFIX": BULK_FILE_FOLDER_PREFIX,
+        "ATTEMPT_AUTO_SPLIT": ATTEMPT_AUTO_SPLIT,
+        "BULK_FILES_FOLDER_MAX_SIZE": BULK_FILES_FOLDER_MAX_SIZE,
+        "PDF_USE_ALL": PDF_USE_ALL,
+        "PDF_TRY_PYMU": PDF_TRY_PYMU,
+        "PDF_TRY_PYPDF": PDF_TRY_PYPDF,
+        "PDF_TRY_PDFPLUMBER": PDF_TRY_PDFPLUMBER,
+        "HTML_TEXT_ENGINE": HTML_TEXT_ENGINE,
+        "CHAPTER_INDEX_FILE_NAME": CHAPTER_INDEX_FILE_NAME,
+        "BOILERPLATE_MODE": BOILERPLATE_MODE,
+        "BOILERPLATE_LANDMARK_TYPES": list(BOILERPLATE_LANDMARK_TYPES),
+        "BOILERPLATE_REPEAT_BOOKS": BOILERPLATE_REPEAT_BOOKS,
+    }
+
+
+def load_ingest_manifest(manifest_path=INGEST_MANIFEST_PATH):
+    """
+    Loads the ingest manifest: one JSON record per line,
+    appended as each document finishes (so a crashed run keeps
+    what it finished). For a path listed more than once, the last line wins.
+
+    Returns:
+        dict: input path -> manifest record
+    """
+    manifest = {}
+
+    if not os.path.exists(manifest_path):
+        return manifest
+
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # a half-written last line from an interrupted run
+                print(f"Skipping unreadable line in {manifest_path}")
+                continue
+            manifest[record["path"]] = record
+
+    print(f"Loaded {len(manifest)} documents from {manifest_path}")
+
+    return manifest
+
+
+def append_to_ingest_manifest(record, manifest_path=INGEST_MANIFEST_PATH):
+    """Appends (and flushes) one document's record to the manifest."""
+    with open(manifest_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def save_ingest_manifest(manifest, manifest_path=INGEST_MANIFEST_PATH):
+    """
+    Rewrites the manifest with one line per document,
+    via a temporary file and an atomic rename.
+    """
+    temp_path = manifest_path + ".tmp"
+
+    with open(temp_path, "w", encoding="utf-8") as f:
+        for path in sorted(manifest):
+            f.write(json.dumps(manifest[path]) + "\n")
+
+    os.replace(temp_path, manifest_path)
+
+
+def make_manifest_record(result):
+    """The ingest manifest record for one finished document."""
+    return {
+        "path": result["manifest_key"],
+        "file_type": result["file_type"],
+        "sha256": result["sha256"],
+        "size": result["file_size"],
+        "mtime_ns": result["mtime_ns"],
+        "params": result["params"],
+        "source_attribution_string": result["source_attribution_string"],
+        "pool_counter": result["pool_counter"],
+        "outputs": result["outputs"],
+        "section_keys": result.get("section_keys", []),
+    }
+
+
+def is_unchanged(work_item, record, params, source_attribution_string=None):
+    """
+    True if a manifest record says this exact file (same size and mtime)
+    was already processed with the same parameters
+    (and, if given, the same attribution string).
+    Files with a new mtime are hashed by the worker instead.
+    """
+    return (
+        record is not None
+        and record.get("params") == params
+        and (
+            source_attribution_string is None
+            or record.get("source_attribution_string") == source_attribution_string
+        )
+        and record.get("size") == work_item.size
+        and record.get("mtime_ns") == work_item.mtime_ns
+    )
+
+
+def next_free_pool_counter(manifest, prefix=BULK_FILE_FOLDER_PREFIX, also_used=()):
+    """
+    The first bulk_files_folder_N number not used
+    by the manifest, by an existing folder, or in also_used.
+    """
+    used = [record["pool_counter"] for record in manifest.values()]
+    used.extend(also_used)
+
+    for dir_name in os.listdir("."):
+        number = dir_name[len(prefix) :]
+        if dir_name.startswith(prefix) and number.isdigit():
+            used.append(int(number))
+
+    return max(used, default=0) + 1
+
+
+def remove_path(path):
+    """Removes a file or directory tree, if it exists."""
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def find_duplicate_inputs(work_list, ingest_manifest=None):
+    """
+    Finds identical inputs, among the work list and the documents already
+    processed (in the ingest manifest, e.g. when watched files arrive):
+    only files of the same type and size are compared, by sha256
+    (streamed; a file unchanged since its manifest record is not hashed
+    again, its recorded sha256 is used). Of each identical group, the first
+    copy already processed is kept, or else the first copy.
+
+    Returns:
+        tuple: (unique WorkItems in their original order,
+                {kept path: [duplicate paths]},
+                {path: sha256} for the work list files compared)
+    """
+    if ingest_manifest is None:
+        ingest_manifest = {}
+
+    same_size = collections.defaultdict(list)
+    for work_item in work_list:
+        same_size[(work_item.file_type, work_item.size)].append(work_item.path)
+
+    # processed documents not in the work list (only compared if needed)
+    work_list_keys = {os.path.normpath(work_item.path) for work_item in work_list}
+    processed_same_size = collections.defaultdict(list)
+    for path, record in ingest_manifest.items():
+        if path not in work_list_keys:
+            processed_same_size[(record["file_type"], record["size"])].append(path)
+
+    def read_sha256(path):
+        """The recorded sha256 if the file is unchanged since, else its hash."""
+        record = ingest_manifest.get(os.path.normpath(path))
+        stat_result = os.stat(path)
+        if (
+            record is not None
+            and record.get("size") == stat_result.st_size
+            and record.get("mtime_ns") == stat_result.st_mtime_ns
+        ):
+            return record["sha256"]
+        return hash_file(path, HASH_BLOCK_SIZE)
+
+    aliases = {}
+    hashes = {}
+    duplicate_paths = set()
+
+    for size_key, paths in same_size.items():
+        processed_paths = []
+        for path in processed_same_size.get(size_key, []):
+            # a document since removed (or changed) is not compared
+            try:
+                stat_result = os.stat(path)
+            except OSError:
+                continue
+            if (stat_result.st_size, stat_result.st_mtime_ns) == (
+                ingest_manifest[path]["size"],
+                ingest_manifest[path]["mtime_ns"],
+            ):
+                processed_paths.append(path)
+
+        if len(paths) + len(processed_paths) < 2:
+            continue
+
+        same_hash = collections.defaultdict(list)
+        for path in paths:
+            sha256 = read_sha256(path)
+            hashes[path] = sha256
+            same_hash[sha256].append(path)
+        for path in processed_paths:
+            same_hash[ingest_manifest[path]["sha256"]].append(path)
+
+        for group_paths in same_hash.values():
+            if len(group_paths) < 2:
+                continue
+
+            processed = [
+                path for path in group_paths if os.path.normpath(path) in ingest_manifest
+            ]
+            kept_path = (processed or group_paths)[0]
+
+            aliases[kept_path] = [path for path in group_paths if path != kept_path]
+            duplicate_paths.update(aliases[kept_path])
+
+    unique_work_list = [
+        work_item for work_item in work_list if work_item.path not in duplicate_paths
+    ]
+
+    return unique_work_list, aliases, hashes
+
+
+def forget_duplicate_outputs(aliases, ingest_manifest):
+    """
+    Removes the outputs (and manifest records) of documents that are
+    now duplicates, e.g. a copy processed in an earlier run,
+    so their chunks are not pooled twice.
+
+    Returns:
+        list: the duplicate paths whose outputs were removed
+    """
+    removed = []
+    for duplicate_paths in aliases.values():
+        for duplicate_path in duplicate_paths:
+            record = ingest_manifest.pop(os.path.normpath(duplicate_path), None)
+            if record is None:
+                continue
+
+            print(f"Removing the outputs of duplicate: {duplicate_path}")
+            for old_output in list_output_paths(record["outputs"]):
+                remove_path(old_output)
+            removed.append(duplicate_path)
+
+    return removed
+
+
+def load_quarantine(quarantine_path=QUARANTINE_PATH):
+    """
+    Loads the quarantine list: one JSON record per failed document.
+
+    Returns:
+        dict: input path -> quarantine record
+    """
+    quarantine = {}
+
+    if not quarantine_path or not os.path.exists(quarantine_path):
+        return quarantine
+
+    with open(quarantine_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                quarantine[record["path"]] = record
+
+    return quarantine
+
+
+def save_quarantine(quarantine, quarantine_path=QUARANTINE_PATH):
+    """Rewrites the quarantine list (via a temporary file and an atomic rename)."""
+    temp_path = quarantine_path + ".tmp"
+
+    with open(temp_path, "w", encoding="utf-8") as f:
+        for record in quarantine.values():
+            f.write(json.dumps(record) + "\n")
+
+    os.replace(temp_path, quarantine_path)
+
+
+def update_quarantine(quarantine, results):
+    """
+    Adds the documents that failed (or timed out) in this run,
+    and takes out the ones that have now been processed.
+
+    Returns:
+        list: paths of the documents quarantined by this run
+    """
+    newly_quarantined = []
+
+    for result in results:
+        manifest_key = result["manifest_key"]
+
+        if not result.get("error"):
+            quarantine.pop(manifest_key, None)
+            continue
+
+        if result.get("timed_out_seconds"):
+            reason = "timeout"
+        elif result.get("over_memory_limit_mb"):
+            reason = "memory"
+        else:
+            reason = "error"
+
+        quarantine[manifest_key] = {
+            "path": manifest_key,
+            "file_type": result["file_type"],
+            "size": result["file_size"],
+            "mtime_ns": result["mtime_ns"],
+            "reason": reason,
+            "error": result["error"],
+            "quarantined": datetime.now().isoformat(timespec="seconds"),
+        }
+        newly_quarantined.append(manifest_key)
+
+    return newly_quarantined
+
+
+def drop_quarantined(work_list, quarantine):
+    """
+    Leaves out quarantined documents, unless the file has changed since.
+
+    Returns:
+        tuple: (work_list without them, the quarantined WorkItems)
+    """
+    kept = []
+    quarantined = []
+
+    for work_item in work_list:
+        record = quarantine.get(os.path.normpath(work_item.path))
+        if (
+            record is not None
+            and record["size"] == work_item.size
+            and record["mtime_ns"] == work_item.mtime_ns
+        ):
+            quarantined.append(work_item)
+        else:
+            kept.append(work_item)
+
+    return kept, quarantined
+
+
+###################
+# document journal
+###################
+"""
+While a document is written, its journal records each piece (e.g. pdf page)
+and each section (e.g. epub spine item) that has been completely written:
+how long each output file was at that point, how many chunks there were,
+and the chunker's state (unfinished sentence, chunk in progress).
+
+If the process dies part way through a document, the next run cuts the
+output files back to the journal's last record, removes chunk files written
+after it, and carries on from the next piece: nothing is appended twice.
+"""
+
+
+def make_journal_header(sha256, file_type, source_path, source_attribution_string):
+    """
+    What a journal is only valid for: this file and content,
+    with these settings and this attribution string.
+    """
+    return {
+        "path": source_path,
+        "sha256": sha256,
+        "file_type": file_type,
+        "params": make_chunking_params(),
+        "source_attribution_string": source_attribution_string,
+        "STREAM_WINDOW_CHARS": STREAM_WINDOW_CHARS,
+        # a pdf's pieces are pages with one reader, windows with several
+        "pdf_readers": [PDF_USE_ALL, PDF_TRY_PYMU, PDF_TRY_PYPDF, PDF_TRY_PDFPLUMBER],
+    }
+
+
+def start_document_journal(journal_path, header):
+    """Starts a new (empty) journal, returns it."""
+    with open(journal_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(header) + "\n")
+
+    return {"path": journal_path, "records": []}
+
+
+def load_document_journal(journal_path, header):
+    """
+    Loads a journal left by an interrupted run.
+
+    A half-written last line is cut off. Only the finished-section records
+    and the last record are kept (that is all resuming needs).
+
+    Returns:
+        dict or None: {'path', 'records'}, or None if there is nothing to
+                      resume: no journal, no records, a different header
+                      (the file or settings changed), or output files
+                      shorter than recorded
+    """
+    if not os.path.exists(journal_path):
+        return None
+
+    records = []
+    good_length = 0
+
+    with open(journal_path, "rb") as f:
+        for line_number, line in enumerate(f):
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("unfinished line")
+                record = json.loads(line)
+            except ValueError:
+                # a half-written last line from an interrupted run
+                break
+
+            if line_number == 0:
+                if record.get("sha256") != header["sha256"]:
+                    print(f"Changed since it was interrupted, starting over: {header['path']}")
+                    return None
+                if record != header:
+                    return None
+            else:
+                if records and not records[-1]["done"]:
+                    records.pop()
+                records.append(record)
+
+            good_length += len(line)
+
+    if not records:
+        return None
+
+    # flushed output survives the process dying, not the machine
+    base_dir = os.path.dirname(journal_path)
+    for relative_path, offset in records[-1]["offsets"].items():
+        path = os.path.join(base_dir, relative_path)
+        if not os.path.exists(path) or os.path.getsize(path) < offset:
+            return None
+
+    os.truncate(journal_path, good_length)
+
+    return {"path": journal_path, "records": records}
+
+
+def read_journal_header(journal_path):
+    """A journal's first line (its header), None if there is none to read."""
+    try:
+        with open(journal_path, "r", encoding="utf-8") as f:
+            return json.loads(f.readline())
+    except (OSError, ValueError):
+        return None
+
+
+def adopt_partial_dir(partial_dir, header, partial_dir_pattern):
+    """
+    If partial_dir does not exist, takes over the '_partial' folder an
+    interrupted run left for this same file (header 'path') under another
+    name matching partial_dir_pattern: a document not yet in the ingest
+    manifest may get another folder number in the next run.
+    Whether it can be resumed is then up to load_document_journal().
+    """
+    if os.path.exists(partial_dir):
+        return
+
+    for other_dir in sorted(glob.glob(partial_dir_pattern)):
+        other_header = read_journal_header(os.path.join(other_dir, JOURNAL_FILE_NAME))
+        if other_header is None or other_header.get("path") != header["path"]:
+            # another document's (e.g. notes.md beside notes.txt)
+            continue
+
+        if os.path.exists(partial_dir):
+            # another one left: only one can be resumed
+            remove_path(other_dir)
+        else:
+            os.rename(other_dir, partial_dir)
+
+
+def write_journal_record(journal_file, open_files, record, base_dir):
+    """
+    Flushes the open output files, then appends the record
+    with each file's length (relative path -> offset).
+    """
+    offsets = {}
+    for f in open_files:
+        f.flush()
+        offsets[os.path.relpath(f.name, base_dir)] = f.tell()
+
+    record["offsets"] = offsets
+
+    journal_file.write(json.dumps(record) + "\n")
+    journal_file.flush()
+
+
+def restore_journaled_outputs(
+    records, base_dir, document_file_paths, chunks_dir, pool_dir
+):
+    """
+    Puts a document's outputs back to where the journal's last record was:
+    files cut back to their recorded length (or removed if they came later),
+    only journaled chunk files kept, and the document's (private)
+    pool directory refilled with those chunk files.
+    """
+    offsets = records[-1]["offsets"]
+
+    for path in document_file_paths:
+        if os.path.relpath(path, base_dir) not in offsets:
+            remove_path(path)
+
+    for relative_path, offset in offsets.items():
+        os.truncate(os.path.join(base_dir, relative_path), offset)
+
+    journaled_chunk_files = set()
+    for record in records:
+        if record["done"]:
+            number_of_chunks = record["number_of_chunks"] or 0
+        else:
+            number_of_chunks = record["state"]["number_of_chunks"]
+
+        journaled_chunk_files.update(
+            make_chunk_file_name(record["section_id"], index)
+            for index in range(number_of_chunks)
+        )
+
+    remove_path(pool_dir)
+    os.makedirs(pool_dir)
+
+    for chunk_name in os.listdir(chunks_dir):
+        chunk_path = os.path.join(chunks_dir, chunk_name)
+        if chunk_name in journaled_chunk_files:
+            shutil.copyfile(chunk_path, os.path.join(pool_dir, chunk_name))
+        else:
+            os.remove(chunk_path)
+
+
+def replace_directory(new_dir, final_dir):
+    """
+    Renames new_dir to final_dir, replacing any old final_dir.
+    (final_dir is only ever missing between two renames, never half-written.)
+    """
+    old_dir = final_dir + "_old"
+    remove_path(old_dir)
+
+    if os.path.exists(final_dir):
+        os.rename(final_dir, old_dir)
+
+    os.rename(new_dir, final_dir)
+    remove_path(old_dir)
+
+
+#########################
+# per-document processing
+#########################
+
+# output folder suffix per file type, e.g. "book.epub" -> "book_epub_folder_3"
+# (with the job's pool_counter, see make_document_output_paths())
+OUTPUT_FOLDER_SUFFIXES = {
+    "epub": "_epub_folder",
+    "txt": "_txt_folder",
+    "docx": "_docx_folder",
+    "pdf": "_pdf_folder",
+}
+
+
+def make_document_output_paths(
+    file_path, file_type, this_output_dir_path=None, folder_key=None
+):
+    """
+    Makes the set of output paths for one document
+    under RESULTS_DIR_NAME (the same layout for every file type).
+
+    Args:
+        file_path (str): path to the input document
+        file_type (str): 'epub', 'txt', 'docx', or 'pdf'
+        this_output_dir_path (str): optional, the same layout in another
+                                    directory (e.g. the '_partial' one)
+        folder_key: optional, appended to the folder name
+                    (the job's pool_counter: no two documents share a folder,
+                    e.g. notes1.txt and notes2.txt, or book.epub and book.pdf)
+
+    Returns:
+        dict: output directory, file, and zip-archive paths for this document
+    """
+    if this_output_dir_path is None:
+        # make directory for this book: its whole file name, without the suffix
+        file_stem = os.path.splitext(os.path.basename(file_path))[0]
+        this_output_dir_path = os.path.join(
+            os.path.dirname(file_path),
+            file_stem + OUTPUT_FOLDER_SUFFIXES[file_type],
+        )
+        if folder_key is not None:
+            this_output_dir_path += f"_{folder_key}"
+
+        # Add another parent directory, and set the absolute path
+        this_output_dir_path = os.path.abspath(
+            os.path.join(RESULTS_DIR_NAME, this_output_dir_path)
+        )
+
+    return {
+        "output_dir": this_output_dir_path,
+        # json
+        "output_jsonl_path": os.path.join(this_output_dir_path, "output.jsonl"),
+        "output_json_dir": os.path.join(this_output_dir_path, "individual_jsons"),
+        "output_json_zip_dir": os.path.join(this_output_dir_path, "jsons_zip_archive"),
+        # txt
+        "output_whole_txt_path": os.path.join(this_output_dir_path, "whole.txt"),
+        "output_txt_dir": os.path.join(this_output_dir_path, "individual_txt"),
+        "output_txt_zip_dir": os.path.join(this_output_dir_path, "txt_zip_archive"),
+        # chunks
+        "output_chunks_jsonl_path": os.path.join(
+            this_output_dir_path, "chunks_jsonl_all.jsonl"
+        ),
+        "output_chunks_dir": os.path.join(this_output_dir_path, "chunk_text_files"),
+        "output_chunks_zip_dir": os.path.join(
+            this_output_dir_path, "chunks_zip_archive"
+        ),
+    }
+
+
+def post_process_pool(pool_dir, source_attribution_string, bulk_files_dir):
+    """
+    The 'Bundle of Additional/Optional Items' run on one document's txt_pool,
+    which is then renamed to that document's bulk_files_folder_N.
+    """
+    # Removes files smaller than N bytes from X directory
+    remove_small_files(pool_dir, REMOVE_BELOW_SIZE)
+
+    # Call the function with the directory containing the .txt files
+    back_append_stub_files(pool_dir)
+
+    add_source_attribution(source_attribution_string, directory=pool_dir)
+
+    # count all file chunks created
+    count_files(pool_dir)
+
+    # rename_directory('old_name', 'new_name')
+    rename_directory(pool_dir, bulk_files_dir)
+
+
+def process_document(job):
+    """
+    Worker: processes one whole document.
+
+    Everything this writes to goes either into the document's own
+    results folder or into the job's private worker_area, so documents
+    can be processed in parallel without touching each other's txt_pool.
+
+    Args:
+        job (dict): file_path, file_type, pool_counter,
+                    source_attribution_string, worker_area
+
+    Returns:
+        dict: the job, plus 'staged_bulk_dir' (the finished
+              bulk_files_folder_N inside worker_area),
+              'staged_slides_dir' (pptx: its slides folder, also there)
+              and 'timings' (total seconds, seconds per stage)
+    """
+    apply_config(job.get("config"))
+
+    if job.get("profile"):
+        return profile_document(job)
+
+    take_stage_times()
+    take_boilerplate_sections()
+    boilerplate_state["repeated_keys"] = set(job.get("repeated_section_keys", ()))
+    started = time.perf_counter()
+
+    file_path = job["file_path"]
+    file_type = job["file_type"]
+    worker_area = job["worker_area"]
+
+    print(f"\n\n For {file_type}: {file_path}")
+
+    result = dict(job)
+
+    # hashing happens here, in parallel.
+    # A file that was only touched (same content) is not processed again.
+    with stage_timer("hash"):
+        result["sha256"] = job.get("known_sha256") or hash_file(
+            file_path, HASH_BLOCK_SIZE
+        )
+    if job.get("previous_sha256") == result["sha256"]:
+        print(f"Unchanged content, skipping: {file_path}")
+        result["skipped"] = True
+        return result
+
+    # batch mode: metadata lookups happen here, in parallel
+    with stage_timer("attribution"):
+        source_attribution_string = resolve_source_attribution_string(job)
+
+    pool_output_chunks_dir = os.path.join(worker_area, "txt_pool")
+    staged_bulk_dir = os.path.join(
+        worker_area, f"{BULK_FILE_FOLDER_PREFIX}{job['pool_counter']}"
+    )
+
+    # left over only if a run was interrupted
+    remove_path(worker_area)
+
+    # start from empty outputs: re-processing replaces, never appends
+    # (a results folder is replaced once its new version is finished)
+    previous_outputs = dict(job.get("previous_outputs", {}))
+    previous_results_dir = previous_outputs.pop("results_dir", None)
+    for old_output in list_output_paths(previous_outputs):
+        remove_path(old_output)
+
+    if file_type == "pptx":
+        # written in the worker area, moved to pptx_chunks by merge_worker_output()
+        with stage_timer("read"):
+            staged_slides_dir = extract_pptx_text_to_file(
+                file_path, os.path.join(worker_area, "pptx_chunks")
+            )
+        result["staged_slides_dir"] = staged_slides_dir
+        # e.g. "pptx_chunks/deck_chunks_3": no two decks share a folder
+        slides_dir = os.path.join(
+            "pptx_chunks", f"{os.path.basename(staged_slides_dir)}_{job['pool_counter']}"
+        )
+        result["outputs"] = {"slides_dir": slides_dir}
+        result["number_of_chunks"] = len(os.listdir(staged_slides_dir))
+
+        # move pptx files
+        with stage_timer("pool"):
+            pool_txt_files(staged_slides_dir, pool_output_chunks_dir)
+
+    else:
+        paths = make_document_output_paths(
+            file_path, file_type, folder_key=job["pool_counter"]
+        )
+        print(paths["output_dir"])
+        result["outputs"] = {"results_dir": os.path.relpath(paths["output_dir"])}
+
+        # written in a '_partial' folder, renamed into place once finished
+        partial_paths = make_document_output_paths(
+            file_path, file_type, paths["output_dir"] + PARTIAL_DIR_SUFFIX
+        )
+
+        journal = None
+        if JOURNAL_MODE:
+            journal_path = os.path.join(partial_paths["output_dir"], JOURNAL_FILE_NAME)
+            journal_header = make_journal_header(
+                result["sha256"], file_type, job["manifest_key"], source_attribution_string
+            )
+            # any folder number, or none (before folder numbers)
+            unnumbered_dir = make_document_output_paths(file_path, file_type)["output_dir"]
+            adopt_partial_dir(
+                partial_paths["output_dir"],
+                journal_header,
+                glob.escape(unnumbered_dir) + "*" + PARTIAL_DIR_SUFFIX,
+            )
+            journal = load_document_journal(journal_path, journal_header)
+
+        if journal:
+            print(f"Resuming an interrupted run: {file_path}")
+            result["resumed"] = True
+        else:
+            # Create a directory for this document
+            remove_path(partial_paths["output_dir"])
+            os.makedirs(partial_paths["output_dir"])
+
+            if JOURNAL_MODE:
+                journal = start_document_journal(journal_path, journal_header)
+
+        extract_args = (
+            file_path,
+            partial_paths["output_dir"],
+            partial_paths["output_jsonl_path"],
+            partial_paths["output_json_dir"],
+            partial_paths["output_whole_txt_path"],
+            partial_paths["output_txt_dir"],
+            partial_paths["output_chunks_jsonl_path"],
+            partial_paths["output_chunks_dir"],
+        )
+
+        # chunk files and log lines are written in the background meanwhile
+        with background_writer():
+            result["number_of_chunks"] = extract_document(
+                file_type,
+                *extract_args,
+                max_chunk_size=MAX_CHUNK_SIZE,
+                pool_output_chunks_dir=pool_output_chunks_dir,
+                journal=journal,
+            ) or 0
+
+        # Call the zip function
+        """
+        zip_folder(path_to_directory_to_zip, output_destination_zip_file_path)
+        """
+        with stage_timer("zip"):
+            zip_folder(
+                partial_paths["output_json_dir"], partial_paths["output_json_zip_dir"]
+            )
+            zip_folder(
+                partial_paths["output_txt_dir"], partial_paths["output_txt_zip_dir"]
+            )
+            zip_folder(
+                partial_paths["output_chunks_dir"], partial_paths["output_chunks_zip_dir"]
+            )
+
+        # finished: no more need for the journal
+        if journal:
+            remove_path(journal["path"])
+
+        replace_directory(partial_paths["output_dir"], paths["output_dir"])
+
+        if previous_results_dir and os.path.abspath(previous_results_dir) != paths["output_dir"]:
+            remove_path(previous_results_dir)
+
+    # a document with no chunks never creates its txt_pool
+    if not os.path.exists(pool_output_chunks_dir):
+        os.makedirs(pool_output_chunks_dir)
+
+    with stage_timer("pool"):
+        post_process_pool(
+            pool_output_chunks_dir, source_attribution_string, staged_bulk_dir
+        )
+
+    result["source_attribution_string"] = source_attribution_string
+    result["staged_bulk_dir"] = staged_bulk_dir
+    result["boilerplate"] = take_boilerplate_sections()
+    result["outputs"]["bulk_files_dir"] = f"{BULK_FILE_FOLDER_PREFIX}{job['pool_counter']}"
+
+    # hashed here, in parallel
+    if OUTPUT_MANIFEST_PATH:
+        with stage_timer("output_manifest"):
+            result["artifacts"] = list_document_artifacts(result)
+
+    result["timings"] = {
+        "seconds": round(time.perf_counter() - started, 6),
+        "stages": take_stage_times(),
+    }
+
+    record_span(
+        os.path.basename(file_path),
+        started,
+        time.perf_counter(),
+        "document",
+        {"path": file_path, "file_type": file_type},
+    )
+    if TRACE_PATH:
+        result["trace_events"] = take_trace_events()
+
+    return result
+
+
+##############
+# boilerplate
+##############
+"""
+Front/back matter that every book of a bundle repeats (copyright pages,
+"Also by" lists, ads, indexes) is found per epub spine file, before
+chunking (BOILERPLATE_MODE "tag" or "skip"), by:
+
+    non_linear     -> linear="no" in the spine
+    landmark:TYPE  -> a BOILERPLATE_LANDMARK_TYPES type in the OPF guide
+                      or the EPUB3 nav document's landmarks
+    repeated       -> the same file (CRC-32 and size, from the zip directory)
+                      is in BOILERPLATE_REPEAT_BOOKS or more books
+
+Repeats are counted before any document is processed, over this run's
+epubs and those in the ingest manifest (each record keeps its
+"section_keys"), so every book of a bundle ingested together is
+classified the same way whatever order they finish in. Books already
+ingested are not classified again until they are re-processed.
+"""
+
+EPUB_HTML_SUFFIXES = (".xhtml", ".html", ".htm")
+
+
+def read_epub_member_keys(epub_file_path):
+    """The content keys of an epub's html files (zip directory only, nothing is read)."""
+    with zipfile.ZipFile(epub_file_path, "r") as zip_file:
+        return sorted(
+            {
+                zip_member_key(info)
+                for info in zip_file.infolist()
+                if info.filename.lower().endswith(EPUB_HTML_SUFFIXES)
+            }
+        )
+
+
+def find_repeated_sections(jobs, ingest_manifest, repeat_books=BOILERPLATE_REPEAT_BOOKS):
+    """
+    Sets, on each epub job, job["section_keys"] (its html files' content keys,
+    kept in its manifest record) and job["repeated_section_keys"]
+    (those in repeat_books or more books: this run's, and the manifest's).
+
+    A book with more than half of its html files repeated is more likely
+    another copy or edition of the same book: none of its files are
+    marked as repeated.
+
+    Returns:
+        int: number of epub jobs with repeated files
+    """
+    job_keys = {}
+    for job in jobs:
+        if job["file_type"] != "epub":
+            continue
+        try:
+            job_keys[job["manifest_key"]] = read_epub_member_keys(job["file_path"])
+        except (OSError, zipfile.BadZipFile):
+            # the worker reports it
+            continue
+
+    books_by_key = collections.defaultdict(set)
+    for path, record in ingest_manifest.items():
+        if path not in job_keys:
+            for key in record.get("section_keys", ()):
+                books_by_key[key].add(path)
+    for path, keys in job_keys.items():
+        for key in keys:
+            books_by_key[key].add(path)
+
+    books_with_repeats = 0
+    for job in jobs:
+        keys = job_keys.get(job["manifest_key"])
+        if keys is None:
+            continue
+
+        job["section_keys"] = keys
+        repeated = [key for key in keys if len(books_by_key[key]) >= repeat_books]
+        if repeated and len(repeated) <= len(keys) / 2:
+            job["repeated_section_keys"] = repeated
+            books_with_repeats += 1
+
+    if books_with_repeats:
+        print(f"{books_with_repeats} epub(s) with html files repeated across books")
+
+    return books_with_repeats
+
+
+def summarize_boilerplate(results):
+    """
+    The run report's boilerplate totals: sections and html bytes found,
+    text bytes written (sections tagged), html bytes saved (sections
+    skipped, never read), and the same per reason.
+    """
+    summary = {
+        "mode": BOILERPLATE_MODE,
+        "sections": 0,
+        "html_bytes": 0,
+        "bytes": 0,
+        "bytes_saved": 0,
+        "by_reason": {},
+    }
+
+    for result in results:
+        for section in result.get("boilerplate", []):
+            summary["sections"] += 1
+            summary["html_bytes"] += section["html_bytes"]
+            summary["bytes"] += section["bytes"]
+            if section["skipped"]:
+                summary["bytes_saved"] += section["html_bytes"]
+
+            for reason in section["reasons"]:
+                reason_summary = summary["by_reason"].setdefault(
+                    reason, {"sections": 0, "html_bytes": 0, "bytes": 0}
+                )
+                reason_summary["sections"] += 1
+                reason_summary["html_bytes"] += section["html_bytes"]
+                reason_summary["bytes"] += section["bytes"]
+
+    return summary
+
+
+############
+# profiling
+############
+"""
+Documents chosen with PROFILE_DOCUMENTS (globs) or PROFILE_SLOWEST
+(the N slowest in the last run report) get job["profile"]: they are
+processed even if unchanged, under cProfile and tracemalloc, and two
+files are written in their results folder, next to log.txt
+(for pptx: next to the slides folder, as <name>_profile.prof ...):
+
+    profile.prof     -> python -m pstats profile.prof, or snakeviz
+    allocations.txt  -> peak traced memory, the top allocation sites
+                        near the peak and those still held at the end
+
+cProfile sees the worker's main thread only (writer threads show in
+--trace). tracemalloc slows processing down considerably.
+"""
+
+
+def select_profiled_documents(
+    work_list, patterns=None, slowest=None, report_path=PERFORMANCE_REPORT_PATH
+):
+    """
+    The documents to profile: those matching a glob pattern
+    (by path or file name), and the `slowest` slowest in the last run report.
+
+    Returns:
+        set: normalized paths (as manifest keys)
+    """
+    if patterns is None:
+        patterns = PROFILE_DOCUMENTS
+    if slowest is None:
+        slowest = PROFILE_SLOWEST
+
+    paths = {os.path.normpath(work_item.path) for work_item in work_list}
+    profiled = {
+        path
+        for path in paths
+        for pattern in patterns
+        if fnmatch.fnmatch(path, pattern)
+        or fnmatch.fnmatch(os.path.basename(path), pattern)
+    }
+
+    if slowest and report_path and os.path.exists(report_path):
+        try:
+            with open(report_path, "r", encoding="utf-8") as f:
+                by_document = json.load(f).get("by_document", [])
+        except (OSError, ValueError) as e:
+            print(f"Could not read {report_path} for the slowest documents: {e}")
+            by_document = []
+
+        by_document = sorted(by_document, key=lambda document: -document["seconds"])
+        for document in by_document[:slowest]:
+            path = os.path.normpath(document["path"])
+            if path in paths:
+                profiled.add(path)
+
+    return profiled
+
+
+def watch_traced_memory(peak, stop, interval):
+    """
+    Thread: while tracemalloc runs, takes a snapshot each time traced memory
+    reaches a new high (by 10%+), keeping the largest in peak["snapshot"].
+    """
+    while not stop.wait(interval):
+        current = tracemalloc.get_traced_memory()[0]
+        if current > peak["bytes"] * 1.1:
+            peak["bytes"] = current
+            peak["snapshot"] = tracemalloc.take_snapshot()
+
+
+def format_allocations(title, snapshot, top):
+    """The top allocation sites (by line) of a tracemalloc snapshot, as text lines."""
+    lines = [title]
+    for statistic in snapshot.statistics("lineno")[:top]:
+        lines.append(f"  {statistic}")
+    return lines
+
+
+def profile_document(job):
+    """
+    process_document() under cProfile and tracemalloc,
+    then writes profile.prof and allocations.txt (see the notes above).
+
+    Returns:
+        dict: the result, plus 'profile_outputs' (the files written)
+    """
+    peak = {"bytes": 0, "snapshot": None}
+    stop = threading.Event()
+    watcher = threading.Thread(
+        target=watch_traced_memory,
+        args=(peak, stop, PROFILE_SNAPSHOT_SECONDS),
+        name="traced_memory_watch",
+        daemon=True,
+    )
+
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    watcher.start()
+    try:
+        profiler.enable()
+        try:
+            result = process_document(dict(job, profile=False))
+        finally:
+            profiler.disable()
+            stop.set()
+            watcher.join()
+            end_snapshot = tracemalloc.take_snapshot()
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    if result.get("skipped"):
+        return result
+
+    results_dir = result["outputs"].get("results_dir")
+    if results_dir:
+        profile_path = os.path.join(results_dir, "profile.prof")
+        allocations_path = os.path.join(results_dir, "allocations.txt")
+    else:
+        # pptx: beside the slides folder (its .txt files are pooled)
+        slides_dir = result["outputs"]["slides_dir"]
+        os.makedirs(os.path.dirname(slides_dir), exist_ok=True)
+        profile_path = slides_dir + "_profile.prof"
+        allocations_path = slides_dir + "_allocations.txt"
+
+    profiler.dump_stats(profile_path)
+
+    lines = [
+        f"{job['file_path']}",
+        f"peak traced memory: {peak_bytes / 1024 / 1024:.1f} MB",
+        "",
+    ]
+    if peak["snapshot"] is not None:
+        lines.extend(
+            format_allocations(
+                f"top {PROFILE_TOP_ALLOCATIONS} allocation sites "
+                f"at {peak['bytes'] / 1024 / 1024:.1f} MB (near the peak):",
+                peak["snapshot"],
+                PROFILE_TOP_ALLOCATIONS,
+            )
+        )
+        lines.append("")
+    lines.extend(
+        format_allocations(
+            f"top {PROFILE_TOP_ALLOCATIONS} allocation sites still held at the end:",
+            end_snapshot,
+            PROFILE_TOP_ALLOCATIONS,
+        )
+    )
+    with open(allocations_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+    print(f"Profile of {job['file_path']}: {profile_path}, {allocations_path}")
+    result["profile_outputs"] = [profile_path, allocations_path]
+    return result
+
+
+#############
+# scheduling
+#############
+
+
+def read_epub_spine_size(epub_file_path):
+    """
+    (number of spine html files, their uncompressed size in bytes),
+    from the OPF and the zip directory (nothing is decompressed but the OPF).
+    """
+    with EpubArchive(epub_file_path) as epub:
+        spine_members = epub.spine_members()
+        spine_bytes = sum(
+            epub.member_size(member) for _, member in spine_members if member is not None
+        )
+
+    return len(spine_members), spine_bytes
+
+
+def read_pdf_page_count(pdf_path):
+    """The page count from the pdf's page tree (no page is read)."""
+    fitz = import_backend("fitz")
+    with fitz.open(pdf_path) as pdf_file:
+        return pdf_file.page_count
+
+
+def estimate_job_cost(file_path, file_type, file_size):
+    """
+    A rough cost for a document (relative units), for ordering work:
+    MB of input times JOB_COST_PER_MB for its format, using the html
+    size of an epub's spine and adding JOB_COST_PER_PDF_PAGE per pdf page.
+    Falls back to the file size if the file can't be read.
+
+    Returns:
+        dict: 'estimated_cost', 'pages' (pdf pages or epub spine files,
+              None if unknown), 'heavy' (a pdf of HEAVY_PDF_PAGES or more,
+              or a file of HEAVY_FILE_MB or more)
+    """
+    cost_bytes = file_size
+    pages = None
+
+    try:
+        if file_type == "epub":
+            pages, cost_bytes = read_epub_spine_size(file_path)
+        elif file_type == "pdf":
+            pages = read_pdf_page_count(file_path)
+    except Exception as e:
+        print(f"Cost estimate from file size only ({file_path}): {e}")
+
+    cost = cost_bytes / 1_000_000 * JOB_COST_PER_MB.get(file_type, 1.0)
+    if file_type == "pdf" and pages:
+        cost += pages * JOB_COST_PER_PDF_PAGE
+
+    heavy_file_mb = HEAVY_FILE_MB.get(file_type)
+
+    return {
+        "estimated_cost": round(cost, 6),
+        "pages": pages,
+        "heavy": (file_type == "pdf" and (pages or 0) >= HEAVY_PDF_PAGES)
+        or (heavy_file_mb is not None and file_size >= heavy_file_mb * 1_000_000),
+    }
+
+
+def add_job_cost_estimates(jobs):
+    """Adds estimate_job_cost() to each job."""
+    for job in jobs:
+        job.update(estimate_job_cost(job["file_path"], job["file_type"], job["file_size"]))
+
+
+def make_heavy_job_limits():
+    """{file type: how many heavy documents of it may run at once (None -> any)}"""
+    return dict(MAX_HEAVY_JOBS, pdf=MAX_HEAVY_PDF_JOBS)
+
+
+def pop_next_job(pending, running_jobs, max_heavy_jobs=None):
+    """
+    Takes the next job to start from pending (largest first):
+    the first one that is not heavy, or is allowed to run
+    next to the heavy documents of its format already running.
+
+    Args:
+        max_heavy_jobs (dict): default make_heavy_job_limits()
+
+    Returns:
+        dict or None: None if only heavy documents are waiting, and enough are running
+    """
+    if max_heavy_jobs is None:
+        max_heavy_jobs = make_heavy_job_limits()
+
+    heavy_running = collections.Counter(
+        job["file_type"] for job in running_jobs if job.get("heavy")
+    )
+
+    for index, job in enumerate(pending):
+        limit = max_heavy_jobs.get(job["file_type"])
+        if (
+            not job.get("heavy")
+            or limit is None
+            or heavy_running[job["file_type"]] < limit
+            or not running_jobs
+        ):
+            return pending.pop(index)
+
+    return None
+
+
+##############
+# worker watch
+##############
+"""
+The driver watches each worker process while it runs a document:
+its resident memory (WORKER_MEMORY_LIMIT_MB) and how long the document
+has been running (DOCUMENT_TIMEOUT_SECONDS). Each worker is a process
+pool of its own, so a worker over either limit is stopped and replaced
+alone: the documents running in the other workers carry on. A document
+that was too big is retried once with make_degraded_job(); one that
+timed out fails, with the stack it was stuck in as its traceback.
+"""
+
+# set in each pool worker: where it says which job it is running
+job_started_queue = None
+
+
+def set_up_pool_worker(started_queue, traceback_dir):
+    """
+    Pool worker initializer: keeps the queue to the driver, dumps
+    the stacks of its threads to a file on SIGUSR1 (where available),
+    and starts a process group, so the processes it starts (an epub's
+    section pool) are measured and stopped with it.
+    """
+    global job_started_queue
+    job_started_queue = started_queue
+
+    if hasattr(os, "setpgid"):
+        os.setpgid(0, 0)
+
+    if hasattr(signal, "SIGUSR1"):
+        traceback_path = os.path.join(traceback_dir, f"traceback_{os.getpid()}.txt")
+        # kept open for the life of the worker (faulthandler writes to its fd)
+        traceback_file = open(traceback_path, "w")
+        faulthandler.register(signal.SIGUSR1, file=traceback_file, all_threads=True)
+
+
+def run_pool_job(job):
+    """process_document() in a pool worker, after telling the driver it started."""
+    if job_started_queue is not None:
+        job_started_queue.put((job["pool_counter"], os.getpid(), time.time()))
+
+    return process_document(job)
+
+
+def start_worker_watch(
+    memory_limit_mb=WORKER_MEMORY_LIMIT_MB,
+    timeout_seconds=DOCUMENT_TIMEOUT_SECONDS,
+    traceback_dir=WORKER_STAGING_DIR_NAME,
+):
+    """
+    The watch's state, or None if there is nothing to watch.
+    (The memory limit is left out if a process's memory can't be read here.)
+    """
+    try:
+        psutil = import_backend("psutil")
+    except ImportError:
+        psutil = None
+
+    if (
+        memory_limit_mb is not None
+        and psutil is None
+        and not os.path.exists(f"/proc/{os.getpid()}/status")
+    ):
+        print("No psutil and no /proc: worker memory is not watched.")
+        memory_limit_mb = None
+
+    if memory_limit_mb is None and timeout_seconds is None:
+        return None
+
+    traceback_dir = os.path.abspath(traceback_dir)
+    os.makedirs(traceback_dir, exist_ok=True)
+
+    return {
+        "memory_limit_mb": memory_limit_mb,
+        "timeout_seconds": timeout_seconds,
+        "psutil": psutil,
+        "traceback_dir": traceback_dir,
+        # worker slot -> the queue its worker says which job it started on
+        "started_queues": {},
+        # pool_counter -> (pid, start time)
+        "started": {},
+    }
+
+
+def list_child_pids(pid, psutil=None):
+    """The processes a process started, and theirs (empty if they can't be read)."""
+    if psutil is not None:
+        try:
+            return [child.pid for child in psutil.Process(pid).children(recursive=True)]
+        except psutil.Error:
+            return []
+
+    # parent pid of each process, from /proc/<pid>/stat
+    parents = {}
+    try:
+        proc_names = os.listdir("/proc")
+    except OSError:
+        return []
+    for name in proc_names:
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat", "r") as f:
+                # the command name (field 2) may hold spaces: skip past its ')'
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        parents.setdefault(int(fields[1]), []).append(int(name))
+
+    child_pids = []
+    to_visit = [pid]
+    while to_visit:
+        children = parents.get(to_visit.pop(), [])
+        child_pids.extend(children)
+        to_visit.extend(children)
+    return child_pids
+
+
+def read_process_rss_mb(pid, psutil=None):
+    """A process's resident memory in MB, None if it can't be read (e.g. it ended)."""
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss / 1_000_000
+        except psutil.Error:
+            return None
+
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    # in kB
+                    return int(line.split()[1]) * 1024 / 1_000_000
+    except OSError:
+        return None
+
+    return None
+
+
+def read_worker_rss_mb(pid, psutil=None):
+    """
+    A worker's resident memory in MB with that of the processes
+    it started (an epub's section pool), None if it can't be read.
+    """
+    rss_mb = read_process_rss_mb(pid, psutil)
+    if rss_mb is None:
+        return None
+
+    for child_pid in list_child_pids(pid, psutil):
+        # a child that just ended counts as nothing
+        rss_mb += read_process_rss_mb(child_pid, psutil) or 0
+    return rss_mb
+
+
+def stop_process(pid, psutil=None):
+    """
+    Kills a process and the processes it started (they have no chance
+    to clean up): its whole process group if it leads one
+    (see set_up_pool_worker()), else each process found.
+    """
+    try:
+        if hasattr(os, "killpg") and os.getpgid(pid) == pid:
+            os.killpg(pid, signal.SIGKILL)
+            return
+
+        # children first: once the parent is gone they can't be found
+        for child_pid in reversed(list_child_pids(pid, psutil)):
+            try:
+                os.kill(child_pid, signal.SIGKILL)
+            except OSError:
+                pass
+        if psutil is not None:
+            psutil.Process(pid).kill()
+        else:
+            os.kill(pid, signal.SIGKILL)
+    except Exception as e:
+        print(f"Could not stop process {pid}: {e}")
+
+
+def dump_worker_stack(watch, pid):
+    """The Python stacks a (stuck) worker is in, as text ('' if unavailable)."""
+    if not hasattr(signal, "SIGUSR1"):
+        return ""
+
+    traceback_path = os.path.join(watch["traceback_dir"], f"traceback_{pid}.txt")
+    try:
+        os.kill(pid, signal.SIGUSR1)
+        # written by the worker's signal handler, even inside C code
+        time.sleep(0.5)
+        with open(traceback_path, "r") as f:
+            return f.read()
+    except OSError:
+        return ""
+
+
+def check_workers(watch, running_jobs):
+    """
+    Stops the worker of each running job that is over the memory limit
+    (marking the job with 'over_memory_limit_mb') or has run too long
+    (marking it with 'timed_out_seconds' and 'stuck_traceback').
+
+    Returns:
+        list: the jobs whose worker was stopped
+    """
+    for started_queue in watch["started_queues"].values():
+        while True:
+            try:
+                pool_counter, pid, started = started_queue.get_nowait()
+            except queue.Empty:
+                break
+            watch["started"][pool_counter] = (pid, started)
+
+    stopped = []
+    for job in running_jobs:
+        if job["pool_counter"] not in watch["started"]:
+            continue
+        pid, started = watch["started"][job["pool_counter"]]
+
+        running_seconds = time.time() - started
+        if watch["timeout_seconds"] is not None and running_seconds > watch["timeout_seconds"]:
+            print(
+                f"Timed out after {running_seconds:.0f} seconds, "
+                f"stopping its worker: {job['file_path']}"
+            )
+            job["timed_out_seconds"] = round(running_seconds, 1)
+            job["stuck_traceback"] = dump_worker_stack(watch, pid)
+
+        elif watch["memory_limit_mb"] is not None:
+            rss_mb = read_worker_rss_mb(pid, watch["psutil"])
+            if rss_mb is None or rss_mb <= watch["memory_limit_mb"]:
+                continue
+            print(
+                f"Over the memory limit ({rss_mb:.0f} MB > {watch['memory_limit_mb']} MB), "
+                f"stopping its worker: {job['file_path']}"
+            )
+            job["over_memory_limit_mb"] = round(rss_mb, 1)
+
+        else:
+            continue
+
+        stop_process(pid, watch["psutil"])
+        del watch["started"][job["pool_counter"]]
+        stopped.append(job)
+
+    return stopped
+
+
+def make_degraded_job(job):
+    """
+    The job again, for a document that went over the memory limit:
+    a pdf read page by page with DEGRADED_PDF_READER only, text in
+    windows of DEGRADED_STREAM_WINDOW_CHARS, counted as heavy.
+    """
+    config = dict(job.get("config") or {})
+    config.update(
+        {
+            "PDF_USE_ALL": False,
+            "PDF_TRY_PYMU": False,
+            "PDF_TRY_PYPDF": False,
+            "PDF_TRY_PDFPLUMBER": False,
+            "STREAM_WINDOW_CHARS": DEGRADED_STREAM_WINDOW_CHARS,
+        }
+    )
+    config[DEGRADED_PDF_READER] = True
+
+    degraded_job = dict(job, config=config, degraded=True, heavy=True)
+    degraded_job["first_try_memory_mb"] = degraded_job.pop("over_memory_limit_mb")
+    return degraded_job
+
+
+##################
+# parallel driver
+##################
+
+
+def run_document_pool(jobs, max_workers=MAX_WORKERS, on_result=None):
+    """
+    Sends whole documents to a pool of worker processes.
+
+    Args:
+        jobs (list): job dicts for process_document(), started
+                     largest 'estimated_cost' first, with a limited number
+                     of 'heavy' ones running at once (see pop_next_job())
+        max_workers (int): number of worker processes, None -> os.cpu_count()
+                           (1 without ISOLATE_DOCUMENTS -> no pool, run here);
+                           workers are watched, see start_worker_watch()
+        on_result (function): optional, called here (in the main process)
+                              with each result as soon as it is finished
+
+    Returns:
+        list: result dicts, in pool_counter order.
+              A failed document has 'error' set to its traceback.
+    """
+    results = []
+
+    def finish(result):
+        if on_result is not None:
+            on_result(result)
+        results.append(result)
+
+    # largest first (see estimate_job_cost()), so a big document
+    # started last does not decide when the whole run ends
+    pending = sorted(jobs, key=lambda job: job.get("estimated_cost", 0), reverse=True)
+
+    if max_workers == 1 and not ISOLATE_DOCUMENTS:
+        for job in pending:
+            try:
+                finish(process_document(job))
+            except Exception:
+                print(traceback.format_exc())
+                finish(dict(job, error=traceback.format_exc()))
+
+    else:
+        if max_workers is None:
+            max_workers = os.cpu_count()
+
+        watch = start_worker_watch(
+            WORKER_MEMORY_LIMIT_MB, DOCUMENT_TIMEOUT_SECONDS, WORKER_STAGING_DIR_NAME
+        )
+
+        def start_pool(slot):
+            """One worker slot's pool: a single process, replaced on its own."""
+            initializer = None
+            initargs = ()
+            if watch:
+                # a new queue: a stopped worker may have left the old one broken
+                watch["started_queues"][slot] = multiprocessing.Queue()
+                initializer = set_up_pool_worker
+                initargs = (watch["started_queues"][slot], watch["traceback_dir"])
+            return concurrent.futures.ProcessPoolExecutor(
+                max_workers=1, initializer=initializer, initargs=initargs
+            )
+
+        def collect(future, job):
+            """The result of a finished job, or None if it goes back to pending."""
+            try:
+                result = future.result()
+                print(f"Finished: {job['file_path']}")
+                return result
+
+            except concurrent.futures.process.BrokenProcessPool:
+                if job.get("timed_out_seconds"):
+                    error = (
+                        f"Timed out after {job['timed_out_seconds']} seconds "
+                        f"(DOCUMENT_TIMEOUT_SECONDS = {DOCUMENT_TIMEOUT_SECONDS}), in:\n"
+                        f"{job.pop('stuck_traceback') or '(no traceback)'}"
+                    )
+                elif job.get("over_memory_limit_mb"):
+                    if not job.get("degraded"):
+                        print(f"Retrying with less memory: {job['file_path']}")
+                        pending.insert(0, make_degraded_job(job))
+                        return None
+                    error = (
+                        f"Over the memory limit ({job['over_memory_limit_mb']} MB "
+                        f"> {WORKER_MEMORY_LIMIT_MB} MB), also in degraded mode"
+                    )
+                elif job.get("pool_restarts", 0) < 1:
+                    # its worker died for no known reason: started again, once
+                    pending.insert(
+                        0, dict(job, pool_restarts=job.get("pool_restarts", 0) + 1)
+                    )
+                    return None
+                else:
+                    error = traceback.format_exc()
+
+            except Exception:
+                error = traceback.format_exc()
+
+            print(f"Failed: {job['file_path']}")
+            print(error)
+            return dict(job, error=error)
+
+        pools = [start_pool(slot) for slot in range(max_workers)]
+        try:
+            # one job per worker slot at a time,
+            # so the order (and the heavy document limits) hold
+            running = {}
+            running_slots = {}
+            free_slots = list(range(max_workers - 1, -1, -1))
+
+            while pending or running:
+                while pending and free_slots:
+                    job = pop_next_job(pending, list(running.values()))
+                    if job is None:
+                        break
+                    slot = free_slots.pop()
+                    future = pools[slot].submit(run_pool_job, job)
+                    running[future] = job
+                    running_slots[future] = slot
+
+                done, _ = concurrent.futures.wait(
+                    running,
+                    timeout=WORKER_WATCH_SECONDS if watch else None,
+                    return_when=concurrent.futures.FIRST_COMPLETED,
+                )
+
+                if watch:
+                    stopped_jobs = check_workers(watch, list(running.values()))
+                    if stopped_jobs:
+                        # only the stopped workers' own pools break
+                        stopped_ids = {id(job) for job in stopped_jobs}
+                        stopped_futures = [
+                            future for future, job in running.items()
+                            if id(job) in stopped_ids
+                        ]
+                        concurrent.futures.wait(stopped_futures)
+                        done = set(done) | set(stopped_futures)
+
+                for future in done:
+                    job = running.pop(future)
+                    slot = running_slots.pop(future)
+                    if watch:
+                        watch["started"].pop(job["pool_counter"], None)
+
+                    result = collect(future, job)
+                    if isinstance(
+                        future.exception(), concurrent.futures.process.BrokenProcessPool
+                    ):
+                        print(f"Starting a new worker process (slot {slot}).")
+                        pools[slot].shutdown(wait=True)
+                        pools[slot] = start_pool(slot)
+                    free_slots.append(slot)
+
+                    if result is not None:
+                        finish(result)
+        except KeyboardInterrupt:
+            # the workers lead their own process groups: Ctrl-C does not reach them
+            if watch:
+                for pid, _ in watch["started"].values():
+                    stop_process(pid, watch["psutil"])
+            raise
+        finally:
+            for pool in pools:
+                pool.shutdown(wait=True)
+
+    return sorted(results, key=lambda result: result["pool_counter"])
+
+
+def merge_worker_output(result):
+    """
+    Moves one document's staged bulk_files_folder_N (and a pptx's
+    slides folder) out of its worker area into the current working
+    directory, replacing that document's folders from an earlier run.
+    """
+    if result.get("error") or result.get("skipped"):
+        return
+
+    if result.get("staged_slides_dir"):
+        slides_dir = result["outputs"]["slides_dir"]
+        os.makedirs(os.path.dirname(slides_dir), exist_ok=True)
+        replace_directory(result["staged_slides_dir"], slides_dir)
+
+    bulk_files_dir = result["outputs"]["bulk_files_dir"]
+    remove_path(bulk_files_dir)
+    rename_directory(result["staged_bulk_dir"], bulk_files_dir)
+
+
+def ask_source_attribution_string(file_path):
+    """
+    Asks for the source attribution string for one document,
+    using the file name if nothing is entered.
+    """
+    source_attribution_string = input(
+        "What is your source attribution string? (e.g. title, author, publisher, year, etc.)\n (enter to use file name)\n"
+    )
+
+    # use file path by default
+    if source_attribution_string == "":
+        source_attribution_string = os.path.basename(file_path)
+
+    return source_attribution_string
+
+
+def make_jobs(
+    work_list,
+    staging_dir=WORKER_STAGING_DIR_NAME,
+    batch_mode=BATCH_MODE,
+    attribution_manifest_path=ATTRIBUTION_MANIFEST_PATH,
+    ingest_manifest=None,
+    incremental_mode=INCREMENTAL_MODE,
+    config=None,
+    used_pool_counters=(),
+    always_process=(),
+):
+    """
+    Makes one job per document that needs processing.
+
+    Documents already in the ingest manifest keep their bulk_files_folder_N,
+    and (in incremental_mode) are skipped if unchanged.
+    New documents are numbered after the highest folder number in use,
+    in the order they were listed (epub, txt, docx, pdf, pptx).
+
+    Attribution strings come from the attribution manifest if there is one.
+    Documents not in the manifest are asked about, unless in batch_mode,
+    where the worker falls back to document metadata, then the file name.
+
+    Args:
+        work_list (list): WorkItems from scan_target_files()
+        ingest_manifest (dict): from load_ingest_manifest()
+        config (dict): configuration overrides, passed on to the workers
+        used_pool_counters (iterable): folder numbers taken by jobs
+                                       not yet in the manifest (e.g. queued)
+        always_process (set): manifest keys processed even if unchanged
+
+    Returns:
+        tuple: (jobs, skipped) -> job dicts for process_document(),
+               and the WorkItems skipped as unchanged
+    """
+    if ingest_manifest is None:
+        ingest_manifest = {}
+
+    jobs = []
+    skipped = []
+
+    attribution_entries = []
+    if attribution_manifest_path:
+        attribution_entries = load_attribution_manifest(attribution_manifest_path)
+
+    chunking_params = make_chunking_params()
+    new_pool_counter = next_free_pool_counter(
+        ingest_manifest, also_used=used_pool_counters
+    )
+
+    for work_item in work_list:
+        source_attribution_string = lookup_attribution(
+            work_item.path, attribution_entries
+        )
+
+        # a new manifest attribution string also means new output
+        params = dict(chunking_params, attribution=source_attribution_string)
+
+        manifest_key = os.path.normpath(work_item.path)
+        record = ingest_manifest.get(manifest_key)
+
+        process_anyway = manifest_key in always_process
+
+        if (
+            incremental_mode
+            and not process_anyway
+            and is_unchanged(work_item, record, params, source_attribution_string)
+        ):
+            skipped.append(work_item)
+            continue
+
+        if record is not None:
+            pool_counter = record["pool_counter"]
+        else:
+            pool_counter = new_pool_counter
+            new_pool_counter += 1
+
+        if source_attribution_string is None and not batch_mode:
+            print(f"\n\n For {work_item.file_type}: {work_item.path}")
+            source_attribution_string = ask_source_attribution_string(work_item.path)
+
+        job = {
+            "file_path": work_item.path,
+            "file_type": work_item.file_type,
+            "file_size": work_item.size,
+            "mtime_ns": work_item.mtime_ns,
+            "manifest_key": manifest_key,
+            "params": params,
+            "pool_counter": pool_counter,
+            "source_attribution_string": source_attribution_string,
+            "worker_area": os.path.abspath(
+                os.path.join(staging_dir, f"doc_{pool_counter}")
+            ),
+            "config": config,
+        }
+
+        if record is not None:
+            job["previous_outputs"] = record["outputs"]
+            if (
+                incremental_mode
+                and not process_anyway
+                and record.get("params") == params
+                and (
+                    source_attribution_string is None
+                    or record.get("source_attribution_string") == source_attribution_string
+                )
+            ):
+                # the worker skips it if the content hash is unchanged
+                job["previous_sha256"] = record["sha256"]
+
+        jobs.append(job)
+
+    return jobs, skipped
+
+
+def scan_input_paths(paths):
+    """
+    WorkItems for a mix of files and directories
+    (directories are searched recursively with scan_target_files()),
+    grouped by file type in SUPPORTED_FILE_TYPES order.
+    """
+    work_list = []
+    seen_real_paths = set()
+
+    for path in paths:
+        if os.path.isdir(path):
+            found = scan_target_files(path)
+        else:
+            file_type = SUPPORTED_FILE_TYPES.get(os.path.splitext(path)[1].lower())
+            if file_type is None:
+                print(f"Skipping unsupported file: {path}")
+                continue
+            stat_result = os.stat(path)
+            found = [
+                WorkItem(path, file_type, stat_result.st_size, stat_result.st_mtime_ns)
+            ]
+
+        for work_item in found:
+            real_path = os.path.realpath(work_item.path)
+            if real_path not in seen_real_paths:
+                seen_real_paths.add(real_path)
+                work_list.append(work_item)
+
+    file_type_order = list(SUPPORTED_FILE_TYPES.values())
+    work_list.sort(key=lambda work_item: file_type_order.index(work_item.file_type))
+
+    return work_list
+
+
+#############
+# work queue
+#############
+"""
+Distributed mode, for several machines that mount the same storage:
+
+    python smart_chunk_v24.py target_files --queue work.sqlite --queue-mode enqueue
+    python smart_chunk_v24.py --queue work.sqlite --queue-mode work    (on each node)
+    python smart_chunk_v24.py --queue work.sqlite --queue-mode finish
+
+The queue is one SQLite file on the shared volume (no other service).
+Workers lease one document at a time, renew the lease while working on it,
+and mark it done or failed; a lease that is not renewed in time
+(e.g. the node died) expires and the document goes back on the queue.
+
+Run every command from the same (shared) working directory: input paths
+and outputs are relative to it. Leases use each node's clock, so keep
+node clocks in sync. (SQLite's WAL mode does not work on network file
+systems, so the queue uses the default rollback journal.)
+"""
+
+
+def open_work_queue(queue_path):
+    """Opens (and if needed creates) the work queue database."""
+    connection = sqlite3.connect(queue_path, timeout=60, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=DELETE")
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS work_queue (
+            id INTEGER PRIMARY KEY,
+            path TEXT UNIQUE NOT NULL,
+            job TEXT NOT NULL,
+            priority REAL NOT NULL DEFAULT 0,
+            state TEXT NOT NULL DEFAULT 'queued',
+            lease_owner TEXT,
+            lease_expires REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            result TEXT,
+            started REAL,
+            finished REAL,
+            lease_id TEXT
+        )
+        """
+    )
+    # a queue made before leases had ids
+    columns = [row[1] for row in connection.execute("PRAGMA table_info(work_queue)")]
+    if "lease_id" not in columns:
+        connection.execute("ALTER TABLE work_queue ADD COLUMN lease_id TEXT")
+    return connection
+
+
+@contextlib.contextmanager
+def queue_transaction(connection):
+    """BEGIN IMMEDIATE ... COMMIT: one writer at a time, across all nodes."""
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        yield connection
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    connection.execute("COMMIT")
+
+
+def enqueue_jobs(connection, jobs):
+    """
+    Adds jobs to the queue, largest 'estimated_cost' first.
+    A document already queued or leased is left as it is;
+    a done or failed one is queued again with its new job.
+
+    Returns:
+        int: number of jobs queued
+    """
+    queued = 0
+
+    with queue_transaction(connection):
+        for job in jobs:
+            cursor = connection.execute(
+                """
+                INSERT INTO work_queue (path, job, priority) VALUES (?, ?, ?)
+                ON CONFLICT (path) DO UPDATE SET
+                    job = excluded.job,
+                    priority = excluded.priority,
+                    state = 'queued',
+                    lease_owner = NULL,
+                    lease_expires = NULL,
+                    attempts = 0,
+                    result = NULL
+                WHERE state IN ('done', 'failed')
+                """,
+                (job["manifest_key"], json.dumps(job), job.get("estimated_cost", 0)),
+            )
+            queued += cursor.rowcount
+
+    return queued
+
+
+def requeue_expired_leases(connection, now=None, max_attempts=QUEUE_MAX_ATTEMPTS):
+    """
+    Puts documents whose lease has expired (e.g. their worker's machine died)
+    back on the queue, or marks them failed after max_attempts leases.
+    """
+    if now is None:
+        now = time.time()
+
+    expired = connection.execute(
+        """
+        SELECT id, job, attempts, lease_owner FROM work_queue
+        WHERE state = 'leased' AND lease_expires < ?
+        """,
+        (now,),
+    ).fetchall()
+
+    for item_id, job, attempts, lease_owner in expired:
+        error = f"Lease expired (worker {lease_owner}), attempt {attempts} of {max_attempts}"
+        print(f"{error}: {json.loads(job)['file_path']}")
+        connection.execute(
+            """
+            UPDATE work_queue SET
+                state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+                result = ?, finished = ?,
+                lease_owner = NULL, lease_expires = NULL, lease_id = NULL
+            WHERE id = ?
+            """,
+            (max_attempts, json.dumps(dict(json.loads(job), error=error)), now, item_id),
+        )
+
+    return len(expired)
+
+
+def lease_job(connection, worker_id, lease_seconds=QUEUE_LEASE_SECONDS):
+    """
+    Leases the next (largest) queued document to worker_id.
+
+    Returns:
+        tuple or None: (queue item id, job dict, lease id), None if nothing is queued
+                       (the lease id is new for each lease: the worker must
+                       still hold it to renew the lease or finish the document)
+    """
+    now = time.time()
+
+    with queue_transaction(connection):
+        requeue_expired_leases(connection, now, QUEUE_MAX_ATTEMPTS)
+
+        row = connection.execute(
+            """
+            SELECT id, job FROM work_queue WHERE state = 'queued'
+            ORDER BY priority DESC, id LIMIT 1
+            """
+        ).fetchone()
+        if row is None:
+            return None
+
+        item_id, job = row
+        lease_id = os.urandom(16).hex()
+        connection.execute(
+            """
+            UPDATE work_queue SET state = 'leased', lease_owner = ?, lease_expires = ?,
+                lease_id = ?, attempts = attempts + 1, started = ?
+            WHERE id = ?
+            """,
+            (worker_id, now + lease_seconds, lease_id, now, item_id),
+        )
+
+    return item_id, json.loads(job), lease_id
+
 
-            # start the next chunk (with the last_sentence)
-            current_chunk = last_sentence + " " + this_sentence + " "
+def renew_lease(connection, item_id, lease_id, lease_seconds=QUEUE_LEASE_SECONDS):
+    """
+    Heartbeat: extends a lease on a document.
 
-        last_sentence = this_sentence
-        if len(this_sentence) > overlap_size:
-            # just the last part
-            last_sentence = this_sentence[-overlap_size:]
+    Returns:
+        bool: False if the lease was lost (expired, and requeued or taken by another worker)
+    """
+    cursor = connection.execute(
+        """
+        UPDATE work_queue SET lease_expires = ?
+        WHERE id = ? AND lease_id = ? AND state = 'leased'
+        """,
+        (time.time() + lease_seconds, item_id, lease_id),
+    )
+    return cursor.rowcount == 1
 
-    # Handle final chunk
-    if current_chunk:
-        chunked_text.append(current_chunk.strip())
 
-    return chunked_text
+def complete_job(connection, item_id, lease_id, result):
+    """
+    Marks a leased document done, with its result.
 
+    Returns:
+        bool: False if the lease was lost (nothing is changed)
+    """
+    cursor = connection.execute(
+        """
+        UPDATE work_queue SET state = 'done', result = ?, finished = ?,
+            lease_owner = NULL, lease_expires = NULL, lease_id = NULL
+        WHERE id = ? AND lease_id = ? AND state = 'leased'
+        """,
+        (json.dumps(result), time.time(), item_id, lease_id),
+    )
+    return cursor.rowcount == 1
 
-def split_long_sentence(sentence, chunk_size):
-    """Splits a long sentence into chunks, aiming near the  chunk_size."""
-    words = sentence.split()
-    chunks = []
-    current_chunk = ""
 
-    for word in words:
-        if len(current_chunk) + len(word) + 1 <= chunk_size:
-            current_chunk += word + " "
-        else:
-            chunks.append(current_chunk.strip())
-            current_chunk = word + " "
+def fail_job(connection, item_id, lease_id, result, max_attempts=QUEUE_MAX_ATTEMPTS):
+    """
+    Puts a failed document back on the queue,
+    or marks it failed after max_attempts.
 
-    if current_chunk:
-        chunks.append(current_chunk.strip())
+    Returns:
+        bool: False if the lease was lost (nothing is changed)
+    """
+    cursor = connection.execute(
+        """
+        UPDATE work_queue SET
+            state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+            result = ?, finished = ?,
+            lease_owner = NULL, lease_expires = NULL, lease_id = NULL
+        WHERE id = ? AND lease_id = ? AND state = 'leased'
+        """,
+        (max_attempts, json.dumps(result), time.time(), item_id, lease_id),
+    )
+    return cursor.rowcount == 1
 
-    return chunks
 
+def count_queue_states(connection):
+    """state -> number of documents, e.g. {'queued': 3, 'done': 10}"""
+    return dict(
+        connection.execute("SELECT state, COUNT(*) FROM work_queue GROUP BY state")
+    )
 
-def check_for_not(chunk, window_size=25):
-    """Checks if 'not' is isolated near a potential cut.
 
-    Args:
-        chunk (list): A list of sentences forming the chunk.
-        window_size (int): The number of characters to consider on either side.
+def load_queue_results(connection, states=("done", "failed")):
+    """The stored results of finished documents."""
+    placeholders = ", ".join("?" for _ in states)
+    rows = connection.execute(
+        f"SELECT result FROM work_queue WHERE state IN ({placeholders}) ORDER BY id",
+        tuple(states),
+    )
+    return [json.loads(result) for (result,) in rows]
+
+
+def keep_lease(queue_path, item_id, lease_id, lease_seconds, stop_event):
+    """Heartbeat thread: renews a lease until stop_event is set."""
+    connection = open_work_queue(queue_path)
+    try:
+        while not stop_event.wait(lease_seconds / 3):
+            if not renew_lease(connection, item_id, lease_id, lease_seconds):
+                print(f"Lost the lease on queue item {item_id}")
+                break
+    finally:
+        connection.close()
+
+
+def run_queue_worker(queue_path, worker_id=None):
+    """
+    One worker: leases, processes, and finishes documents
+    until nothing is queued or leased by anyone.
 
     Returns:
-        bool: True if 'not' is isolated, False otherwise.
+        int: number of documents this worker processed
     """
+    if worker_id is None:
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    connection = open_work_queue(queue_path)
+    processed = 0
+
+    while True:
+        leased = lease_job(connection, worker_id, QUEUE_LEASE_SECONDS)
+
+        if leased is None:
+            # other workers' documents may still come back (expired leases)
+            if not count_queue_states(connection).get("leased"):
+                break
+            time.sleep(QUEUE_POLL_SECONDS)
+            continue
+
+        item_id, job, lease_id = leased
+        print(f"{worker_id} leased: {job['file_path']}")
+
+        stop_event = threading.Event()
+        heartbeat = threading.Thread(
+            target=keep_lease,
+            args=(queue_path, item_id, lease_id, QUEUE_LEASE_SECONDS, stop_event),
+            daemon=True,
+        )
+        heartbeat.start()
 
-    joined_chunk = " ".join(chunk)
-    not_indices = [m.start() for m in re.finditer(r"\bnot\b", joined_chunk)]
+        try:
+            if ISOLATE_DOCUMENTS:
+                # in a watched worker process of its own (timeout, memory limit)
+                result = run_document_pool([job], max_workers=1)[0]
+            else:
+                result = process_document(job)
+        except Exception:
+            print(traceback.format_exc())
+            result = dict(job, error=traceback.format_exc())
+        finally:
+            stop_event.set()
+            heartbeat.join()
+
+        # finished (and its bulk folder merged) only if the lease is still
+        # this worker's: else the document was requeued or went to another worker
+        with queue_transaction(connection):
+            if result.get("error"):
+                # a document that timed out would only time out again
+                max_attempts = 1 if result.get("timed_out_seconds") else QUEUE_MAX_ATTEMPTS
+                lease_held = fail_job(connection, item_id, lease_id, result, max_attempts)
+            else:
+                lease_held = complete_job(connection, item_id, lease_id, result)
+                if lease_held:
+                    merge_worker_output(result)
+        remove_path(job["worker_area"])
 
-    for index in not_indices:
-        start = max(0, index - window_size)
-        end = min(len(joined_chunk), index + window_size)
-        if not re.search(r"\w", joined_chunk[start:end]):  # Check for surrounding words
-            return True
+        if not lease_held:
+            print(f"{worker_id} lost the lease, its output is dropped: {job['file_path']}")
+        elif not result.get("error"):
+            processed += 1
 
-    return False
+    connection.close()
+    return processed
 
 
-def make_chunk_list(text, chunk_size, this_epub_output_dir_path, overlap_size=150):
-    split_sentences_list = split_sentences_and_punctuation(text)
-    chunk_list = chunk_text(split_sentences_list, chunk_size, overlap_size)
+def queue_pool_counters(connection):
+    """bulk_files_folder_N numbers of every document in the queue."""
+    return [
+        json.loads(job)["pool_counter"]
+        for (job,) in connection.execute("SELECT job FROM work_queue")
+    ]
 
-    for i in chunk_list:
-        if not i:
-            print_and_log(
-                "error None in chunk_list: make_chunk_list()", this_epub_output_dir_path
-            )
 
-    print_and_log(f"len chunk list -> {len(chunk_list)}", this_epub_output_dir_path)
+def record_queue_results(connection, ingest_manifest):
+    """Records the queue's done documents in the ingest manifest."""
+    for result in load_queue_results(connection, states=("done",)):
+        update_ingest_manifest(ingest_manifest, result, INGEST_MANIFEST_PATH)
 
-    return chunk_list
 
+def enqueue_ingest(queue_path, paths=None, config=None):
+    """
+    Coordinator: discovers documents and queues the ones that need processing
+    (documents already done in the queue count as processed).
 
-#######
-# pool
-#######
+    Returns:
+        int: number of documents queued
+    """
+    apply_config(config)
 
+    connection = open_work_queue(queue_path)
 
-# def pool_txt_files(src_dir, dest_dir):
-#     """
-#     Recursively copies all .txt files from the source directory to the destination directory.
-#     """
-#     counter = 0
+    # what the queue has finished so far, so it is not queued again
+    ingest_manifest = load_ingest_manifest(INGEST_MANIFEST_PATH)
+    record_queue_results(connection, ingest_manifest)
+    save_ingest_manifest(ingest_manifest, INGEST_MANIFEST_PATH)
 
-#     if not os.path.exists(dest_dir):
-#         try:
-#             os.makedirs(dest_dir)
-#         except OSError as e:
-#             if e.errno != errno.EEXIST:
-#                 raise
+    jobs, skipped, ingest_manifest, aliases, _ = prepare_jobs(
+        paths, config, used_pool_counters=queue_pool_counters(connection)
+    )
+    # (outputs of documents found to be duplicates are gone)
+    save_ingest_manifest(ingest_manifest, INGEST_MANIFEST_PATH)
 
-#     for root, dirs, files in os.walk(src_dir):
-#         for file in files:
-#             if file.endswith('.txt'):
-#                 src_file = os.path.join(root, file)
-#                 dest_file = os.path.join(dest_dir, os.path.relpath(src_file, src_dir))
-#                 os.makedirs(os.path.dirname(dest_file), exist_ok=True)
-#                 shutil.copy2(src_file, dest_file)
-#                 # print(f"Copied {src_file} to {dest_file}")
+    queued = enqueue_jobs(connection, jobs)
+    print(f"Queued {queued} document(s) in {queue_path}: {count_queue_states(connection)}")
 
-#                 counter += 1
+    connection.close()
+    return queued
 
 
-#     print(f"\nOK! I just copied {counter} files, to {dest_dir}.")
+def work_queue_ingest(queue_path, config=None):
+    """
+    Worker node: runs MAX_WORKERS queue workers here until the queue is empty.
+
+    Returns:
+        int: number of documents processed on this node
+    """
+    apply_config(config)
 
+    max_workers = MAX_WORKERS or os.cpu_count()
+    if max_workers == 1:
+        return run_queue_worker(queue_path)
 
-def add_source_attribution(source_attribution_string, directory="txt_pool"):
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [
+            pool.submit(run_queue_worker, queue_path) for _ in range(max_workers)
+        ]
+        return sum(future.result() for future in futures)
+
+
+def finish_queue_ingest(queue_path, config=None):
     """
-    This function adds a source attribution string to the end of each file in a directory.
-    The attribution string is extracted from the filename.
+    Coordinator, after the workers: records the queue's results
+    in the ingest manifest, then builds the merged txt_pool and the run report.
 
-    Parameters:
-    directory (str): The path to the directory containing the files.
+    Returns:
+        dict: see ingest()
     """
+    apply_config(config)
 
-    # Loop through each file in the directory
-    for filename in os.listdir(directory):
+    connection = open_work_queue(queue_path)
+    states = count_queue_states(connection)
+    if states.get("queued") or states.get("leased"):
+        print(f"Warning: the queue is not finished: {states}")
 
-        # Check if the item is a file (not a directory)
-        if os.path.isfile(os.path.join(directory, filename)):
+    results = load_queue_results(connection)
+    ingest_manifest = load_ingest_manifest(INGEST_MANIFEST_PATH)
+    record_queue_results(connection, ingest_manifest)
 
-            # Extract the number from the filename
-            match = re.search(r"_(\d+)\.txt$", filename)
-            if match:
-                number = match.group(1)
+    # the run is timed from the first document started to the last finished
+    started, finished = connection.execute(
+        "SELECT MIN(started), MAX(finished) FROM work_queue WHERE state IN ('done', 'failed')"
+    ).fetchone()
+    connection.close()
 
-                # Create the attribution string to add to the file
-                file_source_attribution_string = (
-                    f"\n(Source: {source_attribution_string} Excerpt number {number})\n"
-                )
+    documents_seconds = (finished - started) if started and finished else 0.0
+    run_stage_seconds = {"documents": documents_seconds}
 
-                # Open the file for reading and writing
-                with open(os.path.join(directory, filename), "a") as file:
+    shutil.rmtree(WORKER_STAGING_DIR_NAME, ignore_errors=True)
 
-                    # print(file_source_attribution_string)
+    aliases = {
+        result["file_path"]: result["aliases"]
+        for result in results
+        if result.get("aliases")
+    }
 
-                    # Add the attribution string to the end of the file
-                    file.write(file_source_attribution_string)
+    return finish_ingest(
+        results,
+        [],
+        ingest_manifest,
+        run_stage_seconds,
+        time.monotonic() - documents_seconds,
+        aliases,
+        # the coordinator may have removed duplicates' outputs when queueing
+        rebuild_pool=True,
+    )
 
 
-def back_append_stub_files(directory):
+##################
+# output manifest
+##################
+"""
+OUTPUT_MANIFEST_PATH lists every output file of every ingested document,
+one JSON line each, so loaders can stream it instead of listing
+directories of hundreds of thousands of chunk files:
+
+    {"path": "bulk_files_folder_3/chap2_0.txt", "kind": "pool_chunk",
+     "source": "target_files/book.epub", "source_sha256": "...",
+     "bytes": 1873, "sha256": "...", "chunks": 1,
+     "chunk_ids": ["chap2_0", "chap2_0"]}
+
+chunk_ids is the first and last chunk in the file (None if it holds none).
+Files in a results folder's individual_* and chunk_text_files folders are
+listed through their zip archives; txt_pool holds copies of the
+pool_chunk files under the same names.
+
+Files are hashed by the worker that wrote them. The manifest is rewritten
+each run: documents not processed this run keep their earlier lines.
+"""
+
+# file name in a results folder -> artifact kind
+RESULTS_FILE_KINDS = {
+    "output.jsonl": "sections_jsonl",
+    "whole.txt": "text",
+    "chunks_jsonl_all.jsonl": "chunks_jsonl",
+    "chapter_index.json": "chapter_index",
+    "jsons_zip_archive.zip": "sections_json_zip",
+    "txt_zip_archive.zip": "sections_txt_zip",
+    "chunks_zip_archive.zip": "chunks_zip",
+    "log.txt": "log",
+}
+
+
+def chunk_id_from_file_name(file_name):
+    """The chunk id (source_name) a chunk .txt file is named after."""
+    return os.path.splitext(os.path.basename(file_name))[0]
+
+
+def describe_artifact(file_path, kind, record_path=None):
     """
-    This function processes all the .txt files in a given directory.
-    If a file is smaller than 300 bytes, its content is appended to the previous file,
-    and the current file is deleted. The process is then restarted from the beginning of the list.
+    One output manifest line (without the source fields).
 
-    :param directory: The directory containing the .txt files
+    Args:
+        file_path (str): the file to describe
+        kind (str): e.g. 'pool_chunk', 'chunks_jsonl' (see RESULTS_FILE_KINDS)
+        record_path (str): the path to record, if the file will be moved there
+                           (e.g. out of a worker area), default file_path
+
+    Returns:
+        dict: path, kind, bytes, sha256, chunks, chunk_ids
     """
-    try:
-        print(f"starting back_append_stub_files(directory)... directory -> {directory}")
+    chunks = 0
+    chunk_ids = None
+
+    if kind == "chunks_jsonl":
+        # one pass: hash and count lines, keeping the first and last
+        sha256 = hashlib.sha256()
+        first_line = last_line = None
+        with open(file_path, "rb") as f:
+            for line in f:
+                sha256.update(line)
+                if line.strip():
+                    chunks += 1
+                    first_line = first_line or line
+                    last_line = line
+        digest = sha256.hexdigest()
+        if chunks:
+            chunk_ids = [
+                json.loads(first_line)["source_name"],
+                json.loads(last_line)["source_name"],
+            ]
+    else:
+        digest = hash_file(file_path, HASH_BLOCK_SIZE)
+        if kind in ("chunk", "pool_chunk"):
+            chunks = 1
+            chunk_ids = [chunk_id_from_file_name(file_path)] * 2
+        elif kind == "chunks_zip":
+            with zipfile.ZipFile(file_path, "r") as archive:
+                names = [name for name in archive.namelist() if not name.endswith("/")]
+            chunks = len(names)
+            if names:
+                chunk_ids = [
+                    chunk_id_from_file_name(names[0]),
+                    chunk_id_from_file_name(names[-1]),
+                ]
+
+    return {
+        "path": record_path or file_path,
+        "kind": kind,
+        "bytes": os.path.getsize(file_path),
+        "sha256": digest,
+        "chunks": chunks,
+        "chunk_ids": chunk_ids,
+    }
 
-        counter = 0
 
-        # Get a list of all the .txt files in the directory and sort them
-        files = sorted([f for f in os.listdir(directory) if f.endswith(".txt")])
+def list_document_artifacts(result):
+    """
+    Worker: describes every output file of one finished document:
+    its results folder (or staged pptx slides folder) and its staged
+    bulk_files_folder_N, recorded under their final names.
 
-        i = 1
-        while i < len(files):
-            # Get the full path of the current file
-            current_file = os.path.join(directory, files[i])
+    Returns:
+        list: output manifest lines
+    """
+    artifacts = []
+    outputs = result["outputs"]
+
+    results_dir = outputs.get("results_dir")
+    if results_dir:
+        for file_name in sorted(os.listdir(results_dir)):
+            file_path = os.path.join(results_dir, file_name)
+            if os.path.isfile(file_path):
+                kind = RESULTS_FILE_KINDS.get(file_name, "other")
+                artifacts.append(describe_artifact(file_path, kind))
+
+    slides_dir = outputs.get("slides_dir")
+    if slides_dir:
+        staged_slides_dir = result["staged_slides_dir"]
+        for file_name in sorted(os.listdir(staged_slides_dir)):
+            artifacts.append(
+                describe_artifact(
+                    os.path.join(staged_slides_dir, file_name),
+                    "chunk",
+                    os.path.join(slides_dir, file_name),
+                )
+            )
 
-            # Get the size of the current file
-            size = os.path.getsize(current_file)
+    staged_bulk_dir = result["staged_bulk_dir"]
+    for file_name in sorted(os.listdir(staged_bulk_dir)):
+        artifacts.append(
+            describe_artifact(
+                os.path.join(staged_bulk_dir, file_name),
+                "pool_chunk",
+                os.path.join(outputs["bulk_files_dir"], file_name),
+            )
+        )
 
-            # If the size of the current file is smaller than 300 bytes
-            if size < MINIMUM_BYTES_SIZE:
-                # Read the content of the current file
-                with open(current_file, "r") as f:
-                    content = f.read()
+    for artifact in artifacts:
+        artifact["source"] = result["manifest_key"]
+        artifact["source_sha256"] = result["sha256"]
 
-                # Get the full path of the previous file
-                previous_file = os.path.join(directory, files[i - 1])
+    return artifacts
 
-                # Append the content of the current file to the previous file
-                with open(previous_file, "a") as f:
-                    f.write("\n" + content)
 
-                # Delete the current file
-                os.remove(current_file)
+def save_output_manifest(
+    results, ingest_manifest, moved_files=None, manifest_path=OUTPUT_MANIFEST_PATH
+):
+    """
+    Rewrites the output manifest (streamed, via a temporary file and an
+    atomic rename): the earlier lines of documents not processed this run
+    and still in the ingest manifest with the same content,
+    then this run's documents (failed documents have no lines).
 
-                # Remove the current file from the list
-                files.pop(i)
+    Args:
+        results (list): this run's result dicts, with 'artifacts'
+        ingest_manifest (dict): the updated ingest manifest
+        moved_files (dict): {old path: new path} from the bulk folder auto-split
+        manifest_path (str): the output manifest file
 
-                counter += 1
-            else:
-                # Move on to the next file
-                i += 1
+    Returns:
+        int: the number of lines written
+    """
+    if moved_files is None:
+        moved_files = {}
 
-        print(f"Back appended {counter} files.")
+    # processed or failed this run: their old outputs were replaced or removed
+    new_sources = {
+        result.get("manifest_key") for result in results if not result.get("skipped")
+    }
 
-    except Exception as e:
-        raise e
+    def current(artifact):
+        artifact["path"] = moved_files.get(artifact["path"], artifact["path"])
+        return json.dumps(artifact) + "\n"
+
+    count = 0
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as out:
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    artifact = json.loads(line)
+                    record = ingest_manifest.get(artifact["source"])
+                    if (
+                        artifact["source"] in new_sources
+                        or record is None
+                        or record.get("sha256") != artifact["source_sha256"]
+                    ):
+                        continue
+                    out.write(current(artifact))
+                    count += 1
+
+        for result in results:
+            for artifact in result.get("artifacts") or []:
+                out.write(current(artifact))
+                count += 1
+
+    os.replace(temp_path, manifest_path)
+    return count
+
+
+#############
+# run report
+#############
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile, e.g. fraction=0.95 (None for no values)."""
+    if not values:
+        return None
 
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
 
-def pool_txt_files(src_dir, dest_dir):
+
+def summarize_timings(results):
     """
-    Recursively copies all .txt files
-    from the source directory to the destination directory.
-    original files are not deleted.
+    Totals, per-document latency percentiles, and seconds per stage
+    for a group of processed documents. 'other' is the time no stage
+    accounted for (e.g. making directories, logging).
     """
-    counter = 0
+    seconds = [result["timings"]["seconds"] for result in results]
+
+    stage_seconds = collections.defaultdict(float)
+    for result in results:
+        for stage, stage_time in result["timings"]["stages"].items():
+            stage_seconds[stage] += stage_time
+    stage_seconds["other"] = max(0.0, sum(seconds) - sum(stage_seconds.values()))
+
+    return {
+        "documents": len(results),
+        "input_bytes": sum(result["file_size"] for result in results),
+        "chunks": sum(result.get("number_of_chunks", 0) for result in results),
+        "document_seconds": round(sum(seconds), 6),
+        "latency_seconds": {
+            "p50": percentile(seconds, 0.50),
+            "p95": percentile(seconds, 0.95),
+            "p99": percentile(seconds, 0.99),
+            "max": max(seconds, default=None),
+        },
+        "stage_seconds": {
+            stage: round(stage_time, 6)
+            for stage, stage_time in sorted(
+                stage_seconds.items(), key=lambda item: item[1], reverse=True
+            )
+        },
+    }
 
-    # Create the destination directory if it doesn't exist
-    if not os.path.exists(dest_dir):
-        os.makedirs(dest_dir)
 
-    # Traverse the source directory recursively
-    for root, _, files in os.walk(src_dir):
-        for file in files:
-            if file.endswith(".txt"):
-                src_file = os.path.join(root, file)
-                dest_file = os.path.join(dest_dir, file)
-                shutil.copy2(src_file, dest_file)
-                counter += 1
+def add_throughput(summary, seconds):
+    """docs/sec, MB/sec, and chunks/sec over the given seconds."""
+    for name, amount in [
+        ("docs_per_sec", summary["documents"]),
+        ("mb_per_sec", summary["input_bytes"] / 1_000_000),
+        ("chunks_per_sec", summary["chunks"]),
+    ]:
+        summary[name] = round(amount / seconds, 3) if seconds else None
 
-    print(f"\nOK! I just copied {counter} files to {dest_dir}.")
+    return summary
 
 
-def rename_directory(current_name, new_name):
+def make_performance_report(
+    results, skipped, run_stage_seconds, wall_seconds, aliases=None
+):
     """
-    # Usage
-    rename_directory('old_name', 'new_name')
+    The machine-readable report of a run.
+
+    Run-level throughput is over the run's wall-clock time (all workers);
+    per-format throughput is over that format's summed document time
+    (i.e. what one worker does).
+
+    Args:
+        results (list): result dicts from process_document()
+        skipped (list): documents skipped as unchanged
+        run_stage_seconds (dict): driver stages, e.g. 'discovery'
+        wall_seconds (float): the whole run
+        aliases (dict): duplicate inputs, {kept path: [duplicate paths]}
+
+    Returns:
+        dict
     """
-    try:
-        os.rename(current_name, new_name)
-        print(f"Directory renamed from {current_name} to {new_name}")
-    except FileNotFoundError:
-        print(f"Directory {current_name} not found")
-    except Exception as e:
-        print(f"An error occurred: {e}")
+    processed = [
+        result
+        for result in results
+        if result.get("timings") and not result.get("skipped")
+    ]
 
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "wall_seconds": round(wall_seconds, 6),
+        "workers": MAX_WORKERS or os.cpu_count(),
+        "skipped": len(skipped) + sum(1 for r in results if r.get("skipped")),
+        "failed": sum(1 for r in results if r.get("error")),
+        "run_stage_seconds": {
+            stage: round(stage_time, 6) for stage, stage_time in run_stage_seconds.items()
+        },
+        "duplicate_inputs": aliases or {},
+        "boilerplate": summarize_boilerplate(processed),
+    }
+    report.update(add_throughput(summarize_timings(processed), wall_seconds))
 
-def make_merged_directories_pool():
-    # Create the 'txt_pool' directory if it doesn't exist
-    if not os.path.exists("txt_pool"):
-        os.makedirs("txt_pool")
+    by_format = collections.defaultdict(list)
+    for result in processed:
+        by_format[result["file_type"]].append(result)
 
-    # Iterate over all directories that start with 'bulk_files_folder_'
-    for dir_name in os.listdir("."):
-        if dir_name.startswith("bulk_files_folder_"):
-            print(f"Now merging dir_name {dir_name}...")
-            # Iterate over all files in the directory
-            for file_name in os.listdir(dir_name):
-                # print(f"Now merging {file_name}...")
-                # Move the file to the 'txt_pool' directory
-                shutil.copy(os.path.join(dir_name, file_name), "txt_pool")
+    report["by_format"] = {}
+    for file_type, format_results in by_format.items():
+        summary = summarize_timings(format_results)
+        report["by_format"][file_type] = add_throughput(
+            summary, summary["document_seconds"]
+        )
+
+    report["by_document"] = [
+        {
+            "path": result["file_path"],
+            "file_type": result["file_type"],
+            "input_bytes": result["file_size"],
+            "estimated_cost": result.get("estimated_cost"),
+            "chunks": result.get("number_of_chunks", 0),
+            "boilerplate_html_bytes": sum(
+                section["html_bytes"] for section in result.get("boilerplate", [])
+            ),
+            "seconds": result["timings"]["seconds"],
+            "stage_seconds": result["timings"]["stages"],
+        }
+        for result in processed
+    ]
 
+    return report
 
-######
-# Run
-######
-"""
-1. add your epub files into the same current working directory as this script
-2. run script
-3. find the files in new folders per epub
-"""
 
+def save_performance_report(report, report_path=PERFORMANCE_REPORT_PATH):
+    """Writes the report as JSON (via a temporary file and an atomic rename)."""
+    temp_path = report_path + ".tmp"
+
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
 
-################################
-# Set source_attribution_string
-################################
+    os.replace(temp_path, report_path)
 
 
-# Get the current working directory.
-cwd = os.getcwd()
+def update_ingest_manifest(ingest_manifest, result, manifest_path=INGEST_MANIFEST_PATH):
+    """
+    Records one document's result in the ingest manifest
+    (in memory, and appended to the manifest file). Failures are not recorded.
+    """
+    if result.get("skipped"):
+        # same content, only the mtime is new
+        record = dict(
+            ingest_manifest[result["manifest_key"]],
+            size=result["file_size"],
+            mtime_ns=result["mtime_ns"],
+        )
+        if "section_keys" in result:
+            record["section_keys"] = result["section_keys"]
+    elif not result.get("error"):
+        record = make_manifest_record(result)
+    else:
+        return
 
-# # Search for all x-type files in the current working directory.
-# epub_files = glob.glob(os.path.join(cwd, "*.epub"))
+    ingest_manifest[record["path"]] = record
+    append_to_ingest_manifest(record, manifest_path)
 
-base_dir = "target_files"
-file_extension = ".epub"
 
-epub_files = get_files_from_subdirs(base_dir, file_extension)
+def prepare_jobs(paths, config=None, run_stage_seconds=None, used_pool_counters=()):
+    """
+    Discovery, the ingest manifest, attribution, and cost estimates:
+    everything before documents are processed.
+
+    Returns:
+        tuple: (jobs, skipped WorkItems, ingest manifest,
+                {kept path: [duplicate input paths]},
+                paths whose earlier outputs were removed (now duplicates))
+    """
+    if run_stage_seconds is None:
+        run_stage_seconds = {}
 
-# Print the list of EPUB files.
-print("epub files")
-print(epub_files)
+    if paths is None:
+        paths = ["target_files"]
 
+    # one recursive pass over each directory for every file type
+    stage_started = time.monotonic()
+    work_list = scan_input_paths(paths)
+    run_stage_seconds["discovery"] = time.monotonic() - stage_started
 
-####################
-# run for each epub
-####################
-for this_epub_file in epub_files:
-    print(f"\n\n For epub: {this_epub_file}")
+    for file_type in SUPPORTED_FILE_TYPES.values():
+        print(f"{file_type} files")
+        print([item.path for item in work_list if item.file_type == file_type])
 
-    source_attribution_string = ""
+    ingest_manifest = load_ingest_manifest(INGEST_MANIFEST_PATH)
 
-    source_attribution_string = input(
-        "What is your source attribution string? (e.g. title, author, publisher, year, etc.)\n (enter to use file name)\n"
+    if not RETRY_QUARANTINED:
+        work_list, quarantined = drop_quarantined(
+            work_list, load_quarantine(QUARANTINE_PATH)
+        )
+        if quarantined:
+            print(
+                f"{len(quarantined)} quarantined document(s) skipped "
+                f"(see {QUARANTINE_PATH}, or --retry-quarantined):"
+            )
+            for work_item in quarantined:
+                print(f"  {work_item.path}")
+
+    # each unique document once
+    aliases = {}
+    known_hashes = {}
+    removed = []
+    if DEDUPLICATE_INPUTS:
+        stage_started = time.monotonic()
+        work_list, aliases, known_hashes = find_duplicate_inputs(
+            work_list, ingest_manifest
+        )
+        removed = forget_duplicate_outputs(aliases, ingest_manifest)
+        run_stage_seconds["duplicates"] = time.monotonic() - stage_started
+
+        for kept_path, duplicate_paths in aliases.items():
+            print(f"Duplicate input(s) of {kept_path} (processed once): {duplicate_paths}")
+
+    # processed even if unchanged
+    profiled = select_profiled_documents(work_list)
+    if profiled:
+        print(f"Profiling {len(profiled)} document(s): {sorted(profiled)}")
+
+    ################################
+    # Set source_attribution_string
+    ################################
+    jobs, skipped = make_jobs(
+        work_list,
+        staging_dir=WORKER_STAGING_DIR_NAME,
+        batch_mode=BATCH_MODE,
+        attribution_manifest_path=ATTRIBUTION_MANIFEST_PATH,
+        ingest_manifest=ingest_manifest,
+        incremental_mode=INCREMENTAL_MODE,
+        config=config,
+        used_pool_counters=used_pool_counters,
+        always_process=profiled,
     )
+    print(f"\n{len(skipped)} unchanged document(s) skipped, {len(jobs)} to process.")
 
-    # use file path by default
-    if source_attribution_string == "":
-        file_name = os.path.basename(this_epub_file)
-        source_attribution_string = file_name
+    for job in jobs:
+        if job["manifest_key"] in profiled:
+            job["profile"] = True
+        if job["file_path"] in aliases:
+            job["aliases"] = aliases[job["file_path"]]
+        if job["file_path"] in known_hashes:
+            # no need for the worker to hash it again
+            job["known_sha256"] = known_hashes[job["file_path"]]
 
-    # set target epub to first epub doc listed as being in the cwd
-    epub_file_path = this_epub_file
+    if BOILERPLATE_MODE:
+        stage_started = time.monotonic()
+        find_repeated_sections(jobs, ingest_manifest, BOILERPLATE_REPEAT_BOOKS)
+        run_stage_seconds["boilerplate"] = time.monotonic() - stage_started
 
-    # make directory for this book
-    this_epub_output_dir_path = epub_file_path[:-5] + "_epub_folder"
-    print(this_epub_output_dir_path)
+    stage_started = time.monotonic()
+    add_job_cost_estimates(jobs)
+    run_stage_seconds["scheduling"] = time.monotonic() - stage_started
 
-    # Add another parent directory
-    parent_dir = RESULTS_DIR_NAME
-    this_epub_output_dir_path = os.path.join(parent_dir, this_epub_output_dir_path)
+    return jobs, skipped, ingest_manifest, aliases, removed
 
-    # Set the absolute path
-    this_epub_output_dir_path = os.path.abspath(this_epub_output_dir_path)
 
-    # Create a directory for individual txt files
-    if not os.path.exists(this_epub_output_dir_path):
-        os.makedirs(this_epub_output_dir_path)
-
-    # json
-    # output_jsonl_path = 'output.jsonl'
-    output_jsonl_path = os.path.join(this_epub_output_dir_path, "output.jsonl")
-    output_json_dir = os.path.join(
-        this_epub_output_dir_path, "individual_jsons"
-    )  # Directory to store individual JSON files
-    output_json_zip_dir = os.path.join(
-        this_epub_output_dir_path, "jsons_zip_archive"
-    )  # Directory to store individual JSON files
-
-    # txt
-    output_whole_txt_path = os.path.join(this_epub_output_dir_path, "whole.txt")
-    output_txt_dir = os.path.join(
-        this_epub_output_dir_path, "individual_txt"
-    )  # Directory to store individual txt files
-    output_txt_zip_dir = os.path.join(
-        this_epub_output_dir_path, "txt_zip_archive"
-    )  # Directory to store individual JSON files
-
-    # chunks
-    output_chunks_jsonl_path = os.path.join(
-        this_epub_output_dir_path, "chunks_jsonl_all.jsonl"
-    )  # Directory to store individual txt files
-    output_chunks_dir = os.path.join(
-        this_epub_output_dir_path, "chunk_text_files"
-    )  # Directory to store individual txt files
-    output_chunks_zip_dir = os.path.join(
-        this_epub_output_dir_path, "chunks_zip_archive"
-    )  # Directory to store individual JSON files
-
-    extract_text_from_epub(
-        epub_file_path,
-        this_epub_output_dir_path,
-        output_jsonl_path,
-        output_json_dir,
-        output_whole_txt_path,
-        output_txt_dir,
-        output_chunks_jsonl_path,
-        output_chunks_dir,
-        max_chunk_size=MAX_CHUNK_SIZE,
+def needs_pool_rebuild(results, pool_dir="txt_pool"):
+    """
+    True if txt_pool has to be rebuilt from every bulk folder, not added to:
+    it is missing, or a document with earlier outputs was processed again
+    (its old chunks were removed, even if it then failed).
+    """
+    if not os.path.isdir(pool_dir):
+        return True
+
+    return any(
+        result.get("previous_outputs") and not result.get("skipped")
+        for result in results
     )
 
-    # Call the zip function
-    """
-    zip_folder(path_to_directory_to_zip, output_destination_zip_file_path)
+
+def finish_ingest(
+    results,
+    skipped,
+    ingest_manifest,
+    run_stage_seconds,
+    run_started,
+    aliases=None,
+    rebuild_pool=None,
+):
     """
-    zip_folder(output_json_dir, output_json_zip_dir)
-    zip_folder(output_txt_dir, output_txt_zip_dir)
-    zip_folder(output_chunks_dir, output_chunks_zip_dir)
+    Everything after documents are processed: the manifest,
+    the merged txt_pool (and auto-split), and the run report.
 
-    ######################################
-    # Bundle of Additional/Optional Items
-    ######################################
+    Args:
+        run_started (float): time.monotonic() at the start of the run
+        aliases (dict): duplicate inputs, {kept path: [duplicate paths]}
+        rebuild_pool (bool): rebuild txt_pool from every bulk folder;
+                             False -> only add the new documents' chunks;
+                             None -> rebuild only if needs_pool_rebuild()
 
-    # Removes files smaller than N bytes from X directory
-    remove_small_files("txt_pool", REMOVE_BELOW_SIZE)
+    Returns:
+        dict: see ingest()
+    """
+    save_ingest_manifest(ingest_manifest, INGEST_MANIFEST_PATH)
+
+    failed = [result for result in results if result.get("error")]
+    if failed:
+        print(f"\n{len(failed)} document(s) failed:")
+        for result in failed:
+            print(f"  {result['file_path']}")
+
+    newly_quarantined = []
+    if QUARANTINE_PATH:
+        quarantine = load_quarantine(QUARANTINE_PATH)
+        newly_quarantined = update_quarantine(quarantine, results)
+        if quarantine or os.path.exists(QUARANTINE_PATH):
+            save_quarantine(quarantine, QUARANTINE_PATH)
+        if newly_quarantined:
+            print(f"(quarantined, with their tracebacks, in {QUARANTINE_PATH})")
+
+    ##############
+    # merged pool
+    ##############
+    # new documents' chunks are added; rebuilt from the bulk folders only
+    # when documents were replaced or removed, so their old chunks don't linger
+    stage_started = time.monotonic()
+    if rebuild_pool is None:
+        rebuild_pool = needs_pool_rebuild(results)
+
+    new_bulk_dirs = None
+    if rebuild_pool:
+        remove_path("txt_pool")
+        make_merged_directories_pool()
+    else:
+        os.makedirs("txt_pool", exist_ok=True)
+        new_bulk_dirs = []
+        for result in results:
+            bulk_dir = result.get("outputs", {}).get("bulk_files_dir")
+            if result.get("error") or not bulk_dir or not os.path.isdir(bulk_dir):
+                continue
+            new_bulk_dirs.append(bulk_dir)
+            for file_name in os.listdir(bulk_dir):
+                shutil.copy(os.path.join(bulk_dir, file_name), "txt_pool")
+
+    # note: this introduces vast room for issues
+    moved_files = {}
+    if ATTEMPT_AUTO_SPLIT is True:
+        moved_files = create_new_split_bulk_files_folders(
+            prefix=BULK_FILE_FOLDER_PREFIX,
+            max_number=BULK_FILES_FOLDER_MAX_SIZE,
+            dir_names=new_bulk_dirs,
+        )
+        if moved_files:
+            record_split_folders(ingest_manifest, moved_files)
+            save_ingest_manifest(ingest_manifest, INGEST_MANIFEST_PATH)
 
-    # Call the function with the directory containing the .txt files
-    back_append_stub_files("txt_pool")
+    run_stage_seconds["pool_merge"] = time.monotonic() - stage_started
 
-    add_source_attribution(source_attribution_string)
+    if OUTPUT_MANIFEST_PATH:
+        artifact_count = save_output_manifest(
+            results, ingest_manifest, moved_files, OUTPUT_MANIFEST_PATH
+        )
+        print(f"{artifact_count} output file(s) listed in {OUTPUT_MANIFEST_PATH}")
 
     # count all file chunks created
     count_files("txt_pool")
 
-    # rename_directory('old_name', 'new_name')
-    rename_directory("txt_pool", f"bulk_files_folder_{pool_counter}")
+    ############
+    # report
+    ############
+    report = make_performance_report(
+        results, skipped, run_stage_seconds, time.monotonic() - run_started, aliases
+    )
+    report["quarantined"] = newly_quarantined
+    if PERFORMANCE_REPORT_PATH:
+        save_performance_report(report, PERFORMANCE_REPORT_PATH)
+
+    if TRACE_PATH:
+        # this process's spans, then each document's (from its worker)
+        trace = take_trace_events()
+        for result in results:
+            trace.extend(result.pop("trace_events", []))
+        save_trace(trace, TRACE_PATH)
+        print(f"Trace saved to {TRACE_PATH} (open in chrome://tracing or ui.perfetto.dev)")
 
-    pool_counter += 1
+    print(
+        f"Smart-Chunk automated document processing: Elapsed time: {report['wall_seconds']} seconds"
+    )
+    print(
+        f"{report['documents']} document(s): {report['docs_per_sec']} docs/sec, "
+        f"{report['mb_per_sec']} MB/sec, {report['chunks_per_sec']} chunks/sec"
+    )
+    for stage, stage_time in report["stage_seconds"].items():
+        print(f"  {stage}: {stage_time} seconds")
+
+    boilerplate = report["boilerplate"]
+    if boilerplate["sections"]:
+        print(
+            f"{boilerplate['sections']} boilerplate section(s), {boilerplate['html_bytes']} html bytes "
+            f"({boilerplate['mode']}: {boilerplate['bytes_saved']} html bytes saved)"
+        )
 
+    return {
+        "results": results,
+        "skipped": [work_item.path for work_item in skipped],
+        "failed": [result["file_path"] for result in failed],
+        "report": report,
+    }
 
-######
-# Run txt
-######
-"""
-1. add your .txt files into the same current working directory as this script
-2. run script
-3. find the files in new folders per epub
-"""
 
+def ingest(paths=None, config=None):
+    """
+    Runs the whole pipeline on a set of documents:
+    find, (re)process in parallel, merge into bulk_files_folder_N and txt_pool.
 
-# Get the current working directory.
-cwd = os.getcwd()
+    Outputs are written relative to the current working directory,
+    as when running this file as a script.
 
-# # Search for all x-type files in the current working directory.
-# txt_files = glob.glob(os.path.join(cwd, "*.txt"))
+    Args:
+        paths (list): files and/or directories to ingest,
+                      default ['target_files']
+        config (dict): configuration overrides by name (see CONFIG_NAMES),
+                       e.g. {"MAX_CHUNK_SIZE": 1200, "BATCH_MODE": True}
 
-base_dir = "target_files"
-file_extension = ".txt"
+    Returns:
+        dict: 'results' -> one result dict per processed document,
+              'skipped' -> paths skipped as unchanged,
+              'failed'  -> paths that failed
+              'report'  -> the run report (also saved to PERFORMANCE_REPORT_PATH)
+    """
+    apply_config(config)
 
-# recoursive file search with THE GLOB
-txt_files = get_files_from_subdirs(base_dir, file_extension)
+    # timing: per-stage and per-document, see the run report
+    run_started = time.monotonic()
+    run_stage_seconds = {}
 
-# Print the list of txt files.
-print("text files")
-print(txt_files)
+    jobs, skipped, ingest_manifest, aliases, removed = prepare_jobs(
+        paths, config, run_stage_seconds
+    )
 
+    # txt_pool is only rebuilt if documents were removed or replaced
+    return process_jobs(
+        jobs,
+        skipped,
+        ingest_manifest,
+        aliases,
+        run_stage_seconds,
+        run_started,
+        rebuild_pool=True if removed else None,
+    )
 
-####################
-# run for each txt
-####################
-for this_txt_file in txt_files:
-    print(f"\n\n For txt: {this_txt_file}")
 
-    source_attribution_string = ""
+def process_jobs(
+    jobs,
+    skipped,
+    ingest_manifest,
+    aliases,
+    run_stage_seconds,
+    run_started,
+    rebuild_pool=None,
+):
+    """
+    Processes the jobs from prepare_jobs(), then finish_ingest()
+    (rebuild_pool: see finish_ingest()).
 
-    source_attribution_string = input(
-        "What is your source attribution string? (e.g. title, author, publisher, year, etc.)\n (enter to use file name)\n"
+    Returns:
+        dict: see ingest()
+    """
+    ########################
+    # run for each document
+    ########################
+    def on_result(result):
+        merge_worker_output(result)
+        update_ingest_manifest(ingest_manifest, result, INGEST_MANIFEST_PATH)
+
+    stage_started = time.monotonic()
+    with trace_span("documents", "run", count=len(jobs)):
+        results = run_document_pool(jobs, max_workers=MAX_WORKERS, on_result=on_result)
+    run_stage_seconds["documents"] = time.monotonic() - stage_started
+
+    shutil.rmtree(WORKER_STAGING_DIR_NAME, ignore_errors=True)
+
+    return finish_ingest(
+        results,
+        skipped,
+        ingest_manifest,
+        run_stage_seconds,
+        run_started,
+        aliases,
+        rebuild_pool,
     )
 
-    # use file path by default
-    if source_attribution_string == "":
-        file_name = os.path.basename(this_txt_file)
-        source_attribution_string = file_name
 
-    # set target txt to first txt doc listed as being in the cwd
-    text_file_path = this_txt_file
+#################
+# plan (dry run)
+#################
+"""
+plan_ingest() / --plan: what an ingest of these paths would take,
+without writing anything. Each document is opened just enough to count
+its units (epub spine files, pdf pages, docx paragraphs, pptx slides)
+and estimate its characters; chunks, output files, disk use, and runtime
+follow from the chunk settings and the throughput of the last run report.
+"""
 
-    # make directory for this book
-    this_txt_output_dir_path = text_file_path[:-5] + "_txt_folder"
-    print(this_txt_output_dir_path)
+DOCX_PARAGRAPH_REGEX = re.compile(rb"<w:p[ >/]")
+DOCX_TEXT_REGEX = re.compile(rb"<w:t(?: [^>]*)?>([^<]*)</w:t>")
+PPTX_SLIDE_REGEX = re.compile(r"ppt/slides/slide\d+\.xml")
+PPTX_TEXT_REGEX = re.compile(rb"<a:t(?: [^>]*)?>([^<]*)</a:t>")
+DISK_BLOCK_SIZE = 4096
+
+
+def sample_evenly(count, samples):
+    """Up to `samples` indexes spread evenly over range(count)."""
+    return sorted({index * count // samples for index in range(min(count, samples))})
+
+
+def count_epub_units(epub_file_path):
+    """Spine files; characters from the text/html ratio of a few sampled ones."""
+    BeautifulSoup = import_backend("bs4").BeautifulSoup
+
+    with EpubArchive(epub_file_path) as epub:
+        spine_paths = [
+            member for _, member in epub.spine_members() if member is not None
+        ]
+        spine_bytes = sum(epub.member_size(member) for member in spine_paths)
+
+        sample_bytes = 0
+        sample_chars = 0
+        for index in sample_evenly(len(spine_paths), PLAN_SAMPLE_UNITS):
+            html_content = epub.read(spine_paths[index])
+            sample_bytes += len(html_content)
+            soup = BeautifulSoup(html_content.decode("utf-8"), "html.parser")
+            sample_chars += len(soup.get_text())
+
+    return {
+        "units": len(spine_paths),
+        "unit_name": "spine files",
+        "sections": len(spine_paths),
+        "characters": round(spine_bytes * sample_chars / sample_bytes)
+        if sample_bytes
+        else 0,
+    }
 
-    # Add another parent directory
-    parent_dir = RESULTS_DIR_NAME
-    this_txt_output_dir_path = os.path.join(parent_dir, this_txt_output_dir_path)
 
-    # Set the absolute path
-    this_txt_output_dir_path = os.path.abspath(this_txt_output_dir_path)
+def count_pdf_units(pdf_path):
+    """Pages; characters from the text of a few sampled pages (PyMuPDF)."""
+    fitz = import_backend("fitz")
 
-    # Create a directory for individual txt files
-    if not os.path.exists(this_txt_output_dir_path):
-        os.makedirs(this_txt_output_dir_path)
-
-    # json
-    # output_jsonl_path = 'output.jsonl'
-    output_jsonl_path = os.path.join(this_txt_output_dir_path, "output.jsonl")
-    output_json_dir = os.path.join(
-        this_txt_output_dir_path, "individual_jsons"
-    )  # Directory to store individual JSON files
-    output_json_zip_dir = os.path.join(
-        this_txt_output_dir_path, "jsons_zip_archive"
-    )  # Directory to store individual JSON files
-
-    # txt
-    output_whole_txt_path = os.path.join(this_txt_output_dir_path, "whole.txt")
-    output_txt_dir = os.path.join(
-        this_txt_output_dir_path, "individual_txt"
-    )  # Directory to store individual txt files
-    output_txt_zip_dir = os.path.join(
-        this_txt_output_dir_path, "txt_zip_archive"
-    )  # Directory to store individual JSON files
-
-    # chunks
-    output_chunks_jsonl_path = os.path.join(
-        this_txt_output_dir_path, "chunks_jsonl_all.jsonl"
-    )  # Directory to store individual txt files
-    output_chunks_dir = os.path.join(
-        this_txt_output_dir_path, "chunk_text_files"
-    )  # Directory to store individual txt files
-    output_chunks_zip_dir = os.path.join(
-        this_txt_output_dir_path, "chunks_zip_archive"
-    )  # Directory to store individual JSON files
-
-    extract_text_from_txt(
-        text_file_path,
-        this_txt_output_dir_path,
-        output_jsonl_path,
-        output_json_dir,
-        output_whole_txt_path,
-        output_txt_dir,
-        output_chunks_jsonl_path,
-        output_chunks_dir,
-        max_chunk_size=MAX_CHUNK_SIZE,
+    with fitz.open(pdf_path) as pdf_file:
+        pages = pdf_file.page_count
+        sampled = sample_evenly(pages, PLAN_SAMPLE_UNITS)
+        sample_chars = sum(len(pdf_file[page_number].get_text()) for page_number in sampled)
+
+    return {
+        "units": pages,
+        "unit_name": "pages",
+        "sections": 1,
+        "characters": round(sample_chars / len(sampled) * pages) if sampled else 0,
+    }
+
+
+def count_docx_units(docx_file_path):
+    """Paragraphs and characters, from word/document.xml (without python-docx)."""
+    with zipfile.ZipFile(docx_file_path, "r") as docx:
+        document_xml = docx.read("word/document.xml")
+
+    paragraphs = len(DOCX_PARAGRAPH_REGEX.findall(document_xml))
+    text_chars = sum(
+        len(text.decode("utf-8")) for text in DOCX_TEXT_REGEX.findall(document_xml)
     )
 
-    # Call the zip function
-    """
-    zip_folder(path_to_directory_to_zip, output_destination_zip_file_path)
-    """
-    zip_folder(output_json_dir, output_json_zip_dir)
-    zip_folder(output_txt_dir, output_txt_zip_dir)
-    zip_folder(output_chunks_dir, output_chunks_zip_dir)
+    return {
+        "units": paragraphs,
+        "unit_name": "paragraphs",
+        "sections": 1,
+        # one line per paragraph
+        "characters": text_chars + paragraphs,
+    }
 
-    ######################################
-    # Bundle of Additional/Optional Items
-    ######################################
 
-    # Removes files smaller than N bytes from X directory
-    remove_small_files("txt_pool", REMOVE_BELOW_SIZE)
+def count_pptx_units(pptx_file_path):
+    """Slides and characters, from the slide xml files (without python-pptx)."""
+    with zipfile.ZipFile(pptx_file_path, "r") as pptx:
+        slide_names = [
+            name for name in pptx.namelist() if PPTX_SLIDE_REGEX.fullmatch(name)
+        ]
+        text_chars = sum(
+            len(text.decode("utf-8"))
+            for name in slide_names
+            for text in PPTX_TEXT_REGEX.findall(pptx.read(name))
+        )
 
-    # Call the function with the directory containing the .txt files
-    back_append_stub_files("txt_pool")
+    return {
+        "units": len(slide_names),
+        "unit_name": "slides",
+        "sections": len(slide_names),
+        "characters": text_chars,
+    }
 
-    add_source_attribution(source_attribution_string)
 
-    # count all file chunks created
-    count_files("txt_pool")
+# file type -> unit counter, for plan_ingest()
+# (other types: the file size as characters, one section)
+PLAN_UNIT_COUNTERS = {
+    "epub": count_epub_units,
+    "docx": count_docx_units,
+    "pdf": count_pdf_units,
+    "pptx": count_pptx_units,
+}
 
-    # rename_directory('old_name', 'new_name')
-    rename_directory("txt_pool", f"bulk_files_folder_{pool_counter}")
 
-    pool_counter += 1
+def count_document_units(file_path, file_type, file_size):
+    """
+    Opens just enough of a document to count its units and estimate its text.
+
+    Returns:
+        dict: 'units' (None if not counted), 'unit_name',
+              'sections' (individual .txt/.json files), 'characters'
+    """
+    counter = PLAN_UNIT_COUNTERS.get(file_type)
 
+    if counter is not None:
+        try:
+            return counter(file_path)
+        except Exception as e:
+            print(f"Plan estimate from file size only ({file_path}): {e}")
 
-######
-# Run docx
-######
-"""
-1. add your .txt files into the same current working directory as this script
-2. run script
-3. find the files in new folders per epub
-"""
+    return {"units": None, "unit_name": None, "sections": 1, "characters": file_size}
 
 
-# Get the current working directory.
-cwd = os.getcwd()
+def round_up_to_blocks(size, files=1):
+    """Bytes on disk for `files` files of `size` bytes each."""
+    return files * max(1, math.ceil(size / DISK_BLOCK_SIZE)) * DISK_BLOCK_SIZE
 
-# # Search for all x-type files in the current working directory.
-# docx_files = glob.glob(os.path.join(cwd, "*.docx"))
 
-base_dir = "target_files"
-file_extension = ".docx"
+def estimate_document_outputs(file_type, counts):
+    """
+    Chunks, output files, and bytes for one document, from count_document_units()
+    and the current chunk settings. Each chunk file is written three times
+    (the results folder or pptx_chunks, bulk_files_folder_N, the merged txt_pool).
 
-# recoursive file search with THE GLOB
-docx_files = get_files_from_subdirs(base_dir, file_extension)
+    Returns:
+        dict: 'chunks', 'output_files', 'output_bytes' (content),
+              'disk_bytes' (rounded up to whole DISK_BLOCK_SIZE blocks per file)
+    """
+    characters = counts["characters"]
 
-# Print the list of docx files.
-print("docx_files")
-print(docx_files)
+    if file_type == "pptx":
+        # a chunk per slide
+        chunks = counts["units"] or 0
+        chunk_chars = characters
+        document_files = []
+    else:
+        sections = counts["sections"]
+        new_chars_per_chunk = max(
+            1, (MAX_CHUNK_SIZE - CHUNK_OVERLAP_SIZE) * PLAN_CHUNK_FILL
+        )
+        # each section ends with a part-full chunk
+        chunks = math.ceil(characters / new_chars_per_chunk + sections / 2)
+        # plus the last sentence of the chunk before
+        chunk_chars = 1.1 * characters
+
+        text_zip_bytes = 0.4 * (2.1 * characters + chunk_chars)
+        document_files = [
+            # output.jsonl, whole.txt, chunks_jsonl_all.jsonl
+            (1.1 * characters, 1),
+            (characters, 1),
+            (1.1 * chunk_chars, 1),
+            # individual_jsons/, individual_txt/
+            (1.1 * characters / max(1, sections), sections),
+            (characters / max(1, sections), sections),
+            # the three zip archives
+            (text_zip_bytes / 3, 3),
+        ]
+
+    chunk_files = [(chunk_chars / max(1, chunks), 3 * chunks)]
+
+    return {
+        "chunks": chunks,
+        "output_files": sum(files for _, files in document_files + chunk_files),
+        "output_bytes": round(
+            sum(size * files for size, files in document_files + chunk_files)
+        ),
+        "disk_bytes": sum(
+            round_up_to_blocks(size, files) for size, files in document_files + chunk_files
+        ),
+    }
 
 
-####################
-# run for each docx
-####################
-for this_docx_file in docx_files:
-    print(f"\n\n For docx: {this_docx_file}")
+def load_plan_throughput(report_path=PERFORMANCE_REPORT_PATH):
+    """
+    MB of input per second for each format (one worker):
+    PLAN_DEFAULT_MB_PER_SEC, updated from the last run report if there is one.
 
-    source_attribution_string = ""
+    Returns:
+        tuple: ({file type: MB/sec}, where the numbers came from)
+    """
+    throughput = dict(PLAN_DEFAULT_MB_PER_SEC)
 
-    source_attribution_string = input(
-        "What is your source attribution string? (e.g. title, author, publisher, year, etc.)\n (enter to use file name)\n"
-    )
+    if not report_path or not os.path.exists(report_path):
+        return throughput, "defaults"
 
-    # use file path by default
-    if source_attribution_string == "":
-        file_name = os.path.basename(this_docx_file)
-        source_attribution_string = file_name
+    try:
+        with open(report_path, "r", encoding="utf-8") as f:
+            report = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Could not read {report_path}, using default throughput: {e}")
+        return throughput, "defaults"
 
-    # set target txt to first txt doc listed as being in the cwd
-    text_file_path = this_docx_file
+    for file_type, summary in report.get("by_format", {}).items():
+        if summary.get("mb_per_sec"):
+            throughput[file_type] = summary["mb_per_sec"]
 
-    # make directory for this book
-    this_txt_output_dir_path = text_file_path[:-5] + "_docx_folder"
-    print(this_txt_output_dir_path)
+    return throughput, report_path
 
-    # Add another parent directory
-    parent_dir = RESULTS_DIR_NAME
-    this_txt_output_dir_path = os.path.join(parent_dir, this_txt_output_dir_path)
 
-    # Set the absolute path
-    this_txt_output_dir_path = os.path.abspath(this_txt_output_dir_path)
+def estimate_wall_seconds(document_seconds, workers):
+    """The run's length with documents started largest first on `workers` workers."""
+    worker_seconds = [0.0] * max(1, workers)
 
-    # Create a directory for individual txt files
-    if not os.path.exists(this_txt_output_dir_path):
-        os.makedirs(this_txt_output_dir_path)
-
-    # json
-    # output_jsonl_path = 'output.jsonl'
-    output_jsonl_path = os.path.join(this_txt_output_dir_path, "output.jsonl")
-    output_json_dir = os.path.join(
-        this_txt_output_dir_path, "individual_jsons"
-    )  # Directory to store individual JSON files
-    output_json_zip_dir = os.path.join(
-        this_txt_output_dir_path, "jsons_zip_archive"
-    )  # Directory to store individual JSON files
-
-    # txt
-    output_whole_txt_path = os.path.join(this_txt_output_dir_path, "whole.txt")
-    output_txt_dir = os.path.join(
-        this_txt_output_dir_path, "individual_txt"
-    )  # Directory to store individual txt files
-    output_txt_zip_dir = os.path.join(
-        this_txt_output_dir_path, "txt_zip_archive"
-    )  # Directory to store individual JSON files
-
-    # chunks
-    output_chunks_jsonl_path = os.path.join(
-        this_txt_output_dir_path, "chunks_jsonl_all.jsonl"
-    )  # Directory to store individual txt files
-    output_chunks_dir = os.path.join(
-        this_txt_output_dir_path, "chunk_text_files"
-    )  # Directory to store individual txt files
-    output_chunks_zip_dir = os.path.join(
-        this_txt_output_dir_path, "chunks_zip_archive"
-    )  # Directory to store individual JSON files
-
-    extract_text_from_docx(
-        text_file_path,
-        this_txt_output_dir_path,
-        output_jsonl_path,
-        output_json_dir,
-        output_whole_txt_path,
-        output_txt_dir,
-        output_chunks_jsonl_path,
-        output_chunks_dir,
-        max_chunk_size=MAX_CHUNK_SIZE,
-    )
+    for seconds in sorted(document_seconds, reverse=True):
+        least_busy = worker_seconds.index(min(worker_seconds))
+        worker_seconds[least_busy] += seconds
+
+    return max(worker_seconds)
 
-    # Call the zip function
+
+def plan_ingest(paths=None, config=None):
     """
-    zip_folder(path_to_directory_to_zip, output_destination_zip_file_path)
+    A dry run of ingest(): the documents that would be processed,
+    with estimated characters, chunks, output files, disk use, and runtime.
+    Reads the inputs, ingest manifest, and last run report; writes nothing,
+    and never asks for attribution.
+
+    Args:
+        paths (list): files and/or directories, default ['target_files']
+        config (dict): configuration overrides by name (see CONFIG_NAMES)
+
+    Returns:
+        dict: 'documents' (one estimate per document to process),
+              'skipped' (paths unchanged since the last run),
+              'quarantined' (paths skipped as quarantined),
+              'duplicate_inputs', 'totals', 'by_format',
+              'wall_seconds' ({workers: estimated seconds}), 'throughput_source'
     """
-    zip_folder(output_json_dir, output_json_zip_dir)
-    zip_folder(output_txt_dir, output_txt_zip_dir)
-    zip_folder(output_chunks_dir, output_chunks_zip_dir)
+    apply_config(config)
 
-    ######################################
-    # Bundle of Additional/Optional Items
-    ######################################
+    if paths is None:
+        paths = ["target_files"]
 
-    # Removes files smaller than N bytes from X directory
-    remove_small_files("txt_pool", REMOVE_BELOW_SIZE)
+    work_list = scan_input_paths(paths)
+    ingest_manifest = load_ingest_manifest(INGEST_MANIFEST_PATH)
 
-    # Call the function with the directory containing the .txt files
-    back_append_stub_files("txt_pool")
+    quarantined = []
+    if not RETRY_QUARANTINED:
+        work_list, quarantined = drop_quarantined(
+            work_list, load_quarantine(QUARANTINE_PATH)
+        )
 
-    add_source_attribution(source_attribution_string)
+    aliases = {}
+    if DEDUPLICATE_INPUTS:
+        work_list, aliases, _ = find_duplicate_inputs(
+            work_list, ingest_manifest
+        )
 
-    # count all file chunks created
-    count_files("txt_pool")
+    jobs, skipped = make_jobs(
+        work_list,
+        batch_mode=True,
+        attribution_manifest_path=ATTRIBUTION_MANIFEST_PATH,
+        ingest_manifest=ingest_manifest,
+        incremental_mode=INCREMENTAL_MODE,
+    )
 
-    # rename_directory('old_name', 'new_name')
-    rename_directory("txt_pool", f"bulk_files_folder_{pool_counter}")
+    throughput, throughput_source = load_plan_throughput(PERFORMANCE_REPORT_PATH)
+
+    documents = []
+    for job in jobs:
+        file_type = job["file_type"]
+        counts = count_document_units(job["file_path"], file_type, job["file_size"])
+
+        document = {
+            "path": job["file_path"],
+            "file_type": file_type,
+            "input_bytes": job["file_size"],
+        }
+        document.update(counts)
+        document.update(estimate_document_outputs(file_type, counts))
+        document["seconds"] = round(
+            job["file_size"] / 1_000_000 / throughput.get(file_type, 1.0), 3
+        )
+        documents.append(document)
+
+    def add_up(group):
+        totals = {"documents": len(group)}
+        for name in [
+            "input_bytes",
+            "characters",
+            "chunks",
+            "output_files",
+            "output_bytes",
+            "disk_bytes",
+            "seconds",
+        ]:
+            totals[name] = round(sum(document[name] for document in group), 3)
+        return totals
+
+    by_format = collections.defaultdict(list)
+    for document in documents:
+        by_format[document["file_type"]].append(document)
+
+    configured_workers = MAX_WORKERS or os.cpu_count()
+    worker_counts = sorted({1, 2, 4, 8, 16, 32, configured_workers})
+    document_seconds = [document["seconds"] for document in documents]
+
+    return {
+        "documents": documents,
+        "skipped": [work_item.path for work_item in skipped],
+        "quarantined": [work_item.path for work_item in quarantined],
+        "duplicate_inputs": aliases,
+        "totals": add_up(documents),
+        "by_format": {
+            file_type: dict(
+                add_up(format_documents),
+                units=sum(document["units"] or 0 for document in format_documents),
+                unit_name=format_documents[0]["unit_name"],
+            )
+            for file_type, format_documents in by_format.items()
+        },
+        "workers": configured_workers,
+        "wall_seconds": {
+            workers: round(estimate_wall_seconds(document_seconds, workers), 1)
+            for workers in worker_counts
+        },
+        "throughput_source": throughput_source,
+    }
 
-    pool_counter += 1
 
-######
-# Run pdf
-######
-"""
-1. add your .txt files into the same current working directory as this script
-2. run script
-3. find the files in new folders per epub
-"""
+def print_plan(plan):
+    """Prints plan_ingest() for a person deciding disks and workers."""
+    totals = plan["totals"]
+    duplicates = sum(len(paths) for paths in plan["duplicate_inputs"].values())
 
-overlap_size = 300
+    print(
+        f"\nPlan: {totals['documents']} document(s) to process, "
+        f"{len(plan['skipped'])} unchanged, {len(plan['quarantined'])} quarantined, "
+        f"{duplicates} duplicate input(s)"
+    )
+    for file_type, format_totals in plan["by_format"].items():
+        units = ""
+        if format_totals["unit_name"]:
+            units = f"{format_totals['units']:,} {format_totals['unit_name']}, "
+        print(
+            f"  {file_type}: {format_totals['documents']} document(s), "
+            f"{format_totals['input_bytes'] / 1_000_000:.1f} MB, {units}"
+            f"~{format_totals['characters']:,.0f} characters, "
+            f"~{format_totals['chunks']:,} chunks"
+        )
 
-# Get the current working directory.
-cwd = os.getcwd()
+    print(
+        f"Estimated outputs: ~{totals['chunks']:,} chunks, "
+        f"~{totals['output_files']:,} files, "
+        f"~{totals['disk_bytes'] / 1_000_000:,.1f} MB on disk "
+        f"({totals['output_bytes'] / 1_000_000:,.1f} MB of content)"
+    )
 
-# Search for all x-type files in the current working directory.
-pdf_files = glob.glob(os.path.join(cwd, "*.pdf")) + glob.glob(
-    os.path.join(cwd, "*.PDF")
-)
+    print(f"Estimated runtime (throughput from {plan['throughput_source']}):")
+    for workers, seconds in plan["wall_seconds"].items():
+        configured = "  <- configured" if workers == plan["workers"] else ""
+        print(f"  {workers} worker(s): {seconds:,.1f} seconds{configured}")
 
-base_dir = "target_files"
-file_extension = ".pdf"
-# recoursive file search with THE GLOB
-pdf_files1 = get_files_from_subdirs(base_dir, file_extension)
 
+#################
+# html benchmark
+#################
+"""
+--benchmark-html: for each epub, every spine document's text from each
+HTML_TEXT_ENGINES engine is compared with BeautifulSoup's (the golden
+text), and each engine is timed on the whole book. Any difference is
+listed, and the exit status is 1, so this doubles as the check that the
+fast engine still matches on your own corpus.
+"""
 
-base_dir = "target_files"
-file_extension = ".PDF"
-# recoursive file search with THE GLOB
-pdf_files2 = get_files_from_subdirs(base_dir, file_extension)
 
-# both alt versions of suffix
-pdf_files = pdf_files1 + pdf_files2
+def read_epub_spine_html(epub_file_path):
+    """
+    The (name, html text) of each spine document of an epub, in reading order
+    (resolved as extract_epub_sections() does).
+    """
+    with EpubArchive(epub_file_path) as epub:
+        return [
+            (member, epub.read_text(member))
+            for _, member in epub.spine_members()
+            if member is not None
+        ]
 
-set_pdf_files = set(pdf_files)
-pdf_files = list(set_pdf_files)
 
-# Print the list of txt files.
-print("pdf_files")
-print(pdf_files)
+def first_difference(text_a, text_b):
+    """The first offset where two strings differ (None if equal)."""
+    if text_a == text_b:
+        return None
+    for offset, (char_a, char_b) in enumerate(zip(text_a, text_b)):
+        if char_a != char_b:
+            return offset
+    return min(len(text_a), len(text_b))
 
 
-####################
-# run for each pdf
-####################
-for this_pdf_file in pdf_files:
-    print(f"\n\n For pdf_files: {this_pdf_file}")
+def benchmark_html_text_engines(paths, engines=None, repeat=3):
+    """
+    Compares and times html text engines on the epubs under paths.
 
-    source_attribution_string = ""
+    Args:
+        paths (list): files and/or directories
+        engines (list): engine names, the first is the reference
+                        (default: 'bs4', then the others)
+        repeat (int): each engine's time is the best of this many runs
 
-    source_attribution_string = input(
-        "What is your source attribution string? (e.g. title, author, publisher, year, etc.)\n (enter to use file name)\n"
-    )
+    Returns:
+        list: per book, {"path", "documents", "html_bytes",
+              "seconds": {engine: seconds}, "speedup": {engine: x},
+              "mismatches": [(engine, document name, first differing offset)]}
+    """
+    if engines is None:
+        engines = ["bs4"] + [name for name in HTML_TEXT_ENGINES if name != "bs4"]
+
+    books = []
+    for work_item in scan_input_paths(paths):
+        if work_item.file_type != "epub":
+            continue
+
+        documents = read_epub_spine_html(work_item.path)
+        book = {
+            "path": work_item.path,
+            "documents": len(documents),
+            "html_bytes": sum(
+                len(html_content.encode("utf-8")) for _, html_content in documents
+            ),
+            "seconds": {},
+            "speedup": {},
+            "mismatches": [],
+        }
+
+        reference = HTML_TEXT_ENGINES[engines[0]]
+        golden = [reference(html_content) for _, html_content in documents]
+        for engine in engines[1:]:
+            engine_function = HTML_TEXT_ENGINES[engine]
+            for (name, html_content), golden_text in zip(documents, golden):
+                offset = first_difference(golden_text, engine_function(html_content))
+                if offset is not None:
+                    book["mismatches"].append((engine, name, offset))
+
+        for engine in engines:
+            engine_function = HTML_TEXT_ENGINES[engine]
+            best = None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                for _, html_content in documents:
+                    engine_function(html_content)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            book["seconds"][engine] = round(best, 6)
+
+        for engine in engines[1:]:
+            if book["seconds"][engine]:
+                book["speedup"][engine] = round(
+                    book["seconds"][engines[0]] / book["seconds"][engine], 2
+                )
 
-    # use file path by default
-    if source_attribution_string == "":
-        file_name = os.path.basename(this_pdf_file)
-        source_attribution_string = file_name
+        books.append(book)
 
-    # set target txt to first txt doc listed as being in the cwd
-    text_file_path = this_pdf_file
+    return books
 
-    # make directory for this book
-    this_txt_output_dir_path = text_file_path[:-5] + "_pdf_folder"
-    print(this_txt_output_dir_path)
 
-    # Add another parent directory
-    parent_dir = RESULTS_DIR_NAME
-    this_txt_output_dir_path = os.path.join(parent_dir, this_txt_output_dir_path)
+def print_html_benchmark(books):
+    """Prints benchmark_html_text_engines() results, one line per book and engine."""
+    for book in books:
+        print(
+            f"{book['path']}: {book['documents']} spine documents, "
+            f"{book['html_bytes'] / 1024 / 1024:.2f} MB html"
+        )
+        for engine, seconds in book["seconds"].items():
+            speedup = book["speedup"].get(engine)
+            speedup = f"  ({speedup}x)" if speedup else ""
+            print(f"  {engine}: {seconds:.4f} seconds{speedup}")
+        for engine, name, offset in book["mismatches"]:
+            print(f"  MISMATCH {engine}: {name} differs at character {offset}")
 
-    # Set the absolute path
-    this_txt_output_dir_path = os.path.abspath(this_txt_output_dir_path)
+    mismatches = sum(len(book["mismatches"]) for book in books)
+    print(f"\n{len(books)} epub(s), {mismatches} mismatching document(s)")
 
-    # Create a directory for individual txt files
-    if not os.path.exists(this_txt_output_dir_path):
-        os.makedirs(this_txt_output_dir_path)
-
-    # json
-    # output_jsonl_path = 'output.jsonl'
-    output_jsonl_path = os.path.join(this_txt_output_dir_path, "output.jsonl")
-    output_json_dir = os.path.join(
-        this_txt_output_dir_path, "individual_jsons"
-    )  # Directory to store individual JSON files
-    output_json_zip_dir = os.path.join(
-        this_txt_output_dir_path, "jsons_zip_archive"
-    )  # Directory to store individual JSON files
-
-    # txt
-    output_whole_txt_path = os.path.join(this_txt_output_dir_path, "whole.txt")
-    output_txt_dir = os.path.join(
-        this_txt_output_dir_path, "individual_txt"
-    )  # Directory to store individual txt files
-    output_txt_zip_dir = os.path.join(
-        this_txt_output_dir_path, "txt_zip_archive"
-    )  # Directory to store individual JSON files
-
-    # chunks
-    output_chunks_jsonl_path = os.path.join(
-        this_txt_output_dir_path, "chunks_jsonl_all.jsonl"
-    )  # Directory to store individual txt files
-    output_chunks_dir = os.path.join(
-        this_txt_output_dir_path, "chunk_text_files"
-    )  # Directory to store individual txt files
-    output_chunks_zip_dir = os.path.join(
-        this_txt_output_dir_path, "chunks_zip_archive"
-    )  # Directory to store individual JSON files
-
-    extract_text_from_pdf(
-        text_file_path,
-        this_txt_output_dir_path,
-        output_jsonl_path,
-        output_json_dir,
-        output_whole_txt_path,
-        output_txt_dir,
-        output_chunks_jsonl_path,
-        output_chunks_dir,
-        overlap_size,
-        max_chunk_size=MAX_CHUNK_SIZE,
-    )
 
-    # Call the zip function
-    """
-    zip_folder(path_to_directory_to_zip, output_destination_zip_file_path)
-    """
-    zip_folder(output_json_dir, output_json_zip_dir)
-    zip_folder(output_txt_dir, output_txt_zip_dir)
-    zip_folder(output_chunks_dir, output_chunks_zip_dir)
+###############
+# watch (daemon)
+###############
+"""
+--watch: a long-running ingest that picks up documents as they arrive.
+
+Each poll only stats the directories already seen and lists the ones whose
+mtime changed (a file was added, removed, or renamed in them), so an idle
+poll of a large tree costs one stat per directory. A file is ingested once
+it has stopped changing for WATCH_SETTLE_SECONDS, so partly copied files
+wait; temporary copy names (e.g. book.epub.part) are not supported types
+and are ignored until renamed.
+
+Settled files go through the usual ingest (manifest, dedupe, quarantine,
+worker pool); their chunks are added to txt_pool directly, and txt_pool is
+only rebuilt when a changed document replaced old chunks.
+
+Files changed in place do not change their directory's mtime:
+every WATCH_FULL_SCAN_SECONDS all directories are listed again.
+Deleted documents keep their chunks.
+"""
 
-    ######################################
-    # Bundle of Additional/Optional Items
-    ######################################
 
-    # Removes files smaller than N bytes from X directory
-    remove_small_files("txt_pool", REMOVE_BELOW_SIZE)
+def poll_watched_directories(paths, watch_state, full_scan=False):
+    """
+    One poll: lists the directories that are new or whose mtime changed
+    (every directory, with full_scan) and finds files that are new
+    or differ (size, mtime) from when they were last seen.
 
-    # Call the function with the directory containing the .txt files
-    back_append_stub_files("txt_pool")
+    Args:
+        paths (list): the watched directories
+        watch_state (dict): {"dirs": {dir path: (mtime_ns, real path)},
+                             "files": {file path: (size, mtime_ns)}},
+                            updated in place
+        full_scan (bool): list every directory
 
-    add_source_attribution(source_attribution_string)
+    Returns:
+        list: WorkItems of new or changed files
+    """
+    to_list = []
+    if full_scan:
+        watch_state["dirs"].clear()
 
-    # count all file chunks created
-    count_files("txt_pool")
+    for path in paths:
+        if path not in watch_state["dirs"] and os.path.isdir(path):
+            to_list.append(path)
 
-    # rename_directory('old_name', 'new_name')
-    rename_directory("txt_pool", f"bulk_files_folder_{pool_counter}")
+    for dir_path, (mtime_ns, _) in list(watch_state["dirs"].items()):
+        try:
+            if os.stat(dir_path).st_mtime_ns != mtime_ns:
+                to_list.append(dir_path)
+        except OSError:
+            del watch_state["dirs"][dir_path]
 
-    pool_counter += 1
+    watched_real_dirs = {real_dir for _, real_dir in watch_state["dirs"].values()}
+    found = []
+    while to_list:
+        dir_path = to_list.pop()
 
+        try:
+            # stat before listing, so a change during listing shows next poll
+            mtime_ns = os.stat(dir_path).st_mtime_ns
+            with os.scandir(dir_path) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name)
+        except OSError as e:
+            print(f"Skipping unreadable directory {dir_path}: {e}")
+            continue
+
+        real_dir = os.path.realpath(dir_path)
+        watch_state["dirs"][dir_path] = (mtime_ns, real_dir)
+        watched_real_dirs.add(real_dir)
+
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    # new sub-directory (symlink loops are listed once)
+                    if (
+                        entry.path not in watch_state["dirs"]
+                        and os.path.realpath(entry.path) not in watched_real_dirs
+                    ):
+                        to_list.append(entry.path)
+                    continue
+
+                file_type = SUPPORTED_FILE_TYPES.get(
+                    os.path.splitext(entry.name)[1].lower()
+                )
+                if file_type is None or not entry.is_file():
+                    continue
 
-#######
-# pptx
-#######
-# directory_to_process = "files_to_process"
-# pptx_files = glob.glob(f"{directory_to_process}/*.pptx")
+                stat_result = entry.stat()
+                seen = (stat_result.st_size, stat_result.st_mtime_ns)
+                if watch_state["files"].get(entry.path) != seen:
+                    watch_state["files"][entry.path] = seen
+                    found.append(WorkItem(entry.path, file_type, *seen))
 
-pptx_base_dir = "target_files"
-file_extension = ".pptx"
-# recoursive file search with THE GLOB
-pptx_files = get_files_from_subdirs(pptx_base_dir, file_extension)
+            except OSError as e:
+                print(f"Skipping unreadable file {entry.path}: {e}")
 
-print("pptx_files")
-print(pptx_files)
+    return found
 
-# Process each .pptx file
-for file_path in pptx_files:
-    print(f"\n\n For pptx_files: {file_path}")
 
-    source_attribution_string = ""
+def take_settled_files(pending, watch_state, settle_seconds=None):
+    """
+    The pending files that have stopped changing: the same size and mtime
+    as when last seen, and not modified for settle_seconds.
+    Settled (and vanished) files leave pending.
 
-    source_attribution_string = input(
-        "What is your source attribution string? (e.g. title, author, publisher, year, etc.)\n (enter to use file name)\n"
-    )
+    Args:
+        pending (dict): {file path: WorkItem as last seen}, updated in place
+        watch_state (dict): see poll_watched_directories()
+        settle_seconds (float): default WATCH_SETTLE_SECONDS
 
-    # use file path by default
-    if source_attribution_string == "":
-        file_name = os.path.basename(file_path)
-        source_attribution_string = file_name
+    Returns:
+        list: settled WorkItems
+    """
+    if settle_seconds is None:
+        settle_seconds = WATCH_SETTLE_SECONDS
 
-    extract_pptx_text_to_file(file_path)
+    settled = []
+    now = time.time()
+    for path, work_item in list(pending.items()):
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            # deleted, or renamed (e.g. a temporary copy name)
+            del pending[path]
+            watch_state["files"].pop(path, None)
+            continue
+
+        seen = (stat_result.st_size, stat_result.st_mtime_ns)
+        if seen != (work_item.size, work_item.mtime_ns):
+            # still being written
+            pending[path] = WorkItem(path, work_item.file_type, *seen)
+            watch_state["files"][path] = seen
+        elif now - stat_result.st_mtime_ns / 1e9 >= settle_seconds:
+            settled.append(work_item)
+            del pending[path]
+
+    return settled
+
+
+def check_updated_pool_chunks(updated_paths, ingest_manifest, pool_dir="txt_pool"):
+    """
+    After documents were replaced: checks that txt_pool holds exactly
+    what their folders (bulk_files_folder_N and its split folders) were
+    freshly given, and no chunk that no document's folders hold
+    (e.g. left over from an old version).
 
-    # move pptx files
-    pool_txt_files("pptx_chunks", "txt_pool")
+    Args:
+        updated_paths (list): manifest keys of the replaced documents
+        ingest_manifest (dict): the updated ingest manifest
 
-    ######################################
-    # Bundle of Additional/Optional Items
-    ######################################
+    Returns:
+        dict: {"missing": {path: [chunk file names not (or not the same) in the pool]},
+               "stale": [pool file names no document's folders hold]}
+    """
+    pool_names = set(os.listdir(pool_dir)) if os.path.isdir(pool_dir) else set()
+
+    def list_bulk_dirs(record):
+        outputs = record["outputs"]
+        bulk_dirs = [outputs.get("bulk_files_dir")] + outputs.get("split_bulk_dirs", [])
+        return [bulk_dir for bulk_dir in bulk_dirs if bulk_dir and os.path.isdir(bulk_dir)]
+
+    missing = {}
+    for path in updated_paths:
+        record = ingest_manifest.get(path)
+        if record is None:
+            continue
+        for bulk_dir in list_bulk_dirs(record):
+            for file_name in sorted(os.listdir(bulk_dir)):
+                if file_name not in pool_names or not filecmp.cmp(
+                    os.path.join(bulk_dir, file_name),
+                    os.path.join(pool_dir, file_name),
+                    shallow=False,
+                ):
+                    missing.setdefault(path, []).append(file_name)
+
+    held_names = set()
+    for record in ingest_manifest.values():
+        for bulk_dir in list_bulk_dirs(record):
+            held_names.update(os.listdir(bulk_dir))
+
+    return {"missing": missing, "stale": sorted(pool_names - held_names)}
+
+
+def ingest_arrivals(work_items, config=None):
+    """
+    Ingests settled files, adding their chunks to txt_pool
+    (rebuilt only if a changed document replaced old chunks;
+    then checked, see check_updated_pool_chunks()).
 
-    # Removes files smaller than N bytes from X directory
-    remove_small_files("txt_pool", REMOVE_BELOW_SIZE)
+    Returns:
+        dict: see ingest(), with 'pool_check' after a replacement,
+              or None if every file was unchanged
+    """
+    run_started = time.monotonic()
+    run_stage_seconds = {}
 
-    # Call the function with the directory containing the .txt files
-    back_append_stub_files("txt_pool")
+    jobs, skipped, ingest_manifest, aliases, removed = prepare_jobs(
+        [work_item.path for work_item in work_items], config, run_stage_seconds
+    )
+    if not jobs and not removed:
+        return None
 
-    add_source_attribution(source_attribution_string)
+    updated_paths = [job["manifest_key"] for job in jobs if job.get("previous_outputs")]
 
-    # count all file chunks created
-    count_files("txt_pool")
+    summary = process_jobs(
+        jobs,
+        skipped,
+        ingest_manifest,
+        aliases,
+        run_stage_seconds,
+        run_started,
+        rebuild_pool=True if removed else None,
+    )
 
-    # rename_directory('old_name', 'new_name')
-    rename_directory("txt_pool", f"bulk_files_folder_{pool_counter}")
+    if updated_paths:
+        pool_check = check_updated_pool_chunks(updated_paths, ingest_manifest)
+        summary["pool_check"] = pool_check
+        for path, file_names in pool_check["missing"].items():
+            print(f"txt_pool is missing {len(file_names)} new chunk(s) of: {path}")
+        if pool_check["stale"]:
+            print(
+                f"txt_pool has {len(pool_check['stale'])} chunk(s) no document holds, "
+                f"e.g. {pool_check['stale'][0]}"
+            )
 
-    pool_counter += 1
+    return summary
 
 
+def watch_ingest(paths=None, config=None, max_polls=None):
+    """
+    Watches directories and ingests documents as they arrive,
+    until Ctrl-C (or max_polls polls).
 
+    Runs unattended: BATCH_MODE is always on
+    (attribution comes from ATTRIBUTION_MANIFEST_PATH, if set).
 
-# # make sure all files in pool are not nested
-# pool_txt_files(txt_pool, 'txt_pool_all')
+    Args:
+        paths (list): directories to watch, default ["target_files"]
+        config (dict): configuration overrides, as for ingest()
+        max_polls (int): stop after this many polls (None: run until Ctrl-C)
 
+    Returns:
+        dict: {"polls", "batches", "processed", "failed", "pool_mismatches"} totals
+              (pool_mismatches: batches whose txt_pool check failed)
+    """
+    config = dict(config or {}, BATCH_MODE=True)
+    apply_config(config)
+
+    if paths is None:
+        paths = ["target_files"]
+    for path in paths:
+        if not os.path.isdir(path):
+            print(f"Not a directory, not watched: {path}")
+    paths = [path for path in paths if os.path.isdir(path)]
+
+    watch_state = {"dirs": {}, "files": {}}
+    pending = {}
+    totals = {"polls": 0, "batches": 0, "processed": 0, "failed": 0, "pool_mismatches": 0}
+    last_full_scan = None
+
+    print(f"Watching {paths} (Ctrl-C to stop)")
+    try:
+        while max_polls is None or totals["polls"] < max_polls:
+            if totals["polls"]:
+                time.sleep(WATCH_POLL_SECONDS)
+            totals["polls"] += 1
+
+            full_scan = (
+                last_full_scan is None
+                or time.monotonic() - last_full_scan >= WATCH_FULL_SCAN_SECONDS
+            )
+            if full_scan:
+                last_full_scan = time.monotonic()
 
-# ######################################
-# # Bundle of Additional/Optional Items
-# ######################################
+            for work_item in poll_watched_directories(paths, watch_state, full_scan):
+                pending[work_item.path] = work_item
 
-# # count all file chunks created
-# count_files("txt_pool")
+            settled = take_settled_files(pending, watch_state)
+            if not settled:
+                continue
 
-# # Removes files smaller than N bytes from X directory
-# remove_small_files("txt_pool", REMOVE_BELOW_SIZE)
+            print(f"\n{len(settled)} new or changed document(s)")
+            try:
+                summary = ingest_arrivals(settled, config)
+            except Exception:
+                # keep watching; these files are retried at the next full scan
+                traceback.print_exc()
+                for work_item in settled:
+                    watch_state["files"].pop(work_item.path, None)
+                continue
 
-# # Call the function with the directory containing the .txt files
-# back_append_stub_files("txt_pool")
+            if summary is not None:
+                totals["batches"] += 1
+                totals["processed"] += len(summary["results"])
+                totals["failed"] += len(summary["failed"])
+                pool_check = summary.get("pool_check")
+                if pool_check and (pool_check["missing"] or pool_check["stale"]):
+                    totals["pool_mismatches"] += 1
+            print(f"\nWatching {paths} (Ctrl-C to stop)")
 
-# add_source_attribution(source_attribution_string)
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
 
-# # count all file chunks created
-# count_files("txt_pool")
+    return totals
 
-# # rename_directory('old_name', 'new_name')
-# rename_directory("txt_pool", f"bulk_files_folder_{pool_counter}")
 
-# pool_counter += 1
+######
+# Run
+######
+"""
+1. add your files into a folder called /target_files/ with this program
+2. run script
+3. find the files in new folders per document
 
+or, from python:
+    import smart_chunk_v24
+    smart_chunk_v24.ingest(["target_files"], {"BATCH_MODE": True})
+"""
 
-##############
-# merged pool
-##############
-make_merged_directories_pool()
 
-# note: this introduces vast room for issues
-if ATTEMPT_AUTO_SPLIT is True:
-    create_new_split_bulk_files_folders(
-        prefix=BULK_FILE_FOLDER_PREFIX, 
-        max_number=BULK_FILES_FOLDER_MAX_SIZE
+def main(argv=None):
+    """
+    Console entry point, e.g.
+        python smart_chunk_v24.py
+        python smart_chunk_v24.py target_files/ more_books/ --batch --workers 8
+        python smart_chunk_v24.py target_files/ --plan
+        python smart_chunk_v24.py target_files/ --watch
+        python smart_chunk_v24.py target_files --batch --queue q.sqlite --queue-mode enqueue
+    """
+    parser = argparse.ArgumentParser(
+        description="Smart-chunk epub, txt, docx, pdf and pptx documents for RAG ingestion."
+    )
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        default=["target_files"],
+        help="files and/or directories to ingest (default: target_files)",
+    )
+    parser.add_argument(
+        "--config", help="JSON file of configuration overrides, e.g. {\"MAX_CHUNK_SIZE\": 1200}"
+    )
+    parser.add_argument("--workers", type=int, help="number of worker processes")
+    parser.add_argument(
+        "--batch", action="store_true", help="unattended: never ask for attribution"
     )
+    parser.add_argument(
+        "--attribution-manifest", help="CSV/JSON of attribution strings by path or glob"
+    )
+    parser.add_argument("--max-chunk-size", type=int, help="chunk size in characters")
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="re-process every document, even if unchanged",
+    )
+    parser.add_argument(
+        "--retry-quarantined",
+        action="store_true",
+        help="also process documents that failed or timed out before",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="dry run: estimate chunks, disk use, and runtime, writing nothing",
+    )
+    parser.add_argument(
+        "--trace",
+        nargs="?",
+        const="trace.json",
+        help="save a Chrome trace of every document and stage (default trace.json)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="append",
+        metavar="GLOB",
+        help="profile documents matching GLOB (cProfile, tracemalloc); repeatable",
+    )
+    parser.add_argument(
+        "--profile-slowest",
+        type=int,
+        metavar="N",
+        help="profile the N slowest documents of the last run",
+    )
+    parser.add_argument(
+        "--boilerplate",
+        choices=["tag", "skip", "off"],
+        help="epub front/back matter (copyright, ads, index...): tag its chunks "
+        "(default), skip it, or off",
+    )
+    parser.add_argument(
+        "--benchmark-html",
+        action="store_true",
+        help="compare and time the html text engines on the epubs (writes nothing)",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="daemon: keep watching the directories and ingest documents as they arrive",
+    )
+    parser.add_argument(
+        "--queue", help="distributed mode: SQLite work queue file on shared storage"
+    )
+    parser.add_argument(
+        "--queue-mode",
+        choices=["enqueue", "work", "finish", "status"],
+        help="with --queue: queue documents, process them (on any node), "
+        "finish the run, or show the queue",
+    )
+    args = parser.parse_args(argv)
+
+    if bool(args.queue) != bool(args.queue_mode):
+        parser.error("--queue and --queue-mode go together")
+
+    config = {}
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            config.update(json.load(f))
+    if args.workers is not None:
+        config["MAX_WORKERS"] = args.workers
+    if args.batch:
+        config["BATCH_MODE"] = True
+    if args.attribution_manifest:
+        config["ATTRIBUTION_MANIFEST_PATH"] = args.attribution_manifest
+    if args.max_chunk_size is not None:
+        config["MAX_CHUNK_SIZE"] = args.max_chunk_size
+    if args.full:
+        config["INCREMENTAL_MODE"] = False
+    if args.retry_quarantined:
+        config["RETRY_QUARANTINED"] = True
+    if args.trace:
+        config["TRACE_PATH"] = args.trace
+    if args.profile:
+        config["PROFILE_DOCUMENTS"] = args.profile
+    if args.profile_slowest is not None:
+        config["PROFILE_SLOWEST"] = args.profile_slowest
+    if args.boilerplate:
+        config["BOILERPLATE_MODE"] = None if args.boilerplate == "off" else args.boilerplate
+
+    if args.plan:
+        print_plan(plan_ingest(args.paths, config))
+        return 0
+
+    if args.watch:
+        watch_ingest(args.paths, config)
+        return 0
+
+    if args.benchmark_html:
+        apply_config(config)
+        books = benchmark_html_text_engines(args.paths)
+        print_html_benchmark(books)
+        return 1 if any(book["mismatches"] for book in books) else 0
+
+    if args.queue_mode == "enqueue":
+        enqueue_ingest(args.queue, args.paths, config)
+        return 0
+
+    if args.queue_mode == "work":
+        work_queue_ingest(args.queue, config)
+        return 0
+
+    if args.queue_mode == "status":
+        print(count_queue_states(open_work_queue(args.queue)))
+        return 0
+
+    if args.queue_mode == "finish":
+        summary = finish_queue_ingest(args.queue, config)
+    else:
+        summary = ingest(args.paths, config)
+
+    return 1 if summary["failed"] else 0
 
-# end & print debug timer
-end_time_inner = time.time()
-end_time_outer = time.monotonic()
-elapsed_time = end_time_inner - start_time_inner
-print(
-    f"Smart-Chunk automated document processing: Inner Elapsed time: {elapsed_time} seconds"
-)
-elapsed_time = end_time_outer - start_time_outer
-print(
-    f"Smart-Chunk automated document processing: Outer Elapsed time: {elapsed_time} seconds"
-)
 
-# count all file chunks created
-count_files("txt_pool")
+if __name__ == "__main__":
+    sys.exit(main())
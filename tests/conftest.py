@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import smart_chunk_v24  # noqa: E402
+
+
+@pytest.fixture
+def ingest_dir(tmp_path, monkeypatch):
+    """
+    An empty working directory (with a target_files folder) for ingest():
+    unattended, documents run in this process, and every setting is put
+    back afterwards (ingest(paths, config) sets them for the process).
+    """
+    saved = {name: getattr(smart_chunk_v24, name) for name in smart_chunk_v24.CONFIG_NAMES}
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "target_files").mkdir()
+    smart_chunk_v24.apply_config(
+        {
+            "BATCH_MODE": True,
+            "MAX_WORKERS": 1,
+            "ISOLATE_DOCUMENTS": False,
+            "QUARANTINE_PATH": None,
+        }
+    )
+    yield tmp_path
+    smart_chunk_v24.apply_config(saved)
@@ -0,0 +1,110 @@
+"""
+The fast html text engine (HtmlTextParser) must give exactly the text
+BeautifulSoup(html, "html.parser").get_text() gives, so switching
+HTML_TEXT_ENGINE never changes the chunks, whether the html is given
+whole or streamed in pieces (as epub members are read).
+"""
+
+import os
+import sys
+import zipfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import smart_chunk_v24  # noqa: E402
+
+pytest.importorskip("bs4")
+
+
+# fixture name -> html
+HTML_FIXTURES = {
+    "entities": (
+        "<p>Fish &amp; chips &lt;b&gt; &quot;quoted&quot; &nbsp;caf&eacute;"
+        " &#233; &#xE9; &#8212; &#150; &copy 2024 &notanentity; &amp</p>"
+    ),
+    "br": "<p>line one<br>line two<br/>line three<br />\n<br></br>end</p>",
+    "nested_blocks": (
+        "<html><head><title>Chapter 1</title></head><body>\n"
+        "<div class='chapter'>\n  <h1 id='c1'>Chapter <em>One</em></h1>\n"
+        "  <div><p>First <span>paragraph</span>.</p>\n"
+        "    <blockquote><p>Quoted <b>text</b></p></blockquote>\n"
+        "    <ul><li>one</li>\n<li>two <ol><li>two.a</li></ol></li></ul>\n"
+        "  </div>\n  <table><tr><td>cell</td><td>  </td></tr></table>\n"
+        "</div>\n</body></html>"
+    ),
+    "scripts_styles": (
+        "<head><style>p { color: red; }</style>"
+        "<script type='text/javascript'>var s = '<p>not text</p>';</script>"
+        "</head><body><p>visible</p><script>if (a < b) {}</script>"
+        "<template><p>hidden</p></template>"
+        "<ruby>kanji<rp>(</rp><rt>kana</rt><rp>)</rp></ruby>"
+        "<noscript>fallback</noscript><!-- a comment --><p>after</p></body>"
+    ),
+    "preformatted": "<pre>  keep   \n   spacing  </pre><p>   </p><textarea> \n </textarea>",
+    "declarations": (
+        '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n'
+        "<html xmlns='http://www.w3.org/1999/xhtml'><body>"
+        "<p>before<![CDATA[ raw <data> ]]>after</p></body></html>"
+    ),
+    "malformed": (
+        "<div><p>unclosed paragraph<p>second <b>bold <i>both</b> italic?"
+        "</i></span>stray end</div></div>text after\n"
+        "<p>a < b and c > d</p><img src='x.png' alt='pic'></img>"
+        "<hr><hr/></hr><p>unterminated &amp entity <a href='x'>link"
+    ),
+    "truncated_tag": "<p>text before a cut-off tag <a href=\"",
+    "empty": "",
+    "whitespace_only": " \n\t \n",
+}
+
+
+@pytest.mark.parametrize("name", sorted(HTML_FIXTURES))
+def test_fast_engine_matches_bs4(name):
+    html_content = HTML_FIXTURES[name]
+    golden = smart_chunk_v24.html_to_text_bs4(html_content)
+    # the engine function itself, html_to_text() would hide a failure
+    # by falling back to bs4
+    assert smart_chunk_v24.html_to_text_fast(html_content) == golden
+    assert smart_chunk_v24.html_to_text(html_content, "fast") == golden
+
+
+def test_fast_engine_finds_anchors():
+    anchors = {"c1": None, "missing": None}
+    text = smart_chunk_v24.html_to_text_fast(HTML_FIXTURES["nested_blocks"], anchors)
+    assert anchors["missing"] is None
+    assert text[anchors["c1"] :].lstrip().startswith("Chapter One")
+
+
+@pytest.mark.parametrize("piece_size", [1, 3, 7])
+def test_fast_engine_streamed_in_pieces(piece_size):
+    for name, html_content in sorted(HTML_FIXTURES.items()):
+        pieces = [
+            html_content[start : start + piece_size]
+            for start in range(0, len(html_content), piece_size)
+        ]
+        assert smart_chunk_v24.html_to_text_fast(pieces) == smart_chunk_v24.html_to_text_fast(
+            html_content
+        ), name
+
+
+def test_epub_member_text_streamed_in_blocks(tmp_path):
+    epub_path = tmp_path / "book.epub"
+    html_content = "<p>café — \U0001F600 " + "naïve " * 50 + "</p>"
+    with zipfile.ZipFile(epub_path, "w") as zip_file:
+        zip_file.writestr(
+            "OEBPS/content.opf",
+            '<package xmlns="http://www.idpf.org/2007/opf"><manifest>'
+            '<item id="c" href="chap.xhtml" media-type="application/xhtml+xml"/>'
+            '</manifest><spine><itemref idref="c"/></spine></package>',
+        )
+        zip_file.writestr("OEBPS/chap.xhtml", html_content.encode("utf-8"))
+
+    with smart_chunk_v24.EpubArchive(str(epub_path)) as epub:
+        assert [member for _, member in epub.spine_members()] == ["OEBPS/chap.xhtml"]
+        # blocks that split multi-byte characters
+        pieces = list(epub.iter_text("OEBPS/chap.xhtml", block_size=5))
+
+    assert len(pieces) > 1
+    assert "".join(pieces) == html_content
@@ -0,0 +1,114 @@
+"""
+Whole-run behaviour of ingest(): identical input files are processed once,
+and documents already in the ingest manifest are only processed again when
+their content or the settings that shape their outputs change.
+"""
+
+import os
+
+import smart_chunk_v24
+
+TEXT = " ".join(f"Sentence {number} of a document that has copies." for number in range(60))
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+def list_pool(pool_dir="txt_pool"):
+    return sorted(os.listdir(pool_dir))
+
+
+def test_identical_inputs_are_processed_once(ingest_dir):
+    copies = ["target_files/a.txt", "target_files/sub/b.txt", "target_files/c.txt"]
+    for path in copies:
+        write(ingest_dir / path, TEXT)
+    write(ingest_dir / "target_files/other.txt", "A different document. " * 20)
+
+    summary = smart_chunk_v24.ingest(["target_files"])
+
+    processed = sorted(result["file_path"] for result in summary["results"])
+    assert len(processed) == 2
+    assert "target_files/other.txt" in processed
+    (kept_path,) = set(processed) & set(copies)
+
+    duplicates = summary["report"]["duplicate_inputs"]
+    assert list(duplicates) == [kept_path]
+    assert sorted(duplicates[kept_path] + [kept_path]) == sorted(copies)
+
+    # the copies' chunks are pooled once
+    results_dirs = os.listdir(os.path.join(smart_chunk_v24.RESULTS_DIR_NAME, "target_files"))
+    assert len([name for name in results_dirs if name.endswith(tuple("0123456789"))]) == 2
+    bulk_dirs = [result["outputs"]["bulk_files_dir"] for result in summary["results"]]
+    all_bulk_dirs = [name for name in os.listdir(".") if name.startswith("bulk_files_folder_")]
+    assert sorted(all_bulk_dirs) == sorted(bulk_dirs)
+    assert list_pool() == sorted(
+        file_name for bulk_dir in bulk_dirs for file_name in os.listdir(bulk_dir)
+    )
+
+
+def test_a_new_copy_of_an_ingested_document_is_not_processed(ingest_dir):
+    write(ingest_dir / "target_files/a.txt", TEXT)
+    smart_chunk_v24.ingest(["target_files"])
+    pool_before = list_pool()
+
+    write(ingest_dir / "target_files/copy_of_a.txt", TEXT)
+    summary = smart_chunk_v24.ingest(["target_files"])
+
+    assert summary["results"] == []
+    assert summary["report"]["duplicate_inputs"] == {
+        "target_files/a.txt": ["target_files/copy_of_a.txt"]
+    }
+    assert list_pool() == pool_before
+
+
+def pool_matches_bulk_dirs(pool_dir="txt_pool"):
+    bulk_files = [
+        file_name
+        for name in os.listdir(".")
+        if name.startswith("bulk_files_folder_")
+        for file_name in os.listdir(name)
+    ]
+    return list_pool(pool_dir) == sorted(bulk_files)
+
+
+def test_unchanged_documents_are_skipped(ingest_dir):
+    write(ingest_dir / "target_files/a.txt", TEXT)
+    write(ingest_dir / "target_files/b.txt", "Another document. " * 30)
+    first = smart_chunk_v24.ingest(["target_files"])
+    assert len(first["results"]) == 2
+
+    second = smart_chunk_v24.ingest(["target_files"])
+    assert second["results"] == []
+    assert sorted(second["skipped"]) == ["target_files/a.txt", "target_files/b.txt"]
+
+    # touched, same content: hashed again, not processed
+    os.utime(ingest_dir / "target_files/a.txt", ns=(1, 1))
+    touched = smart_chunk_v24.ingest(["target_files"])
+    (result,) = touched["results"]
+    assert result["file_path"] == "target_files/a.txt" and result["skipped"]
+    assert pool_matches_bulk_dirs()
+
+
+def test_changed_content_or_settings_are_processed_again(ingest_dir):
+    write(ingest_dir / "target_files/a.txt", TEXT)
+    write(ingest_dir / "target_files/b.txt", "Another document. " * 30)
+    smart_chunk_v24.ingest(["target_files"])
+
+    write(ingest_dir / "target_files/a.txt", TEXT.replace("copies", "changes"))
+    changed = smart_chunk_v24.ingest(["target_files"])
+    assert [result["file_path"] for result in changed["results"]] == ["target_files/a.txt"]
+    assert changed["skipped"] == ["target_files/b.txt"]
+    # the old chunks of a.txt are gone from the pool
+    assert pool_matches_bulk_dirs()
+    for file_name in list_pool():
+        with open(os.path.join("txt_pool", file_name), encoding="utf-8") as f:
+            assert "copies" not in f.read()
+
+    resized = smart_chunk_v24.ingest(["target_files"], {"MAX_CHUNK_SIZE": 900})
+    assert sorted(result["file_path"] for result in resized["results"]) == [
+        "target_files/a.txt",
+        "target_files/b.txt",
+    ]
+    assert smart_chunk_v24.ingest(["target_files"], {"MAX_CHUNK_SIZE": 900})["results"] == []
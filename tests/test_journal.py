@@ -0,0 +1,104 @@
+"""
+An interrupted document is resumed from its journal, even when the
+journal's last line was only half written, and the outputs come out
+the same as those of an uninterrupted run.
+"""
+
+import glob
+import json
+import os
+
+import smart_chunk_v24
+
+CONFIG = {"STREAM_WINDOW_CHARS": 300, "MAX_CHUNK_SIZE": 400, "CHUNK_OVERLAP_SIZE": 100}
+
+
+def write_notes(path):
+    sentences = [f"Sentence number {number} of the notes, with a few words." for number in range(200)]
+    path.write_text(" ".join(sentences), encoding="utf-8")
+
+
+def read_results(results_dir):
+    """{relative path: bytes} of a results folder's text outputs."""
+    outputs = {}
+    for path in sorted(glob.glob(os.path.join(results_dir, "**", "*"), recursive=True)):
+        if os.path.isfile(path) and path.endswith((".txt", ".jsonl", ".json")):
+            if os.path.basename(path) != "log.txt":
+                with open(path, "rb") as f:
+                    outputs[os.path.relpath(path, results_dir)] = f.read()
+    return outputs
+
+
+def run_interrupted(monkeypatch, after_records):
+    """ingest() that dies after the journal has after_records records."""
+    write_journal_record = smart_chunk_v24.write_journal_record
+    calls = []
+
+    def interrupting_write_journal_record(*args):
+        write_journal_record(*args)
+        calls.append(1)
+        if len(calls) == after_records:
+            raise RuntimeError("interrupted")
+
+    monkeypatch.setattr(
+        smart_chunk_v24, "write_journal_record", interrupting_write_journal_record
+    )
+    summary = smart_chunk_v24.ingest(["target_files"], CONFIG)
+    monkeypatch.setattr(smart_chunk_v24, "write_journal_record", write_journal_record)
+    return summary
+
+
+def test_resume_after_a_truncated_journal(ingest_dir, monkeypatch):
+    write_notes(ingest_dir / "target_files" / "notes.txt")
+
+    # an uninterrupted run, for comparison
+    clean = smart_chunk_v24.ingest(["target_files"], CONFIG)
+    clean_outputs = read_results(clean["results"][0]["outputs"]["results_dir"])
+    for name in ["ingest_manifest.jsonl", "output_manifest.jsonl"]:
+        os.remove(name)
+    smart_chunk_v24.remove_path(smart_chunk_v24.RESULTS_DIR_NAME)
+
+    interrupted = run_interrupted(monkeypatch, after_records=3)
+    assert interrupted["failed"] == ["target_files/notes.txt"]
+
+    (journal_path,) = glob.glob(
+        os.path.join("**", "*_partial", smart_chunk_v24.JOURNAL_FILE_NAME), recursive=True
+    )
+    with open(journal_path, "rb") as f:
+        journal_lines = f.read().splitlines(keepends=True)
+    assert len(journal_lines) == 1 + 3
+    # the process died while writing the next record
+    with open(journal_path, "ab") as f:
+        f.write(b'{"section": 0, "pieces": 9, "do')
+
+    # resumed, and interrupted again: the half line was cut off first
+    run_interrupted(monkeypatch, after_records=2)
+    with open(journal_path, "rb") as f:
+        journal_lines = f.read().splitlines(keepends=True)
+    assert len(journal_lines) == 1 + 3 + 2
+    for line in journal_lines:
+        json.loads(line)
+
+    resumed = smart_chunk_v24.ingest(["target_files"], CONFIG)
+    (result,) = resumed["results"]
+    assert result.get("resumed") is True
+    assert not resumed["failed"]
+    assert not glob.glob(os.path.join("**", "*_partial"), recursive=True)
+    assert read_results(result["outputs"]["results_dir"]) == clean_outputs
+
+
+def test_changed_document_starts_over(ingest_dir, monkeypatch, capsys):
+    notes_path = ingest_dir / "target_files" / "notes.txt"
+    write_notes(notes_path)
+
+    run_interrupted(monkeypatch, after_records=2)
+    with open(notes_path, "a", encoding="utf-8") as f:
+        f.write(" One more sentence at the end.")
+
+    capsys.readouterr()
+    summary = smart_chunk_v24.ingest(["target_files"], CONFIG)
+    (result,) = summary["results"]
+    assert not result.get("resumed")
+    assert "Changed since it was interrupted, starting over" in capsys.readouterr().out
+    with open(os.path.join(result["outputs"]["results_dir"], "whole.txt"), encoding="utf-8") as f:
+        assert f.read().rstrip().endswith("One more sentence at the end.")
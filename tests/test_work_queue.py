@@ -0,0 +1,70 @@
+"""
+SQLite work queue leases: an expired lease is given to the next worker
+until QUEUE_MAX_ATTEMPTS leases have been taken, then the document fails;
+a worker that lost its lease can neither renew it nor finish the document.
+"""
+
+import json
+
+import pytest
+
+import smart_chunk_v24
+
+
+@pytest.fixture
+def connection(tmp_path):
+    connection = smart_chunk_v24.open_work_queue(str(tmp_path / "work_queue.sqlite"))
+    job = {"manifest_key": "target_files/a.txt", "file_path": "target_files/a.txt"}
+    assert smart_chunk_v24.enqueue_jobs(connection, [job]) == 1
+    yield connection
+    connection.close()
+
+
+def read_item(connection):
+    state, attempts, result = connection.execute(
+        "SELECT state, attempts, result FROM work_queue"
+    ).fetchone()
+    return state, attempts, json.loads(result) if result else None
+
+
+@pytest.mark.parametrize("max_attempts", [1, 3])
+def test_expired_lease_is_leased_again_up_to_max_attempts(connection, monkeypatch, max_attempts):
+    monkeypatch.setattr(smart_chunk_v24, "QUEUE_MAX_ATTEMPTS", max_attempts)
+
+    lease_ids = set()
+    for attempt in range(1, max_attempts + 1):
+        # a lease that has expired by the next lease_job()
+        leased = smart_chunk_v24.lease_job(connection, f"worker-{attempt}", lease_seconds=-1)
+        assert leased is not None
+        item_id, job, lease_id = leased
+        assert job["file_path"] == "target_files/a.txt"
+        assert read_item(connection)[:2] == ("leased", attempt)
+        lease_ids.add(lease_id)
+
+    assert len(lease_ids) == max_attempts
+
+    assert smart_chunk_v24.lease_job(connection, "worker-last") is None
+    state, attempts, result = read_item(connection)
+    assert (state, attempts) == ("failed", max_attempts)
+    assert result["error"].startswith("Lease expired")
+
+    # no earlier lease holder can finish it now
+    for lease_id in lease_ids:
+        assert not smart_chunk_v24.renew_lease(connection, item_id, lease_id)
+        assert not smart_chunk_v24.complete_job(connection, item_id, lease_id, {})
+    assert read_item(connection)[0] == "failed"
+
+
+def test_only_the_current_lease_holder_finishes(connection):
+    item_id, _, first_lease_id = smart_chunk_v24.lease_job(
+        connection, "worker-1", lease_seconds=-1
+    )
+    _, _, second_lease_id = smart_chunk_v24.lease_job(connection, "worker-2")
+
+    assert not smart_chunk_v24.renew_lease(connection, item_id, first_lease_id)
+    assert not smart_chunk_v24.complete_job(connection, item_id, first_lease_id, {"by": 1})
+    assert smart_chunk_v24.renew_lease(connection, item_id, second_lease_id)
+    assert smart_chunk_v24.complete_job(connection, item_id, second_lease_id, {"by": 2})
+
+    assert read_item(connection) == ("done", 2, {"by": 2})
+    assert smart_chunk_v24.lease_job(connection, "worker-3") is None